@@ -0,0 +1,219 @@
+"""
+Batch rendering of a manifest of jobs (JSON or CSV) with a process pool
+
+    python batch.py jobs.csv --workers 8 --results results.json --cache .gridz_cache
+
+A job gives the parameters of an image and its output file (see JOB_DEFAULTS and lire_jobs), a too large job
+is rejected before any work (see nbiter_job). The jobs are also used by the server and the render pool
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import io
+import json
+import os
+import time
+from typing import Optional
+
+from loguru import logger
+from PIL import Image as pim
+
+import lsystog as ls
+from render_cache import RenderCache
+
+
+JOB_DEFAULTS = {'patterns': None, 'colors': None, 'banned_colors': '', 'nbiter': 1, 'rotation': False,
+                'nb_dest': 1, 'engine': 'string', 'background': (0, 0, 0, 0), 'mode': 'RGBA', 'output': None,
+                'rng': 'global'}
+
+
+def lire_jobs(manifest_fpath: str) -> list[dict]:
+    """
+    Gives the jobs of a manifest (JSON list of objects or CSV file with a header), with their default values
+
+    The keys of a job are the ones of JOB_DEFAULTS. In a CSV file, the patterns are separated by spaces,
+    the background is "r g b a" and the rotation is 1/0 (or true/false)
+
+    Example of CSV file :
+        patterns,colors,banned_colors,nbiter,rotation,output
+        1/2_1//_111,RBG,/,6,0,sample_images/img_rst_ban.png
+    """
+
+    with open(manifest_fpath, encoding='utf-8', newline='') as fic:
+        if manifest_fpath.lower().endswith('.csv'):
+            lignes = [{cle: val for cle, val in ligne.items() if val not in (None, '')}
+                      for ligne in csv.DictReader(fic)]
+        else:
+            lignes = json.load(fic)
+
+    jobs = []
+    for num, ligne in enumerate(lignes):
+        inconnues = set(ligne) - set(JOB_DEFAULTS)
+        if inconnues:
+            raise ls.LsystError(f"Job {num} : unknown keys {sorted(inconnues)}")
+
+        job = {**JOB_DEFAULTS, **ligne}
+        if isinstance(job['patterns'], str):
+            job['patterns'] = job['patterns'].split()
+        if isinstance(job['background'], str):
+            job['background'] = [int(val) for val in job['background'].split()]
+        if isinstance(job['rotation'], str):
+            job['rotation'] = job['rotation'].strip().lower() in ('1', 'true', 'yes')
+
+        job['nbiter'], job['nb_dest'] = int(job['nbiter']), int(job['nb_dest'])
+        job['background'] = tuple(job['background'])
+
+        if not job['patterns'] or not job['output']:
+            raise ls.LsystError(f"Job {num} : the patterns and the output are needed")
+
+        jobs.append(job)
+
+    return jobs
+
+
+def job_key(job: dict) -> str:
+    """ Gives the render key (see lsystog.render_key) of a job of a manifest """
+    return ls.render_key(job['patterns'], job['colors'], job['banned_colors'], job['nbiter'], job['rotation'],
+                      job['nb_dest'], col_fond=job['background'], mode=job['mode'], rng=job['rng'])
+
+
+def lsystg_regles(job: dict) -> ls.Lsystg:
+    """ Gives the L-system of a job (see JOB_DEFAULTS) with its rules only : nothing is expanded (see estimate) """
+    return ls.Lsystg(axiom=None, rules=None, nbiter=job['nbiter'], patterns=job['patterns'], colors=job['colors'],
+                     banned_colors=job['banned_colors'], nb_dest=job['nb_dest'], engine=job['engine'],
+                     func_transf=ls.strc_2_strc_90 if job['rotation'] else None, rng=job['rng'], expand=False)
+
+
+def nbiter_job(job: dict, max_pixels: Optional[int] = None) -> int:
+    """
+    Gives the largest number of iterations (at most the one of the job) whose result is accepted by its engine
+    (see Lsystg.estimate) and has at most `max_pixels` pixels : a job can be rejected or downscaled before any work
+
+    Returns :
+        the number of iterations (0 if even one iteration is too much), the one of the job when its rules
+        can not be estimated
+    """
+
+    gls = lsystg_regles(job)
+    for nbiter in range(job['nbiter'], 0, -1):
+        try:
+            estimation = gls.estimate(nbiter)
+        except ls.LsystError:
+            return job['nbiter']
+
+        if estimation['fits'] and (max_pixels is None or estimation['pixel_count'] <= max_pixels):
+            return nbiter
+
+    return 0
+
+
+def rendu_job(job: dict, cache: Optional[RenderCache] = None, max_pixels: Optional[int] = None) -> dict:
+    """
+    Renders a job of a manifest (see lire_jobs) into its output file
+
+        cache (opt) : the image is taken from this cache if it is there, stored there otherwise
+        max_pixels (opt) : a larger image is not rendered (see nbiter_job)
+
+    Returns :
+        the result of the job : status ('done', 'cached' or 'error'), seconds, width, height, bytes (or error)
+    """
+
+    debut = time.perf_counter()
+    if cache is not None:
+        donnees = cache.get(job_key(job))
+        if donnees is not None:
+            if os.path.dirname(job['output']):
+                os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+            with open(job['output'], 'wb') as fic:
+                fic.write(donnees)
+            with pim.open(io.BytesIO(donnees)) as imgn:
+                return {'status': 'cached', 'seconds': time.perf_counter() - debut, 'width': imgn.width,
+                        'height': imgn.height, 'bytes': len(donnees)}
+
+    try:
+        # Un job trop grand est rejeté avant son développement
+        if nbiter_job(job, max_pixels) < job['nbiter']:
+            raise ls.LsystError(f"The result is too large with {job['nbiter']} iterations (see Lsystg.estimate)")
+
+        gls = lsystg_regles(job)
+        gls.developpe_prf()
+
+        if os.path.dirname(job['output']):
+            os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+
+        imgn = gls.img(job['output'], col_fond=job['background'], mode=job['mode'])
+
+        if cache is not None:
+            with open(job['output'], 'rb') as fic:
+                cache.put(job_key(job), fic.read())
+    except Exception as ex:  # pylint: disable=broad-exception-caught
+        # Un job en erreur ne doit pas arrêter les autres
+        return {'status': 'error', 'seconds': time.perf_counter() - debut, 'error': f"{type(ex).__name__}: {ex}"}
+
+    return {'status': 'done', 'seconds': time.perf_counter() - debut, 'width': imgn.width, 'height': imgn.height,
+            'bytes': os.path.getsize(job['output'])}
+
+
+def rendu_jobs(jobs: list[dict], workers: Optional[int] = None, force: bool = False,
+               cache: Optional[RenderCache] = None, max_pixels: Optional[int] = None) -> list[dict]:
+    """
+    Renders the jobs of a manifest with a process pool
+
+        jobs : see lire_jobs
+        workers (opt) : number of processes (number of CPUs by default)
+        force : if False, the jobs whose output already exists are skipped
+        cache (opt) : render cache shared by the processes (see rendu_job)
+        max_pixels (opt) : the larger images are not rendered (see rendu_job)
+
+    Returns :
+        the jobs with their results (see rendu_job), in the order of the manifest
+    """
+
+    resultats = [dict(job, status='skipped') for job in jobs]
+    a_faire = [num for num, job in enumerate(jobs) if force or not os.path.exists(job['output'])]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(rendu_job, jobs[num], cache, max_pixels): num for num in a_faire}
+
+        for future in as_completed(futures):
+            num = futures[future]
+            resultats[num].update(future.result())
+            logger.info(f"{jobs[num]['output']} : {resultats[num]['status']} ({resultats[num]['seconds']:.2f}s)")
+
+    return resultats
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Batch rendering : python batch.py jobs.json --workers 8 --results results.json
+
+    Returns :
+        0 if all the jobs are done (or skipped), 1 otherwise
+    """
+
+    parser = argparse.ArgumentParser(description="Renders a manifest of jobs (JSON or CSV)")
+    parser.add_argument('manifest', help="JSON list of jobs or CSV file (see lire_jobs)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="number of processes (default : CPUs)")
+    parser.add_argument('-f', '--force', action='store_true', help="render the jobs whose output already exists")
+    parser.add_argument('-r', '--results', default='results.json', help="results manifest (default : results.json)")
+    parser.add_argument('-c', '--cache', help="folder of a render cache shared with other runs (see RenderCache)")
+    parser.add_argument('--cache-bytes', type=int, default=1 << 30, help="size budget of the cache (default : 1 GiB)")
+    parser.add_argument('--max-pixels', type=int, default=None, help="the larger images are rejected before any work")
+    args = parser.parse_args(argv)
+
+    cache = RenderCache(args.cache, args.cache_bytes) if args.cache else None
+    resultats = rendu_jobs(lire_jobs(args.manifest), workers=args.workers, force=args.force, cache=cache,
+                           max_pixels=args.max_pixels)
+
+    with open(args.results, 'w', encoding='utf-8') as fic:
+        json.dump(resultats, fic, indent=2)
+
+    nb_erreurs = sum(resultat['status'] == 'error' for resultat in resultats)
+    logger.info(f"{len(resultats)} jobs, {nb_erreurs} errors : see {args.results}")
+
+    return 1 if nb_erreurs else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,254 @@
+"""
+Benchmarks of lsystog : expansion and rendering times, peak memory and golden images
+
+    python benchmark.py --output bench.json
+    python benchmark.py --output new.json --baseline bench.json --tolerance 1.5
+
+The expansion (developpe_prf, run by the constructor) and the rendering (img) are timed separately
+(best of `--repeat` runs), their peak memories are measured in another run with tracemalloc.
+Each engine is checked against the image of the string engine, the samples against sample_images/*_V0.png
+"""
+
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image as pim
+
+import lsystog as ls
+
+
+# The samples of samples_*.py : (name, pattern, colors, nbiter, rotation)
+SAMPLES = [
+    ('rst_ban', '1/2_1//_111', 'RBG', 6, False),
+    ('rst', '102_100_111', 'RBG', 6, False),
+    ('rst_rnd', '102_100_111', 'RBG?', 6, False),
+    ('abba_ban', '/00/_0120_0210_/00/', 'RBG', 5, False),
+    ('abba', '0000_0120_0210_0000', 'RBG', 5, False),
+    ('border', '1122_1//1_2//1_1111', 'RBG', 5, False),
+    ('py', '1112/2_1/12/2_111222_1///2/_1///2/_1///2/', 'RBG', 4, True),
+]
+
+# Numbers of iterations by size of pattern (the last one is not used with --quick)
+NBITERS = {3: (3, 5, 6), 4: (3, 4, 5), 5: (2, 3, 4), 6: (2, 3, 4)}
+
+ENGINES = ('string', 'grid', 'lazy')
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_images')
+
+MIN_SECONDS = 0.01  # Below this time, a slower run is not a regression (noise)
+
+
+def cases(quick: bool = False) -> list[dict]:
+    """
+    Gives the benchmark cases : the patterns of the samples and of the application (PATTERN_EXAMPLES),
+    for some numbers of iterations, with and without rotation, with one or two destinations
+    """
+
+    patterns = [(name, pattern, colors) for name, pattern, colors, _, _ in SAMPLES]
+    patterns += [(f"example_{num}", pattern, 'GRB') for num, pattern in enumerate(ls.PATTERN_EXAMPLES)]
+
+    res = []
+    for name, pattern, colors in patterns:
+        taille = len(pattern.split('_'))
+        for nbiter in NBITERS[taille][:2 if quick else 3]:
+            for rotation in (False, True):
+                for nb_dest in (1, 2):
+                    res.append({'name': name, 'pattern': pattern, 'colors': colors, 'nbiter': nbiter,
+                                'rotation': rotation, 'nb_dest': nb_dest})
+
+    return res
+
+
+def lsystg(case: dict, engine: str) -> ls.Lsystg:
+    """
+    Gives the L-system of a case (the expansion is done by the constructor)
+    """
+
+    return ls.Lsystg(axiom=None, rules=None, nbiter=case['nbiter'], patterns=[case['pattern']], colors=case['colors'],
+                     banned_colors='/', nb_dest=case['nb_dest'], engine=engine,
+                     func_transf=ls.strc_2_strc_90 if case['rotation'] else None)
+
+
+def mesure(case: dict, engine: str, repeat: int) -> dict:
+    """
+    Measures a case with an engine : times (best of `repeat` runs) and peak memories (in MB)
+    """
+
+    res = {'expand_s': float('inf'), 'render_s': float('inf')}
+
+    for _ in range(repeat):
+        debut = time.perf_counter()
+        gls = lsystg(case, engine)
+        milieu = time.perf_counter()
+        imgn = gls.img(img_fpath="", col_fond=(0, 0, 0, 255))
+        fin = time.perf_counter()
+
+        res['expand_s'] = min(res['expand_s'], milieu - debut)
+        res['render_s'] = min(res['render_s'], fin - milieu)
+
+    tracemalloc.start()
+    try:
+        gls = lsystg(case, engine)
+        res['expand_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.reset_peak()
+        gls.img(img_fpath="", col_fond=(0, 0, 0, 255))
+        res['render_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+    res['width'], res['height'] = imgn.size
+
+    return res
+
+
+def run_cases(lcases: list[dict], repeat: int = 3) -> list[dict]:
+    """
+    Runs the benchmark cases with all the engines (the lazy engine only with deterministic rules)
+
+    Returns :
+        one result per case and engine, `same_as_string` tells if the image is the one of the string engine
+    """
+
+    res = []
+    for case in lcases:
+        attendu = None
+
+        for engine in ENGINES:
+            if engine == 'lazy' and case['nb_dest'] > 1:
+                continue
+
+            ligne = dict(case, engine=engine)
+            try:
+                ligne.update(mesure(case, engine, repeat))
+                image = np.asarray(lsystg(case, engine).img(img_fpath="", col_fond=(0, 0, 0, 255)))
+            except ls.LsystError as ex:
+                ligne['error'] = str(ex)
+                res.append(ligne)
+                continue
+
+            if engine == 'string':
+                attendu = image
+            ligne['same_as_string'] = attendu is not None and np.array_equal(image, attendu)
+
+            res.append(ligne)
+            print(f"{ligne['name']:12} {ligne['engine']:6} nbiter={ligne['nbiter']} rot={ligne['rotation']:d} "
+                  f"dest={ligne['nb_dest']} : {ligne['expand_s']:.3f}s + {ligne['render_s']:.3f}s "
+                  f"({ligne['render_peak_mb']:.1f} MB)")
+
+    return res
+
+
+def run_golden(engines: tuple[str, ...] = ENGINES) -> list[dict]:
+    """
+    Renders the samples with each engine and compares them to sample_images/img_<name>_V0.png
+
+    Some golden images are older than the current rendering of the banned colors : the number of
+    different pixels is compared to the one of the baseline (see compare), it is not expected to be 0
+
+    Returns :
+        one result per sample and engine with the number of different pixels
+    """
+
+    res = []
+    for name, pattern, colors, nbiter, rotation in SAMPLES:
+        case = {'pattern': pattern, 'colors': colors, 'nbiter': nbiter, 'rotation': rotation, 'nb_dest': 1}
+        with pim.open(os.path.join(GOLDEN_DIR, f"img_{name}_V0.png")) as imgn:
+            golden = np.asarray(imgn.convert('RGBA'))
+
+        for engine in engines:
+            image = np.asarray(lsystg(case, engine).img(img_fpath="", col_fond=(0, 0, 0, 255)))
+            diff = int((image != golden).any(axis=2).sum()) if image.shape == golden.shape else golden.size // 4
+
+            res.append({'name': name, 'engine': engine, 'diff_pixels': diff, 'total_pixels': golden.size // 4})
+            print(f"{name:12} {engine:6} golden : {diff} different pixels")
+
+    return res
+
+
+def compare(resultats: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compares results to a baseline (same format)
+
+    A regression is a time or a peak memory over `tolerance` times the one of the baseline, a different number
+    of different pixels for a golden image, or an engine whose image is not the one of the string engine
+
+    Returns :
+        the list of the regressions
+    """
+
+    def cle(ligne: dict) -> tuple:
+        return tuple(ligne.get(key) for key in ('name', 'pattern', 'nbiter', 'rotation', 'nb_dest', 'engine'))
+
+    regressions = [f"{cle(ligne)} : not the image of the string engine" for ligne in resultats['cases']
+                   if ligne.get('same_as_string') is False]
+
+    references = {cle(ligne): ligne for ligne in baseline.get('cases', [])}
+    for ligne in resultats['cases']:
+        ref = references.get(cle(ligne))
+        if ref is None or 'error' in ligne or 'error' in ref:
+            continue
+
+        for key, minimum in (('expand_s', MIN_SECONDS), ('render_s', MIN_SECONDS),
+                             ('expand_peak_mb', 1.0), ('render_peak_mb', 1.0)):
+            if ligne[key] > max(ref[key] * tolerance, minimum):
+                regressions.append(f"{cle(ligne)} : {key} {ligne[key]:.3f} > {tolerance} x {ref[key]:.3f}")
+
+    references = {(ligne['name'], ligne['engine']): ligne for ligne in baseline.get('golden', [])}
+    for ligne in resultats.get('golden', []):
+        ref = references.get((ligne['name'], ligne['engine']))
+        if ref is not None and ligne['diff_pixels'] != ref['diff_pixels']:
+            regressions.append(f"golden {ligne['name']} ({ligne['engine']}) : {ligne['diff_pixels']} different "
+                               f"pixels instead of {ref['diff_pixels']}")
+
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs the benchmarks, saves the results (JSON) and compares them to a baseline
+
+    Returns :
+        0 if there is no regression, 1 otherwise
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmarks of lsystog")
+    parser.add_argument('-o', '--output', default='bench.json', help="JSON results (default : bench.json)")
+    parser.add_argument('-b', '--baseline', help="JSON results of a previous run to compare with")
+    parser.add_argument('-t', '--tolerance', type=float, default=1.5, help="accepted ratio to the baseline")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="runs by case (the best time is kept)")
+    parser.add_argument('-q', '--quick', action='store_true', help="less iterations")
+    parser.add_argument('--no-golden', action='store_true', help="no golden images check")
+    args = parser.parse_args(argv)
+
+    resultats = {
+        'meta': {'date': datetime.now(timezone.utc).isoformat(), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'platform': platform.platform(), 'quick': args.quick},
+        'cases': run_cases(cases(args.quick), args.repeat),
+        'golden': [] if args.no_golden else run_golden(),
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as fic:
+        json.dump(resultats, fic, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fic:
+            baseline = json.load(fic)
+
+    regressions = compare(resultats, baseline, args.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
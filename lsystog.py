@@ -3,13 +3,69 @@ Lindenmayer System (L-system) with a grid (and a subgrid, ...)
 
 """
 
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import copy
+from fractions import Fraction
+import hashlib
+import json
+from multiprocessing import resource_tracker, shared_memory
+import os
 import random as rnd
+import re
+import struct
+import time
 from typing import Callable, Optional
+import zipfile
+import zlib
+
+try:
+    import resource
+except ImportError:  # Not available on Windows : no peak memory in the stats
+    resource = None
 
 import numpy as np
 from loguru import logger
-from PIL import Image as pim, ImageDraw
+from PIL import GifImagePlugin, Image as pim
+
+
+__version__ = '0.2.0'  # In the keys of the render cache (see render_key) : to change when the images change
+
+
+# Colors
+# ----------------------
+
+# The colors of the cells : character -> (name, RGBA)
+# The background color ('T') is not drawn and the random color ('?') is drawn for each cell
+COLORS = {
+    'R': ('Red', (255, 0, 0, 255)),
+    'G': ('Green', (0, 255, 0, 255)),  # "Green" ( lime in fact )
+    'B': ('Blue', (0, 0, 255, 255)),
+    'W': ('White', (255, 255, 255, 255)),
+    'K': ('Black', (0, 0, 0, 255)),
+    'Y': ('Yellow', (255, 255, 0, 255)),
+    'M': ('Magenta', (255, 0, 255, 255)),  # Magenta / Fuchsia
+    'O': ('Orange', (255, 165, 0, 255)),
+    'D': ('Dim gray', (105, 105, 105, 255)),
+    'F': ('Forest green', (34, 139, 34, 255)),
+    'N': ('Navy', (0, 0, 128, 255)),
+    'P': ('Purple', (128, 0, 128, 255)),
+    'T': ('Background color', None),
+    '?': ('Random color', None),
+}
+
+ARBITRARY_RGBA = (10, 10, 10, 255)  # Dark gray, for the arbitrary color (see Lsystg.arbitrary_color)
+NOT_BANNABLE_COLORS = 'RGBWKYMOPD'  # These colors are drawn even when they are in banned_colors
+
+
+# Patterns
+# ----------------------
+
+# Some patterns (with 3 colors : GRB for example)
+PATTERN_EXAMPLES = ['00000_01210_02020_01210_00000', '012_120_201', '1001_0220_0220_1001',
+                    '00000_01110_01210_01110_00000', 'T000T_01210_02020_01210_T000T', '00000_01210_02T20_01210_00000',
+                    '1112T2_1T12T2_111222_1TTT2T_1TTT2T_1TTT2T']
 
 
 # Tool functions
@@ -72,6 +128,551 @@ def strc_2_strc_90(chaine: str) -> str:
     return array_2_strc(tab_np)
 
 
+def transf_d4(tab: np.ndarray, rot: int, miroir: bool) -> np.ndarray:
+    """
+    Applies a transformation of the dihedral group D4 (rotations and reflections of the square) to an array
+
+        rot : number of rotations at 90° (clockwise)
+        miroir : True for a left-right reflection before the rotations
+
+    Example :
+        [[R, G], [B, Y]], 1, False ==> [[B, R], [Y, G]]
+    """
+
+    if miroir:
+        tab = np.fliplr(tab)
+
+    return np.rot90(tab, -rot)
+
+
+def puissance_d4(rot: int, miroir: bool, nb: int) -> tuple[int, bool]:
+    """
+    Gives the transformation of D4 (see transf_d4) applied `nb` times, as a single transformation
+
+    Example :
+        1, False, 3 ==> 3, False  (3 rotations at 90°)
+        0, True, 2 ==> 0, False  (a reflection applied twice)
+    """
+
+    if miroir:
+        return (rot, True) if nb % 2 else (0, False)
+
+    return rot * nb % 4, False
+
+
+def puissance_matrice(mat: np.ndarray, nb: int) -> np.ndarray:
+    """
+    Gives mat ** nb for a square matrix (of Python numbers : exact integers or fractions), by squaring
+
+    Example :
+        puissance_matrice(np.array([[1, 1], [0, 1]], dtype=object), 5) -> [[1, 5], [0, 1]]
+    """
+
+    res = np.identity(mat.shape[0], dtype=object)
+    while nb > 0:
+        if nb & 1:
+            res = res.dot(mat)
+        mat = mat.dot(mat)
+        nb >>= 1
+
+    return res
+
+
+def strc_d4(chaine: str, rot: int, miroir: bool) -> str:
+    """
+    Gives the new coloring string from a first string by applying a transformation of D4 (see transf_d4)
+
+    !!! La couleur de fond n'est pas traitée
+    """
+
+    return array_2_strc(transf_d4(np.array(strc_2_array(chaine)), rot, miroir))
+
+
+def strc_2_strc_180(chaine: str) -> str:
+    """
+    Rotation at 180° (see strc_2_strc_90)
+
+    Example :
+        'RG_BY' ==> 'YB_GR'
+    """
+
+    return strc_d4(chaine, 2, False)
+
+
+def strc_2_strc_270(chaine: str) -> str:
+    """
+    Rotation at 270° (clockwise) (see strc_2_strc_90)
+
+    Example :
+        'RG_BY' ==> 'GY_RB'
+    """
+
+    return strc_d4(chaine, 3, False)
+
+
+def strc_2_strc_mirh(chaine: str) -> str:
+    """
+    Left-right reflection (see strc_2_strc_90)
+
+    Example :
+        'RG_BY' ==> 'GR_YB'
+    """
+
+    return strc_d4(chaine, 0, True)
+
+
+def strc_2_strc_mirv(chaine: str) -> str:
+    """
+    Top-bottom reflection (see strc_2_strc_90)
+
+    Example :
+        'RG_BY' ==> 'BY_RG'
+    """
+
+    return strc_d4(chaine, 2, True)
+
+
+def strc_2_strc_tr(chaine: str) -> str:
+    """
+    Transposition : reflection along the main diagonal (see strc_2_strc_90)
+
+    Example :
+        'RG_BY' ==> 'RB_GY'
+    """
+
+    return strc_d4(chaine, 3, True)
+
+
+def strc_2_strc_atr(chaine: str) -> str:
+    """
+    Reflection along the anti-diagonal (see strc_2_strc_90)
+
+    Example :
+        'RG_BY' ==> 'YG_BR'
+    """
+
+    return strc_d4(chaine, 1, True)
+
+
+# The "func_transf" functions of D4 : function -> (rot, miroir) (see transf_d4)
+TRANSF_D4 = {
+    strc_2_strc_90: (1, False),
+    strc_2_strc_180: (2, False),
+    strc_2_strc_270: (3, False),
+    strc_2_strc_mirh: (0, True),
+    strc_2_strc_mirv: (2, True),
+    strc_2_strc_tr: (3, True),
+    strc_2_strc_atr: (1, True),
+}
+
+
+def strc_2_codes(chaine: str) -> np.ndarray:
+    """
+    Gives the grid of color codes (uint8 array of the characters) corresponding to a coloring string
+
+    Returns :
+        the 2D array, or None when the string is not ASCII or when the rows do not have the same length
+
+    Example :
+        'RG_BY' ==> [[82, 71], [66, 89]]
+    """
+
+    tab = strc_2_array(chaine)
+    if not chaine.isascii() or len({len(ligne) for ligne in tab}) != 1:
+        return None
+
+    return np.array([[ord(car) for car in ligne] for ligne in tab], dtype=np.uint8)
+
+
+def codes_2_strc(codes: np.ndarray) -> str:
+    """
+    Gives the coloring string corresponding to a grid of color codes
+
+    Example :
+        [[82, 71], [66, 89]] ==> 'RG_BY'
+    """
+
+    return '_'.join([''.join(map(chr, ligne)) for ligne in codes.tolist()])
+
+
+def rang_prf(niveaux: list[tuple[int, int]], xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """
+    Gives the depth-first ranks of some cells (xs, ys) of a grid
+
+    The depth-first order is the order of the cells in the string of `developpe_prf`
+
+        niveaux : [(multx, multy), ...] the levels of the grid
+        xs, ys : coordinates of the cells
+
+    Example :
+        [(2, 1), (1, 2)], [0, 1, 0, 1], [0, 0, 1, 1] ==> [0, 2, 1, 3]
+    """
+
+    tx = int(np.prod([multx for multx, _ in niveaux], dtype=np.int64))
+    ty = int(np.prod([multy for _, multy in niveaux], dtype=np.int64))
+    rangs = np.zeros(np.shape(xs), dtype=np.int64)
+
+    for multx, multy in niveaux:
+        tx, ty = tx // multx, ty // multy
+        rangs = rangs * (multx * multy) + (ys // ty % multy) * multx + xs // tx % multx
+
+    return rangs
+
+
+def tailles_niveaux(niveaux: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """
+    Gives the sizes (in cells) of the levels, from the multipliers of the levels
+
+    Example :
+        [(4, 4), (2, 2)] ==> [(8, 8), (2, 2), (1, 1)]
+    """
+
+    tailles = [(1, 1)]
+
+    for multx, multy in reversed(niveaux):
+        tailles.insert(0, (tailles[0][0] * multx, tailles[0][1] * multy))
+
+    return tailles
+
+
+def remplir_blocs(tab: np.ndarray, xs: np.ndarray, ys: np.ndarray, tx: int, ty: int, valeurs: np.ndarray,
+                  masque: Optional[np.ndarray] = None) -> None:
+    """
+    Fills some blocks of the same size in an array
+
+        tab : array to fill (a grid of color codes or of RGBA colors)
+        xs, ys : positions of the blocks
+        tx, ty : size of the blocks
+        valeurs : one value per block
+        masque (opt) : boolean grid, only the cells where it is True are filled
+    """
+
+    if len(xs) < tx * ty:
+        # Few (big) blocks : one slice per block
+        for x, y, valeur in zip(xs.tolist(), ys.tolist(), valeurs):
+            if masque is None:
+                tab[y:y + ty, x:x + tx] = valeur
+            else:
+                bloc = tab[y:y + ty, x:x + tx]
+                bloc[masque[y:y + ty, x:x + tx]] = valeur
+        return
+
+    # Many (small) blocks : one vectorised assignment per cell of a block
+    # (the cells out of `tab` are dropped, as the slices above clip the blocks)
+    hauteur, largeur = tab.shape[:2]
+    for dy in range(ty):
+        for dx in range(tx):
+            lys, lxs, lvaleurs = ys + dy, xs + dx, valeurs
+            dedans = (lys < hauteur) & (lxs < largeur)
+            if not dedans.all():
+                lys, lxs, lvaleurs = lys[dedans], lxs[dedans], lvaleurs[dedans]
+            if masque is not None:
+                sel = masque[lys, lxs]
+                lys, lxs, lvaleurs = lys[sel], lxs[sel], lvaleurs[sel]
+            tab[lys, lxs] = lvaleurs
+
+
+def rectangles_grille(grille: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merges the neighbouring cells of the same value of a grid into rectangles : the runs of each row first,
+    then the runs of the same columns and value in consecutive rows
+
+    Example :
+        rectangles_grille(np.array([[1, 1, 2], [1, 1, 2]]))
+        -> xs [0, 2], ys [0, 0], ws [2, 1], hs [2, 2], valeurs [1, 2]
+
+    Returns :
+        (xs, ys, ws, hs, valeurs) the rectangles in row-major order of their top left cell
+    """
+
+    nbx = grille.shape[1]
+    if grille.size == 0:
+        vide = np.zeros(0, dtype=np.int64)
+        return vide, vide, vide, vide, grille.ravel()
+
+    # Les séquences de chaque ligne : un début à chaque changement de valeur
+    debuts = np.ones(grille.shape, dtype=bool)
+    debuts[:, 1:] = grille[:, 1:] != grille[:, :-1]
+    ys, xs = np.nonzero(debuts)
+    fins = np.where(np.append(ys[1:] == ys[:-1], False), np.append(xs[1:], 0), nbx)
+    valeurs = grille[ys, xs]
+
+    # Une séquence prolonge celle de la ligne précédente si elle a les mêmes colonnes et la même valeur
+    ordre = np.lexsort((ys, valeurs, fins, xs))
+    xs, ys, fins, valeurs = xs[ordre], ys[ordre], fins[ordre], valeurs[ordre]
+    suite = np.zeros(len(xs), dtype=bool)
+    suite[1:] = (xs[1:] == xs[:-1]) & (fins[1:] == fins[:-1]) & (valeurs[1:] == valeurs[:-1]) & (ys[1:] == ys[:-1] + 1)
+
+    premiers = np.flatnonzero(~suite)
+    hs = np.diff(np.append(premiers, len(xs)))
+    xs, ys, ws, valeurs = xs[premiers], ys[premiers], fins[premiers] - xs[premiers], valeurs[premiers]
+
+    ordre = np.lexsort((xs, ys))
+
+    return xs[ordre], ys[ordre], ws[ordre], hs[ordre], valeurs[ordre]
+
+
+def png_chunk(genre: bytes, donnees: bytes) -> bytes:
+    """
+    Gives a PNG chunk : length, type, data and CRC
+
+    Example :
+        png_chunk(b'IEND', b'') -> the 12 bytes of the IEND chunk (length 0, b'IEND' and its CRC)
+    """
+
+    return struct.pack('>I', len(donnees)) + genre + donnees + struct.pack('>I', zlib.crc32(genre + donnees))
+
+
+def ecrire_apng(fic, images, nb_images: int, duration: int = 500, loop: int = 0) -> None:
+    """
+    Writes an animated PNG (APNG) from a stream of images of the same size, each one written as soon as it is given
+
+        fic : binary file
+        images : iterable of images
+        nb_images : number of images (in the acTL chunk, before the first one)
+        duration : duration of an image in milliseconds
+        loop : number of loops (0 : forever)
+    """
+
+    num = 0  # Numéro de séquence des chunks fcTL et fdAT
+
+    for rang, imgn in enumerate(images):
+        pixels = np.asarray(imgn.convert('RGBA'))
+        hauteur, largeur = pixels.shape[:2]
+
+        if rang == 0:
+            fic.write(b'\x89PNG\r\n\x1a\n'
+                      + png_chunk(b'IHDR', struct.pack('>IIBBBBB', largeur, hauteur, 8, 6, 0, 0, 0))
+                      + png_chunk(b'acTL', struct.pack('>II', nb_images, loop)))
+
+        # Une image entière : pas de décalage, remplace la précédente
+        fic.write(png_chunk(b'fcTL', struct.pack('>IIIIIHHBB', num, largeur, hauteur, 0, 0, duration, 1000, 0, 0)))
+        num += 1
+
+        # Lignes avec le filtre 0
+        lignes = np.zeros((hauteur, 1 + 4 * largeur), dtype=np.uint8)
+        lignes[:, 1:] = pixels.reshape(hauteur, -1)
+        donnees = zlib.compress(lignes.tobytes())
+
+        for debut in range(0, len(donnees), 1 << 20):
+            if rang == 0:
+                fic.write(png_chunk(b'IDAT', donnees[debut:debut + (1 << 20)]))
+            else:
+                fic.write(png_chunk(b'fdAT', struct.pack('>I', num) + donnees[debut:debut + (1 << 20)]))
+                num += 1
+
+    fic.write(png_chunk(b'IEND', b''))
+
+
+def ecrire_gif(fic, images, duration: int = 500, loop: int = 0) -> None:
+    """
+    Writes an animated GIF from a stream of images of the same size, each one written as soon as it is given
+    (with its own palette of at most 256 colors, no alpha channel)
+
+        fic : binary file
+        images : iterable of images
+        duration : duration of an image in milliseconds
+        loop : number of loops (0 : forever)
+    """
+
+    for rang, imgn in enumerate(images):
+        imgp = imgn.convert('RGB').quantize(256)
+
+        if rang == 0:
+            fic.write(b''.join(GifImagePlugin.getheader(imgp, info={'loop': loop, 'duration': duration})[0]))
+
+        fic.write(b''.join(GifImagePlugin.getdata(imgp, duration=duration, include_color_table=True)))
+
+    fic.write(b';')
+
+
+def ecrire_svg(fic, taille: tuple[int, int], basis: tuple[int, int], couls: np.ndarray, groupes) -> None:
+    """
+    Writes a SVG image of rectangles : one path per color, in cells (scaled by `basis` to the size in pixels)
+
+        fic : binary file
+        taille : size of the image in cells
+        basis : size of a cell in pixels
+        couls : RGBA colors (n, 4)
+        groupes : for each color, the rectangles (xs, ys, ws, hs) in cells
+    """
+
+    (ncx, ncy), (mmx, mmy) = taille, basis
+    fic.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{ncx * mmx}" height="{ncy * mmy}" '
+              f'viewBox="0 0 {ncx} {ncy}" preserveAspectRatio="none" shape-rendering="crispEdges">\n'.encode())
+
+    for (rouge, vert, bleu, alpha), (xs, ys, ws, hs) in zip(couls.tolist(), groupes):
+        opacite = f' fill-opacity="{alpha / 255:.4g}"' if alpha < 255 else ''
+        chemin = ''.join(f'M{x} {y}h{lw}v{lh}h-{lw}z'
+                         for x, y, lw, lh in zip(xs.tolist(), ys.tolist(), ws.tolist(), hs.tolist()))
+        fic.write(f'<path fill="#{rouge:02x}{vert:02x}{bleu:02x}"{opacite} d="{chemin}"/>\n'.encode())
+
+    fic.write(b'</svg>\n')
+
+
+def ecrire_pdf(fic, taille: tuple[int, int], basis: tuple[int, int], couls: np.ndarray, groupes) -> None:
+    """
+    Writes a PDF page of rectangles : one path per color, in cells (scaled by `basis` to the size in points).
+    The content stream is compressed while it is written
+
+        fic, taille, basis, couls, groupes : see ecrire_svg
+    """
+
+    (ncx, ncy), (mmx, mmy) = taille, basis
+    largeur, hauteur = ncx * mmx, ncy * mmy
+    positions = {}
+
+    def objet(num: int, contenu: bytes) -> None:
+        positions[num] = fic.tell()
+        fic.write(f'{num} 0 obj\n'.encode() + contenu + b'\nendobj\n')
+
+    # Une transparence par valeur d'alpha (ExtGState)
+    alphas = sorted(set(couls[:, 3].tolist())) if (couls[:, 3] < 255).any() else []
+    etats = ''.join(f'/A{alpha} << /ca {alpha / 255:.4g} >> ' for alpha in alphas)
+
+    fic.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    objet(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    objet(2, b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>')
+    objet(3, f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {largeur} {hauteur}] '
+             f'/Resources << /ExtGState << {etats}>> >> /Contents 4 0 R >>'.encode())
+
+    # Le contenu : l'axe y vers le bas, en cellules
+    positions[4] = fic.tell()
+    fic.write(b'4 0 obj\n<< /Length 5 0 R /Filter /FlateDecode >>\nstream\n')
+    debut = fic.tell()
+    compresseur = zlib.compressobj()
+    fic.write(compresseur.compress(f'{mmx} 0 0 {-mmy} 0 {hauteur} cm\n'.encode()))
+
+    for (rouge, vert, bleu, alpha), (xs, ys, ws, hs) in zip(couls.tolist(), groupes):
+        entete = f'/A{alpha} gs ' if alphas else ''
+        fic.write(compresseur.compress(f'{entete}{rouge / 255:.4g} {vert / 255:.4g} {bleu / 255:.4g} rg\n'.encode()))
+        for lignes in range(0, len(xs), 1 << 16):
+            sel = slice(lignes, lignes + (1 << 16))
+            fic.write(compresseur.compress(''.join(
+                f'{x} {y} {lw} {lh} re\n'
+                for x, y, lw, lh in zip(xs[sel].tolist(), ys[sel].tolist(), ws[sel].tolist(), hs[sel].tolist())
+            ).encode()))
+        fic.write(compresseur.compress(b'f\n'))
+
+    fic.write(compresseur.flush())
+    longueur = fic.tell() - debut
+    fic.write(b'\nendstream\nendobj\n')
+    objet(5, str(longueur).encode())
+
+    # Table des positions des objets
+    xref = fic.tell()
+    fic.write(b'xref\n0 6\n0000000000 65535 f \n' + b''.join(f'{positions[num]:010d} 00000 n \n'.encode()
+                                                           for num in range(1, 6)))
+    fic.write(f'trailer\n<< /Size 6 /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+
+
+def render_key(patterns: list[str], colors: str, banned_colors: str = '', nbiter: int = 1, rotation: bool = False,
+               nb_dest: int = 1, rnd_seed: int = 123456789, x_basis: int = 4, y_basis: int = 4,
+               col_fond: tuple[int, int, int, int] = (0, 0, 0, 0), mode: str = 'RGBA', rng: str = 'global') -> str:
+    """
+    Gives the content address of an image rendered from patterns (see render_cache.RenderCache) :
+    the SHA-256 of the canonical JSON of its parameters and of the library version
+
+    The engine is not in the key : all the engines give the same image
+
+    Example :
+        render_key(['012_120_201'], 'GRB', nbiter=4, rotation=True) -> 64 hexadecimal characters
+    """
+
+    params = {'patterns': list(patterns), 'colors': colors, 'banned_colors': banned_colors, 'nbiter': int(nbiter),
+              'rotation': bool(rotation), 'nb_dest': int(nb_dest), 'rnd_seed': rnd_seed, 'x_basis': int(x_basis),
+              'y_basis': int(y_basis), 'col_fond': [int(val) for val in col_fond], 'mode': mode,
+              'version': __version__}
+    if rng != 'global':
+        # Les clés des images existantes ne changent pas
+        params['rng'] = rng
+
+    return hashlib.sha256(json.dumps(params, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Gives the peak memory (resident set size) of the process in MB, or None if it is not available
+    """
+
+    if resource is None:
+        return None
+
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if os.uname().sysname == 'Darwin' else peak / 1e3
+
+
+def alea_cellules(graine: int, prof: int, xs, ys, canal: int = 0) -> np.ndarray:
+    """
+    Gives a pseudo-random uint64 for each cell : a pure function of (graine, prof, x, y, canal),
+    independent of any order of traversal (see rng 'cell')
+
+    The inputs are combined with the splitmix64 finalizer (vectorised)
+
+        graine : the seed
+        prof : the depth of the cells
+        xs, ys : the indexes of the cells in the grid of their depth
+        canal : to get independent values for different uses (0 : rule choice, 1 : random color)
+    """
+
+    def melange(val: np.ndarray) -> np.ndarray:
+        val = (val ^ (val >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        val = (val ^ (val >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return val ^ (val >> np.uint64(31))
+
+    dore = np.uint64(0x9E3779B97F4A7C15)
+
+    # Les dépassements sont voulus (arithmétique modulo 2**64)
+    with np.errstate(over='ignore'):
+        res = melange(np.full(np.broadcast(np.asarray(xs), np.asarray(ys)).shape, graine % (1 << 64),
+                              dtype=np.uint64) + dore)
+        for valeur in (prof, canal, xs, ys):
+            valeur = np.asarray(valeur, dtype=np.int64).astype(np.uint64)
+            res = melange(res ^ (valeur + dore))
+
+    return res
+
+
+def lire_npz(npz_fpath: str, mmap: bool = True) -> dict[str, np.ndarray]:
+    """
+    Gives the arrays of an uncompressed .npz file (see Lsystg.save)
+
+    With `mmap`, the arrays are memory-mapped (read only) : np.load does not map the arrays of a .npz file,
+    their offsets in the zip file are read here
+    """
+
+    if not mmap:
+        with np.load(npz_fpath) as donnees:
+            return {nom: donnees[nom] for nom in donnees.files}
+
+    tableaux = {}
+    with zipfile.ZipFile(npz_fpath) as zfic, open(npz_fpath, 'rb') as fic:
+        for info in zfic.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise LsystError(f"{info.filename} is compressed : it can not be memory-mapped")
+
+            # En-tête local du zip : 30 octets, puis le nom et le champ "extra"
+            fic.seek(info.header_offset)
+            taille_nom, taille_extra = struct.unpack('<HH', fic.read(30)[26:30])
+            fic.seek(info.header_offset + 30 + taille_nom + taille_extra)
+
+            version = np.lib.format.read_magic(fic)
+            if version == (1, 0):
+                forme, fortran, dtype = np.lib.format.read_array_header_1_0(fic)
+            else:
+                forme, fortran, dtype = np.lib.format.read_array_header_2_0(fic)
+
+            nom = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if int(np.prod(forme)) == 0:
+                tableaux[nom] = np.zeros(forme, dtype=dtype)
+            else:
+                tableaux[nom] = np.memmap(npz_fpath, dtype=dtype, mode='r', offset=fic.tell(), shape=forme,
+                                          order='F' if fortran else 'C')
+
+    return tableaux
+
+
 def func_alea_iter(seq: list, numalea: int) -> str:
     """
     Fonction de retour "aléatoire" sur la séquence seq en fonction de numalea
@@ -97,6 +698,10 @@ class LsystError(Exception):
         super().__init__(*args)
 
 
+class LsystCancelled(LsystError):
+    """ The computation is cancelled or over its time budget (see Lsystg.checkpoint) """
+
+
 class Lsystg:
     """
     L-Syst with grid colors
@@ -105,7 +710,9 @@ class Lsystg:
     def __init__(self, axiom: str | None, rules, nbiter: int, func_transf: Optional[Callable] = None,
                  func_alea: Optional[Callable] = None, patterns: list[str] | None = None, colors: str | None = None,
                  banned_colors: str = '', nb_dest: int = 1, test: bool = False, verbose: bool = False,
-                 rnd_seed: int = 123456789) -> None:
+                 rnd_seed: int = 123456789, engine: str = 'string', stats: bool = False,
+                 stats_callback: Optional[Callable[[dict], None]] = None, cancel: Optional[Callable[[], bool]] = None,
+                 time_budget: Optional[float] = None, rng: str = 'global', expand: bool = True) -> None:
         self.axiom = axiom
         self.rules = rules
         self.nbiter = nbiter
@@ -118,20 +725,56 @@ class Lsystg:
         self.test = test
         self.verbose = verbose
         self.rnd_seed = rnd_seed
+        self.engine = engine  # 'string' (parenthesised string), 'grid' (grids of color codes) or 'lazy' (no expansion)
+
+        # Random choices and colors : 'global' (the `random` module, in the order of the expansion)
+        # or 'cell' (a pure function of the seed, the depth and the position of the cell, see alea_cellules)
+        self.rng = rng
+
+        # Without expansion, only the rules are built : see estimate, the expansion is done by developpe_prf
+        self.expand = expand
 
         self.arbitrary_color = 'A'  # An arbitrary color (when a color is missing in input)
         self.sep2 = '_'
         self.x_basis, self.y_basis = 4, 4  # Numbers of pixels at lowest level
         self.max_result_size = 1500000  # Maximum size accepted for the result (the current algo uses too much space)
+        self.max_grid_size = 250000000  # Maximum number of cells accepted for a grid result (engine 'grid')
+        self.max_memo_size = 1 << 26  # Maximum size (in bytes) of the subtrees kept by grille_memo
+        self.max_band_size = 1 << 26  # Maximum size (in bytes) of a band of cells in img_png
 
         self.dev_prf = ''
-
-        if rnd_seed is not None:
+        self.dev_depth = None  # Depths of the cells of a grid result (only needed for the random color)
+        self.dev_tiles = None  # Tree of the result (see tuiles_prf)
+        self.dev_snapshots = []  # States of the expansion before each iteration, and at the end (see extend)
+        self.dev_rnd = None  # State of `random` for the random colors of a loaded result (see load)
+
+        # Opt-in stats (see stat) : records of the iterations ('iteration', 'tiles') and of the images ('img')
+        self.stats = None
+        self.stats_callback = stats_callback
+        if stats or stats_callback is not None:
+            self.stats = {'engine': engine, 'iteration': [], 'tiles': [], 'img': [], 'func_transf_calls': 0,
+                          'd4_transforms': 0, 'peak_rss_mb': None}
+
+        # Cooperative cancellation of the expansion and of the rendering (see checkpoint)
+        self.cancel = cancel
+        self.deadline = None if time_budget is None else time.monotonic() + time_budget
+
+        if engine not in ('string', 'grid', 'lazy'):
+            self.error(f"Unknown engine : {engine}")
+
+        if rng not in ('global', 'cell'):
+            self.error(f"Unknown random generator : {rng}")
+
+        if rng == 'cell':
+            # Le module `random` n'est pas utilisé
+            self.rnd_seed = 0 if rnd_seed is None else rnd_seed
+        elif rnd_seed is not None:
             rnd.seed(rnd_seed)
 
         if patterns is None:
             # Use axiom and rules
-            self.developpe_prf()
+            if expand:
+                self.developpe_prf()
         else:
             # Use patterns to generate axiom and rules
             self.patterns = [pat.strip(" " + self.sep2) for pat in patterns if pat.strip(" " + self.sep2)]
@@ -179,59 +822,114 @@ class Lsystg:
             couleur : couleur à appliquer (pour un mode RGBA)
         """
 
+        pcoul = self.couleur_rgba(couleur)
+        if pcoul is None:
+            # No color = Background color
+            return
+
+        # img du même type que PIL.ImageDraw.Draw
+        img.rectangle([(x, y), (x + tx - 1, y + ty - 1)], fill=pcoul, outline=None)
+
+    def couleur_rgba(self, couleur: str) -> Optional[tuple[int, int, int, int]]:
+        """
+        Gives the RGBA color of a color character (a new random color for '?')
+
+        Returns :
+            the RGBA color or None when nothing has to be drawn (background color)
+        """
+
         tcouleur = couleur.upper()
 
         if tcouleur == self.arbitrary_color:
-            # Dark gray
-            pcoul = (10, 10, 10, 255)
-        elif tcouleur == 'R':
-            # Red
-            pcoul = (255, 0, 0, 255)
-        elif tcouleur == 'G':
-            # "Green" ( lime in fact )
-            pcoul = (0, 255, 0, 255)
-        elif tcouleur == 'B':
-            # Blue
-            pcoul = (0, 0, 255, 255)
-        elif tcouleur == 'W':
-            # White
-            pcoul = (255, 255, 255, 255)
-        elif tcouleur == 'K':
-            # Black
-            pcoul = (0, 0, 0, 255)
-        elif tcouleur == 'Y':
-            # Yellow
-            pcoul = (255, 255, 0, 255)
-        elif tcouleur == 'M':
-            # Magenta / Fuchsia
-            pcoul = (255, 0, 255, 255)
-        elif tcouleur == 'O':
-            # Orange
-            pcoul = (255, 165, 0, 255)
-        elif tcouleur == 'P':
-            # Purple
-            pcoul = (128, 0, 128, 255)
-        elif tcouleur == 'D':
-            # Dim gray
-            pcoul = (105, 105, 105, 255)
+            pcoul = ARBITRARY_RGBA
         elif tcouleur == '?':
             # Random color
             pcoul = (rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(0, 255), 255)
-        elif tcouleur in self.banned_colors or tcouleur == 'T':
+        elif tcouleur in self.banned_colors and tcouleur not in NOT_BANNABLE_COLORS:
             # No color = Background color
-            return
-        elif tcouleur == 'F':
-            # Forest green
-            pcoul = (34, 139, 34, 255)
-        elif tcouleur == 'N':
-            # Navy
-            pcoul = (0, 0, 128, 255)
+            pcoul = None
+        elif tcouleur in COLORS:
+            # None for the background color ('T')
+            pcoul = COLORS[tcouleur][1]
         else:
             # No color = Background color
-            return
+            pcoul = None
 
-        # img du même type que PIL.ImageDraw.Draw
-        img.rectangle([(x, y), (x + tx - 1, y + ty - 1)], fill=pcoul, outline=None)
+        return pcoul
+
+    def couleurs_cellules(self, tailles: list[tuple[int, int]], xs: np.ndarray, ys: np.ndarray,
+                          txs: np.ndarray, tys: np.ndarray) -> np.ndarray:
+        """
+        Gives the random colors of some leaves with the cell generator (rng 'cell') : a pure function of the seed,
+        of the depth of each leaf and of its index in the grid of its depth
+
+            tailles : sizes of the levels (see tailles_niveaux)
+            xs, ys, txs, tys : the corners and the sizes of the leaves (in cells)
+
+        Returns :
+            the (n, 4) array of the RGBA colors
+        """
+
+        # La profondeur d'une feuille vient de sa taille (la première profondeur de cette taille)
+        profs = np.zeros(len(xs), dtype=np.int64)
+        for prof in reversed(range(len(tailles))):
+            profs[(txs == tailles[prof][0]) & (tys == tailles[prof][1])] = prof
+
+        valeurs = alea_cellules(self.rnd_seed, profs, xs // txs, ys // tys, canal=1)
+
+        couls = np.full((len(xs), 4), 255, dtype=np.uint8)
+        for num in range(3):
+            couls[:, num] = (valeurs >> np.uint64(8 * num)) & np.uint64(255)
+
+        return couls
+
+    def choix_noeuds(self, prof: int, codes: np.ndarray, xs: np.ndarray, ys: np.ndarray,
+                     nbs: np.ndarray) -> np.ndarray:
+        """
+        Gives the index of the chosen destination of some nodes of a depth (0 for a single destination)
+        with the cell generator (rng 'cell') : see alea_cellules
+
+            codes : the color codes of the nodes
+            xs, ys : the indexes of the nodes in the grid of their depth
+            nbs : the number of destinations of each color code (256,)
+        """
+
+        choix = np.zeros(np.shape(codes), dtype=np.intp)
+        multiples = nbs[codes] > 1
+
+        if multiples.any():
+            valeurs = alea_cellules(self.rnd_seed, prof, np.broadcast_to(xs, choix.shape)[multiples],
+                                    np.broadcast_to(ys, choix.shape)[multiples])
+            choix[multiples] = valeurs % nbs[codes[multiples]].astype(np.uint64)
+
+        return choix
+
+    def palette(self, col_fond: tuple[int, int, int, int]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Gives the RGBA table of the color codes (see strc_2_codes)
+
+        The random color ('?') is not in the table (see img)
+
+        Returns :
+            (table, dessine) with `table` the (256, 4) array of the colors, `col_fond` for the codes which
+            are not drawn, and `dessine` the (256,) boolean array of the drawn codes
+        """
+
+        table = np.empty((256, 4), dtype=np.uint8)
+        table[:] = col_fond
+        dessine = np.zeros(256, dtype=bool)
+
+        for code in range(1, 256):
+            if chr(code) == '?':
+                dessine[code] = True
+                continue
+
+            pcoul = self.couleur_rgba(chr(code))
+            if pcoul is not None:
+                table[code] = pcoul
+                dessine[code] = True
+
+        return table, dessine
 
     @staticmethod
     def pattern_colors(pattern: str) -> list[str]:
@@ -258,16 +956,77 @@ class Lsystg:
         if self.verbose:
             logger.warning(msg)
 
-    def error(self, msg: str) -> None:
-        """ Error message """
-        logger.error(msg)
-
-        raise LsystError(msg)
+    def stat(self, event: str, **valeurs) -> None:
+        """
+        Records the stats of an event ('iteration', 'tiles' or 'img') if the stats are on (see `stats`)
 
-    def img_remplir_gen(self, draw, lpos: list[list[int]], niveaux: list[tuple[int, int]],
-                        mmx: int, mmy: int, car: str) -> None:
+        The record is added to `stats[event]`, emitted as a structured loguru record (if verbose)
+        and given to `stats_callback`
         """
-        Remplir une image avec
+
+        if self.stats is None:
+            return
+
+        record = {'event': event, **valeurs}
+        self.stats[event].append(record)
+        self.stats['peak_rss_mb'] = peak_rss_mb()
+
+        if self.verbose:
+            logger.bind(stats=record).info(f"Stats {event} : {valeurs}")
+
+        if self.stats_callback is not None:
+            self.stats_callback(record)
+
+    def compter(self, cle: str, nb: int = 1) -> None:
+        """ Counts `nb` calls in the stats (see `stats`) """
+        if self.stats is not None:
+            self.stats[cle] += nb
+
+    def error(self, msg: str) -> None:
+        """ Error message """
+        logger.error(msg)
+
+        raise LsystError(msg)
+
+    @contextmanager
+    def etat_aleas(self):
+        """
+        Draws the random colors of a loaded result (see load) from its own state of `random` :
+        the global state is restored afterwards, the state of the result goes on from one rendering to the next
+        """
+
+        if self.dev_rnd is None:
+            yield
+            return
+
+        etat = rnd.getstate()
+        rnd.setstate(self.dev_rnd)
+        try:
+            yield
+        finally:
+            self.dev_rnd = rnd.getstate()
+            rnd.setstate(etat)
+
+    def checkpoint(self) -> None:
+        """
+        Cancellation checkpoint (expansion and rendering) :
+        raises LsystCancelled if `cancel()` is true or if the time budget is over
+        """
+
+        if self.cancel is not None and self.cancel():
+            msg = "The computation is cancelled"
+        elif self.deadline is not None and time.monotonic() > self.deadline:
+            msg = "The time budget is over"
+        else:
+            return
+
+        logger.warning(msg)
+        raise LsystCancelled(msg)
+
+    def img_remplir_gen(self, draw, lpos: list[list[int]], niveaux: list[tuple[int, int]],
+                        mmx: int, mmy: int, car: str) -> None:
+        """
+        Remplir une image avec
             draw : image du même type que PIL.ImageDraw.Draw
             lpos : "position"
             niveaux : rappel des niveaux
@@ -277,6 +1036,532 @@ class Lsystg:
 
         self.img_remplir(draw, *Lsystg.x_y_tx_ty(lpos, niveaux, mmx, mmy), couleur=car)
 
+    @staticmethod
+    def feuilles_chaine(chaine: str, tailles: list[tuple[int, int]]):
+        """
+        Gives the leaves (x, y, tx, ty, code) of a string result (see developpe_prf) in the order of the string,
+        in cells (the smallest cells of the result)
+
+            chaine : the string of `dev_prf`
+            tailles : sizes of the levels (see img)
+        """
+
+        # La position locale est une liste [[lx, ly], ...] et `origines` donne l'origine de chaque niveau
+        lpos = []
+        origines = []
+        lbfond = False
+
+        # Exemple de chaîne : '((KW_WK)W_W(KW_WK))' avec niveaux = [(4,4),(2,2),(1,1)]
+        # Autre exemple de chaîne avec fond précisé : '(&G(W/_/W)/_/(W/_/W))' avec niveaux = [(4,4),(2,2),(1,1)]
+        for car in chaine:
+            if car == '(':
+                if lpos:
+                    lpos[-1][0] += 1
+                    ltx, lty = tailles[len(lpos)]
+                    origines.append((origines[-1][0] + lpos[-1][0] * ltx, origines[-1][1] + lpos[-1][1] * lty))
+                else:
+                    origines.append((0, 0))
+                lpos.append([-1, 0])
+            elif car == ')':
+                lpos.pop()
+                origines.pop()
+            elif car == '_':
+                lpos[-1][0] = -1
+                lpos[-1][1] += 1
+            elif car == '&':
+                # Couleur de fond à venir
+                lbfond = True
+            else:
+                # Un caractère de couleur à traiter
+                if lbfond and lpos[-1][0] == -1:
+                    # Pour le fond : tout le carré local
+                    x, y = origines[-1]
+                    ltx, lty = tailles[len(lpos) - 1]
+                else:
+                    # Pour le carré local
+                    if not lbfond:
+                        lpos[-1][0] += 1
+                    ltx, lty = tailles[len(lpos)]
+                    x, y = origines[-1][0] + lpos[-1][0] * ltx, origines[-1][1] + lpos[-1][1] * lty
+
+                lbfond = False
+
+                yield x, y, ltx, lty, ord(car) if car.isascii() else 0
+
+    @staticmethod
+    def noeuds_chaine(chaine: str, niveaux: list[tuple[int, int]],
+                      cars: set[str]) -> tuple[list[int], list[int], list[int], list[int]]:
+        """
+        Gives the nodes of some color characters of a string result (see developpe_prf), for the cell generator :
+        the depth of a character is its number of '(' and its position is its index in the grid of this depth
+
+            niveaux : the levels of the string
+            cars : the color characters wanted
+
+        Returns :
+            (positions, profs, xs, ys) with `positions` the indexes of the characters in the string
+        """
+
+        positions, profs, xs, ys = [], [], [], []
+        groupes = []  # Pour chaque '(' ouverte : [x, y, lx, ly] son index et la position locale courante
+        lbfond = False
+
+        for pos, car in enumerate(chaine):
+            if car == '(':
+                if groupes:
+                    groupe = groupes[-1]
+                    groupe[2] += 1
+                    multx, multy = niveaux[len(groupes) - 1]
+                    groupes.append([groupe[0] * multx + groupe[2], groupe[1] * multy + groupe[3], -1, 0])
+                else:
+                    groupes.append([0, 0, -1, 0])
+            elif car == ')':
+                groupes.pop()
+            elif car == '_':
+                groupes[-1][2] = -1
+                groupes[-1][3] += 1
+            elif car == '&':
+                lbfond = True
+            else:
+                if not groupes:
+                    # Axiome d'un seul caractère
+                    noeud = (0, 0, 0)
+                elif lbfond and groupes[-1][2] == -1:
+                    # Le fond : le noeud du groupe
+                    noeud = (len(groupes) - 1, groupes[-1][0], groupes[-1][1])
+                else:
+                    groupe = groupes[-1]
+                    if not lbfond:
+                        groupe[2] += 1
+                    multx, multy = niveaux[len(groupes) - 1]
+                    noeud = (len(groupes), groupe[0] * multx + groupe[2], groupe[1] * multy + groupe[3])
+
+                lbfond = False
+
+                if car in cars:
+                    positions.append(pos)
+                    profs.append(noeud[0])
+                    xs.append(noeud[1])
+                    ys.append(noeud[2])
+
+        return positions, profs, xs, ys
+
+    @staticmethod
+    def grille_feuilles(feuilles, taille: tuple[int, int], dessine: np.ndarray, nb_max: int = 1 << 16,
+                        checkpoint: Optional[Callable[[], None]] = None
+                        ) -> tuple[np.ndarray, list[tuple[int, int, int, int]]]:
+        """
+        Gives the grid of color codes (for the smallest cells) drawn by some leaves
+
+            feuilles : iterable of leaves (x, y, tx, ty, code) in depth-first order
+            taille : size of the grid (in cells)
+            dessine : the drawn color codes (see palette)
+            nb_max : number of leaves stored before filling the grid
+            checkpoint (opt) : called before each filling (see Lsystg.checkpoint)
+
+        Returns :
+            (grille, aleas) with `grille` the grid of color codes (0 where nothing is drawn)
+            and `aleas` the leaves (x, y, tx, ty) with a random color, in depth-first order
+        """
+
+        grille = np.zeros((taille[1], taille[0]), dtype=np.uint8)
+        xs, ys, codes = [], [], []
+        series = []  # [tx, ty, début] : les séquences de feuilles consécutives de la même taille
+        aleas = []
+        code_alea = ord('?')
+
+        def remplir():
+            if checkpoint is not None:
+                checkpoint()
+
+            # Dans l'ordre de la chaîne (un fond peut être redessiné par une feuille suivante plus grande)
+            fins = [serie[2] for serie in series[1:]] + [len(xs)]
+            for (ltx, lty, debut), fin in zip(series, fins):
+                remplir_blocs(grille, np.array(xs[debut:fin]), np.array(ys[debut:fin]), ltx, lty,
+                              np.array(codes[debut:fin], dtype=np.uint8))
+            xs.clear()
+            ys.clear()
+            codes.clear()
+            series.clear()
+
+        for x, y, ltx, lty, code in feuilles:
+            if not dessine[code]:
+                continue
+
+            if code == code_alea:
+                aleas.append((x, y, ltx, lty))
+
+            if not series or series[-1][0] != ltx or series[-1][1] != lty:
+                series.append([ltx, lty, len(xs)])
+            xs.append(x)
+            ys.append(y)
+            codes.append(code)
+
+            if len(xs) == nb_max:
+                remplir()
+
+        remplir()
+
+        return grille, aleas
+
+    def aleas_grid(self, tailles: list[tuple[int, int]]) -> list[tuple[int, int, int, int]]:
+        """
+        Gives the cells (x, y, tx, ty) with a random color of a grid result, in depth-first order
+
+            tailles : sizes of the levels (see img)
+        """
+
+        grille, niveaux = self.dev_prf
+        ys, xs = np.nonzero(grille == ord('?'))
+
+        if self.dev_depth is None:
+            prof = np.full(len(xs), len(niveaux))
+        else:
+            prof = self.dev_depth[ys, xs]
+
+        txs = np.array([ltx for ltx, _ in tailles])[prof]
+        tys = np.array([lty for _, lty in tailles])[prof]
+
+        # Un seul tirage par feuille : on garde le coin haut gauche de chaque feuille
+        # (et les feuilles dont le coin est recouvert, pour un fond converti par save)
+        coins = (xs % txs == 0) & (ys % tys == 0)
+        caches = ~coins & (grille[ys // tys * tys, xs // txs * txs] != ord('?'))
+        if caches.any():
+            autres = np.unique(np.stack([ys // tys * tys, xs // txs * txs, tys, txs])[:, caches], axis=1)
+            ys, xs, tys, txs = (np.concatenate([valeurs[coins], autres[num]])
+                                for num, valeurs in enumerate((ys, xs, tys, txs)))
+        else:
+            xs, ys, txs, tys = xs[coins], ys[coins], txs[coins], tys[coins]
+
+        # Pour un même coin, la plus grande feuille (le fond) d'abord
+        ordre = np.lexsort((-txs * tys, rang_prf(niveaux, xs, ys)))
+
+        return list(zip(xs[ordre].tolist(), ys[ordre].tolist(), txs[ordre].tolist(), tys[ordre].tolist()))
+
+    def blocs_tuiles(self, prof: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gives the tiles of a level of `tuiles_prf` as a table : blocks per color code,
+        the tiles of the code (one per destination) or a uniform block of the code for a leaf
+
+        Returns :
+            (blocs, reecrit, nbs) with `blocs` the (256, nb, multy, multx) table, `reecrit` the codes having a tile
+            and `nbs` the number of destinations of each code
+        """
+
+        _, niveaux, tuiles = self.tuiles_prf()
+        multx, multy = niveaux[prof]
+        nb_max = max([1] + [len(tuile) for tuile in tuiles[prof].values() if tuile.ndim == 3])
+
+        blocs = np.empty((256, nb_max, multy, multx), dtype=np.uint8)
+        blocs[:] = np.arange(256, dtype=np.uint8)[:, None, None, None]
+        reecrit = np.zeros(256, dtype=bool)
+        nbs = np.ones(256, dtype=np.int64)
+
+        for code, tuile in tuiles[prof].items():
+            if tuile.ndim == 3:
+                blocs[code, :len(tuile)] = tuile
+                nbs[code] = len(tuile)
+            else:
+                blocs[code] = tuile
+            reecrit[code] = True
+
+        return blocs, reecrit, nbs
+
+    def color_at(self, x: int, y: int, depth: Optional[int] = None, cells: bool = False) -> Optional[str]:
+        """
+        Gives the color of the result at a position, without expanding anything
+
+            x, y : the position (in pixels, or in cells if `cells` is True)
+            depth (opt) : number of levels used (all the levels by default)
+
+        The levels are walked down by integer division of the position : the cost is O(depth)
+
+        Returns :
+            the color character ('?' for the random color) or None outside of the result
+        """
+
+        if self.grille_resultat() is not None:
+            code = int(self.colors_at(np.array([x]), np.array([y]), depth, cells)[0])
+            return chr(code) if code else None
+
+        racine, niveaux, tuiles = self.tuiles_prf()
+        depth = self.profondeur_niveaux(depth, niveaux)
+
+        if not cells:
+            x, y = x // self.x_basis, y // self.y_basis
+
+        tailles = tailles_niveaux(niveaux[:depth])
+        if not (0 <= x < tailles[0][0] and 0 <= y < tailles[0][1]):
+            return None
+
+        code = racine
+        for prof in range(depth):
+            if code not in tuiles[prof]:
+                break
+
+            ltx, lty = tailles[prof + 1]
+            tuile = tuiles[prof][code]
+            if tuile.ndim == 3:
+                tuile = tuile[int(alea_cellules(self.rnd_seed, prof, x // tailles[prof][0],
+                                                y // tailles[prof][1]) % np.uint64(len(tuile)))]
+            code = int(tuile[y // lty % tuile.shape[0], x // ltx % tuile.shape[1]])
+
+        return chr(code)
+
+    def colors_at(self, xs: np.ndarray, ys: np.ndarray, depth: Optional[int] = None,
+                  cells: bool = False) -> np.ndarray:
+        """
+        Vectorised version of `color_at`, for arrays of positions
+
+        Returns :
+            the array of the color codes (see strc_2_codes), 0 outside of the result
+        """
+
+        xs, ys = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64)
+        if not cells:
+            xs, ys = xs // self.x_basis, ys // self.y_basis
+
+        grille = self.grille_resultat()
+        if grille is not None:
+            # Seules les pages des cellules demandées sont lues (grille projetée en mémoire, voir load)
+            self.profondeur_grille(depth)
+            nby, nbx = grille.shape
+            dedans = (xs >= 0) & (xs < nbx) & (ys >= 0) & (ys < nby)
+            return np.where(dedans, grille[np.clip(ys, 0, nby - 1), np.clip(xs, 0, nbx - 1)], 0).astype(np.uint8)
+
+        racine, niveaux, _ = self.tuiles_prf()
+        depth = self.profondeur_niveaux(depth, niveaux)
+
+        tailles = tailles_niveaux(niveaux[:depth])
+        dedans = (xs >= 0) & (xs < tailles[0][0]) & (ys >= 0) & (ys < tailles[0][1])
+
+        codes = np.full(np.broadcast(xs, ys).shape, racine, dtype=np.uint8)
+        for prof in range(depth):
+            multx, multy = niveaux[prof]
+            ltx, lty = tailles[prof + 1]
+            blocs, _, nbs = self.blocs_tuiles(prof)
+            choix = self.choix_noeuds(prof, codes, xs // tailles[prof][0], ys // tailles[prof][1], nbs)
+
+            codes = blocs[codes, choix, ys // lty % multy, xs // ltx % multx]
+
+        return np.where(dedans, codes, 0).astype(np.uint8)
+
+    def grille_resultat(self) -> Optional[np.ndarray]:
+        """ Gives the grid of color codes of a grid result (engine 'grid' or see load), None otherwise """
+        if isinstance(self.dev_prf, list) and isinstance(self.dev_prf[0], np.ndarray):
+            return self.dev_prf[0]
+        return None
+
+    def niveaux_prf(self) -> list[tuple[int, int]]:
+        """ Gives the levels of the result : the ones of a grid result, of the tree (see tuiles_prf) otherwise """
+        if self.grille_resultat() is not None:
+            return list(self.dev_prf[1])
+        return self.tuiles_prf()[1]
+
+    def profondeur_niveaux(self, depth: Optional[int], niveaux: list[tuple[int, int]]) -> int:
+        """ Checks a depth (number of levels used, all the levels if None) and gives it """
+        if depth is None:
+            return len(niveaux)
+
+        if not 0 <= depth <= len(niveaux):
+            self.error(f"The depth must be in 0 .. {len(niveaux)}")
+
+        return depth
+
+    def profondeur_grille(self, depth: Optional[int]) -> None:
+        """ Checks a depth for a grid result : only its last level is known """
+        if depth is not None and depth != len(self.dev_prf[1]):
+            self.error(f"Only the depth {len(self.dev_prf[1])} is known for a grid result")
+
+    def region_grid(self, cx0: int, cy0: int, cx1: int, cy1: int,
+                    depth: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gives the smallest cells of the result (at a given depth) which are in a window,
+        from the tree of `tuiles_prf` : only the cells intersecting the window are visited
+
+            cx0, cy0, cx1, cy1 : the window (in cells, cx1 and cy1 excluded)
+            depth : number of levels used
+
+        Returns :
+            (codes, xs, ys, profs) the color code, the position and the depth of the leaf of each cell
+        """
+
+        grille = self.grille_resultat()
+        if grille is not None:
+            # Résultat en grille : seules les lignes de la fenêtre sont lues
+            self.profondeur_grille(depth)
+            nby, nbx = grille.shape
+            cx0, cy0, cx1, cy1 = max(cx0, 0), max(cy0, 0), min(cx1, nbx), min(cy1, nby)
+            ys, xs = np.mgrid[cy0:max(cy0, cy1), cx0:max(cx0, cx1)]
+
+            codes = np.asarray(grille[cy0:cy1, cx0:cx1]).ravel()
+            if self.dev_depth is None:
+                profs = np.full(codes.shape, depth, dtype=np.uint8)
+            else:
+                profs = np.asarray(self.dev_depth[cy0:cy1, cx0:cx1]).ravel()
+
+            return codes, xs.ravel().astype(np.int64), ys.ravel().astype(np.int64), profs
+
+        racine, niveaux, _ = self.tuiles_prf()
+        tailles = tailles_niveaux(niveaux[:depth])
+
+        codes = np.array([racine], dtype=np.uint8)
+        xs = np.zeros(1, dtype=np.int64)
+        ys = np.zeros(1, dtype=np.int64)
+        profs = np.zeros(1, dtype=np.uint8)
+
+        for prof in range(depth):
+            multx, multy = niveaux[prof]
+            ltx, lty = tailles[prof + 1]
+            blocs, reecrit, nbs = self.blocs_tuiles(prof)
+            choix = self.choix_noeuds(prof, codes, xs // tailles[prof][0], ys // tailles[prof][1], nbs)
+
+            lys, lxs = np.divmod(np.arange(multx * multy), multx)
+
+            nxs = (xs[:, None] + lxs * ltx).ravel()
+            nys = (ys[:, None] + lys * lty).ravel()
+            garde = (nxs < cx1) & (nxs + ltx > cx0) & (nys < cy1) & (nys + lty > cy0)
+
+            profs = np.where(reecrit[codes], prof + 1, profs).repeat(multx * multy)[garde]
+            codes = blocs[codes, choix].reshape(-1)[garde]
+            xs, ys = nxs[garde], nys[garde]
+
+        return codes, xs, ys, profs
+
+    def render_region(self, x: int, y: int, w: int, h: int, depth: Optional[int] = None,
+                      col_fond: tuple[int, int, int, int] = (0, 0, 0, 0)):
+        """
+        Gives the image of a window of the result, without building the whole image
+
+            x, y, w, h : the window (in pixels)
+            depth (opt) : number of levels used (all the levels by default)
+            col_fond : background color - (0,0,0,0) for a transparent background
+
+        Only the cells intersecting the window are visited (see region_grid) :
+        the cost is proportional to the size of the window, not to the size of the whole image
+
+        Returns :
+            the image (w x h pixels)
+        """
+
+        depth = self.profondeur_niveaux(depth, self.niveaux_prf())
+
+        if w <= 0 or h <= 0:
+            self.error("The window is empty")
+
+        table, _ = self.palette(col_fond)
+
+        return pim.fromarray(self.pixels_fenetre(x, y, w, h, depth, table, {}))
+
+    def pixels_fenetre(self, x: int, y: int, w: int, h: int, depth: int, table: np.ndarray,
+                       couls_aleas: dict) -> np.ndarray:
+        """
+        Gives the RGBA pixels of a window of the result (see render_region)
+
+            couls_aleas : colors of the random leaves already drawn (see remplir_aleas)
+        """
+
+        mmx, mmy = self.x_basis, self.y_basis
+
+        # La fenêtre en cellules
+        cx0, cy0 = x // mmx, y // mmy
+        cx1, cy1 = -(-(x + w) // mmx), -(-(y + h) // mmy)
+
+        codes, xs, ys, profs = self.region_grid(cx0, cy0, cx1, cy1, depth)
+
+        grille = np.zeros((cy1 - cy0, cx1 - cx0), dtype=np.uint8)
+        grille[ys - cy0, xs - cx0] = codes
+        pixels = table[grille]
+
+        self.remplir_aleas(pixels, codes, xs, ys, profs, self.niveaux_prf()[:depth], couls_aleas, cx0, cy0)
+
+        # Agrandir avec les nombres de pixels de base, puis découper la fenêtre
+        nby, nbx = grille.shape
+        pixels = np.broadcast_to(pixels[:, None, :, None, :], (nby, mmy, nbx, mmx, 4))
+        pixels = pixels.reshape(nby * mmy, nbx * mmx, 4)[y - cy0 * mmy:y - cy0 * mmy + h,
+                                                          x - cx0 * mmx:x - cx0 * mmx + w]
+
+        return np.ascontiguousarray(pixels)
+
+    def remplir_aleas(self, pixels: np.ndarray, codes: np.ndarray, xs: np.ndarray, ys: np.ndarray,
+                      profs: np.ndarray, niveaux: list[tuple[int, int]], couls_aleas: dict, cx0: int, cy0: int) -> None:
+        """
+        Draws the random colors of the cells of a window (see region_grid) into its pixels
+
+        The new leaves are drawn in depth-first order, a leaf already in `couls_aleas` keeps its color :
+        a leaf crossing several windows gets a single color
+
+            pixels : pixels of the window (one per cell), its top left cell being (cx0, cy0)
+            couls_aleas : {(depth, x, y): color} the leaves already drawn, updated
+        """
+
+        sel = codes == ord('?')
+        if not sel.any():
+            return
+
+        tailles = np.array(tailles_niveaux(niveaux))[profs[sel]]
+        coins = np.stack([profs[sel], xs[sel] // tailles[:, 0] * tailles[:, 0],
+                          ys[sel] // tailles[:, 1] * tailles[:, 1]], axis=1)
+        feuilles, inverse = np.unique(coins, axis=0, return_inverse=True)
+
+        if self.rng == 'cell':
+            ltailles = np.array(tailles_niveaux(niveaux))[feuilles[:, 0]]
+            couls = self.couleurs_cellules(tailles_niveaux(niveaux), feuilles[:, 1], feuilles[:, 2],
+                                           ltailles[:, 0], ltailles[:, 1])
+            pixels[ys[sel] - cy0, xs[sel] - cx0] = couls[inverse.ravel()]
+            return
+
+        couls = np.empty((len(feuilles), 4), dtype=np.uint8)
+        with self.etat_aleas():
+            for lf in np.argsort(rang_prf(niveaux, feuilles[:, 1], feuilles[:, 2]), kind='stable'):
+                feuille = tuple(feuilles[lf].tolist())
+                if feuille not in couls_aleas:
+                    couls_aleas[feuille] = self.couleur_rgba('?')
+                couls[lf] = couls_aleas[feuille]
+
+        pixels[ys[sel] - cy0, xs[sel] - cx0] = couls[inverse.ravel()]
+
+    def transf_motif(self, nchaine: str, li: int) -> str:
+        """
+        Gives a destination transformed li times by func_transf
+
+        For the functions of TRANSF_D4, the li transformations are replaced by a single one (see puissance_d4)
+        """
+
+        if self.func_transf in TRANSF_D4:
+            self.compter('d4_transforms')
+            return strc_d4(nchaine, *puissance_d4(*TRANSF_D4[self.func_transf], li))
+
+        if self.func_transf is not None:
+            self.compter('func_transf_calls', li)
+            for _ in range(li):
+                nchaine = self.func_transf(nchaine)
+
+        return nchaine
+
+    def tab_motif(self, nchaine: str, li: int) -> Optional[np.ndarray]:
+        """
+        Gives the grid of color codes (see strc_2_codes) of a destination transformed li times by func_transf
+
+        For the functions of TRANSF_D4, the transformation is done on the grid of the destination
+
+        Returns :
+            the grid, or None if the destination is not usable as a grid
+        """
+
+        if set('()&') & set(nchaine):
+            return None
+
+        if self.func_transf in TRANSF_D4:
+            tab = strc_2_codes(nchaine)
+            if tab is None:
+                return None
+
+            self.compter('d4_transforms')
+            return np.ascontiguousarray(transf_d4(tab, *puissance_d4(*TRANSF_D4[self.func_transf], li)))
+
+        return strc_2_codes(self.transf_motif(nchaine, li))
+
     def decoupe_str(self, chaine: str) -> tuple[int, int]:
         """
         Donne la "découpe" d'une chaîne pour le "coloriage en quadrillage"
@@ -307,13 +1592,15 @@ class Lsystg:
 
         return width, height
 
-    def developpe_unit_prf(self, chaine: str, li: int) -> tuple[str, tuple[int, int]]:
+    def developpe_unit_prf(self, chaine: str, li: int,
+                           niveaux: Optional[list[tuple[int, int]]] = None) -> tuple[str, tuple[int, int]]:
         """
         Développe un chaîne à partir d'une collection itérable de règles
 
             chaine : chaîne à transformer
             // regles : séquence des règles de remplacement
             li : numéro d'itération (dans 0 .. nbiter-1) -- pour func_transf
+            niveaux (opt) : niveaux de la chaîne -- pour les choix par cellule (rng 'cell')
             // nbiter : nombre d'itérations maximal -- pour func_transf
             // func_transf : fonction éventuelle de transformation du motif à appliquer
                 A faire autant de fois qu'il y a d'itérations (car les règles ne sont pas modifiées)
@@ -322,6 +1609,9 @@ class Lsystg:
             Le retour est étendu (un tuple ... au lieu d'une chaîne)
             On remplace avec '(' et ')' comme préfixe et suffixe
 
+        Les règles sont regroupées dans une seule expression régulière :
+            la chaîne est développée en une seule passe
+
         Voir la fonction `developpe_prf` pour le detail d'une règle
 
         En retour :
@@ -330,73 +1620,117 @@ class Lsystg:
                 resultat : la chaîne transformée
                 ndecoupe : la nouvelle "découpe" ajoutée (voir decoupe_str) ou None
         """
-        resultat = chaine
-        position = 0
         ndecoupe = None
+        debut = time.perf_counter()
+        self.checkpoint()
 
         if self.func_alea is not None:
             stockalea = Counter()
         else:
             stockalea = None
 
-        while True:
-            if len(resultat) > self.max_result_size:
-                self.warning(f"The size limit is reached : {len(resultat)} > {self.max_result_size}")
-                self.error("The result is over the accepted size limit ! The number of iterations may be too high ")
-
-            # On recherche la plus "petite règle" (plus petite en position) à appliquer
-            newpos = None
-            lreg = -1
-            for lr, regle in enumerate(self.rules):
-                # regle :
-                #      (chaine_depart, chaine_arrivee)
-                #   OU (chaine_depart, liste_arrivee) avec liste_arrivee = [chaine_arrivee, ...]
-                #   OU (arg1, arg2, fonction_filtre)
-
-                if len(regle) >= 3:
-                    lb_res = regle[2](li, self.nbiter)  # On vérifie que la règle peut être appliquée
-
-                    if not lb_res:
-                        continue
-
-                lpos = resultat.find(regle[0], position)
-                if lpos >= 0:
-                    if newpos is None or lpos < newpos:
-                        newpos = lpos
-                        lreg = lr
-
-            if newpos is None:
+        # regle :
+        #      (chaine_depart, chaine_arrivee)
+        #   OU (chaine_depart, liste_arrivee) avec liste_arrivee = [chaine_arrivee, ...]
+        #   OU (arg1, arg2, fonction_filtre)
+
+        # Les règles applicables pour cette itération (chaque filtre n'est évalué qu'une fois)
+        regles = {}
+        nb_filtres = 0
+        for regle in self.rules:
+            nb_filtres += len(regle) >= 3
+            if len(regle) < 3 or regle[2](li, self.nbiter):
+                # Pour un même départ, la première règle l'emporte
+                regles.setdefault(regle[0], regle)
+
+        # Une seule expression : la plus "petite règle" (plus petite en position) est trouvée en premier
+        # et, à une même position, l'alternative de la première règle l'emporte
+        morceaux = []
+        position = 0
+        taille = len(chaine)
+        transformes = {}  # Motifs transformés par func_transf (voir TRANSF_D4)
+
+        if regles:
+            trouves = re.compile('|'.join(re.escape(depart) for depart in regles)).finditer(chaine)
+        else:
+            trouves = ()
+
+        # Avec rng 'cell', chaque choix ne dépend que du noeud remplacé (voir choix_noeuds)
+        choix = {}
+        multiples = {depart for depart, regle in regles.items() if not isinstance(regle[1], str)}
+        if self.rng == 'cell' and self.func_alea is None and multiples:
+            if any(len(depart) != 1 for depart in multiples):
+                self.error("The random choices by cell need a single character to replace (see rng)")
+
+            nbs = np.ones(256, dtype=np.int64)
+            for depart in multiples:
+                nbs[ord(depart)] = len(regles[depart][1])
+
+            positions, profs, xs, ys = (np.array(valeurs, dtype=np.int64)
+                                        for valeurs in self.noeuds_chaine(chaine, niveaux or [], multiples))
+            codes = np.array([ord(chaine[pos]) for pos in positions.tolist()], dtype=np.int64)
+
+            for prof in np.unique(profs).tolist():
+                sel = profs == prof
+                choix.update(zip(positions[sel].tolist(),
+                                 self.choix_noeuds(prof, codes[sel], xs[sel], ys[sel], nbs).tolist()))
+
+        for trouve in trouves:
+            if taille > self.max_result_size:
                 break
 
-            if isinstance(self.rules[lreg][1], str):
+            if len(morceaux) % 65536 == 0:
+                self.checkpoint()
+
+            regle = regles[trouve.group()]
+
+            if isinstance(regle[1], str):
                 # Chaîne
-                nchaine = self.rules[lreg][1]
+                nchaine = regle[1]
             else:
                 # Pas chaîne : itérable de chaînes
-                if self.func_alea is None:
-                    nchaine = rnd.choice(self.rules[lreg][1])
+                if choix:
+                    nchaine = list(regle[1])[choix[trouve.start()]]
+                elif self.func_alea is None:
+                    nchaine = rnd.choice(regle[1])
                 else:
-                    stockalea[self.rules[lreg][0]] += 1
-                    nchaine = self.func_alea(self.rules[lreg][1], stockalea[self.rules[lreg][0]] - 1)
+                    stockalea[regle[0]] += 1
+                    nchaine = self.func_alea(regle[1], stockalea[regle[0]] - 1)
 
             if ndecoupe is None:
                 ndecoupe = self.decoupe_str(nchaine)
 
-            if self.func_transf is not None:
+            if self.func_transf in TRANSF_D4:
+                # Le motif transformé n'est calculé qu'une fois par itération
+                if nchaine not in transformes:
+                    transformes[nchaine] = self.transf_motif(nchaine, li)
+                nchaine = transformes[nchaine]
+            elif self.func_transf is not None:
                 # On "transforme" le motif de destination (nchaine) avec func_transf
+                self.compter('func_transf_calls', li)
                 for _ in range(li):
                     nchaine = self.func_transf(nchaine)
 
-            nchaine = '(' + nchaine + ')'
+            morceaux.append(chaine[position:trouve.start()])
+            morceaux.append('(' + nchaine + ')')
+            position = trouve.end()
+            taille += len(nchaine) + 2 - len(regle[0])
 
-            resultat = resultat[0:newpos] + resultat[newpos:].replace(self.rules[lreg][0], nchaine, 1)
-            position = newpos + len(nchaine)
+        if taille > self.max_result_size:
+            self.warning(f"The size limit is reached : {taille} > {self.max_result_size}")
+            self.error("The result is over the accepted size limit ! The number of iterations may be too high ")
+
+        morceaux.append(chaine[position:])
+        resultat = ''.join(morceaux)
 
         if self.verbose:
             logger.info(f"Resulting string with {len(resultat)} characters")
             logger.info(f"First 50 characters : {resultat[:50]}")
             logger.info(f"Last 50 characters : {resultat[-50:]}")
 
+        self.stat('iteration', iteration=li, seconds=time.perf_counter() - debut, replacements=len(morceaux) // 2,
+                  rule_scans=len(regles), rule_filters=nb_filtres, size=len(resultat), level=ndecoupe)
+
         return resultat, ndecoupe
 
     def developpe_prf(self) -> list:
@@ -432,6 +1766,14 @@ class Lsystg:
 
         """
 
+        if self.engine == 'grid':
+            return self.developpe_prf_grid()
+
+        if self.engine == 'lazy':
+            # Nothing is expanded : only the levels are known (see iter_cells)
+            self.dev_prf = [None, list(self.tuiles_prf()[1])]
+            return self.dev_prf
+
         niveaux = []
 
         if '(' in self.axiom or ')' in self.axiom:
@@ -445,50 +1787,749 @@ class Lsystg:
         else:
             source = self.axiom
 
-        resultat = source
+        self.dev_snapshots = [((source, tuple(niveaux)), rnd.getstate())]
 
-        for li in range(self.nbiter):
-            resultat, ndecoupe = self.developpe_unit_prf(resultat, li)
+        return self.developpe_prf_suite(0)
+
+    def developpe_prf_suite(self, debut: int) -> list:
+        """
+        Expands from the snapshot of the iteration `debut` up to nbiter (see developpe_prf and extend),
+        a snapshot is kept after each iteration
+        """
+
+        (resultat, niveaux), etat_rnd = self.dev_snapshots[debut]
+        niveaux = list(niveaux)
+        del self.dev_snapshots[debut + 1:]
+        rnd.setstate(etat_rnd)
+
+        for li in range(debut, self.nbiter):
+            resultat, ndecoupe = self.developpe_unit_prf(resultat, li, niveaux)
             if ndecoupe:
                 niveaux.append(ndecoupe)
 
+            self.dev_snapshots.append(((resultat, tuple(niveaux)), rnd.getstate()))
+
         # La valeur de retour est une liste pour avoir la possibilité de modification
         self.dev_prf = [resultat, niveaux]
         return self.dev_prf
 
-    def developpe_prf_patterns(self) -> list:
-        """
-        This method generates an axiom and some rules from s.patterns, s.colors, s.banned_colors (s = self)
+    def extend(self, k: int = 1) -> list:
         """
+        Changes the number of iterations by k (negative to go back) and updates the result
+        from the deepest snapshot still valid (see dev_snapshots) : only the missing iterations are expanded
 
-        nb_motif = len(self.patterns)
-        nb_coul = len(self.colors)
+        A rule filter gets nbiter (see developpe_prf) : the expansion restarts from the first iteration
+        where a filter gives another result with the new nbiter. The random choices are the same as
+        with a new Lsystg (the state of `random` is in the snapshots)
 
-        if nb_motif == 0:
-            self.error("There is no valid pattern")
+        Returns :
+            the new result (see developpe_prf)
+        """
 
-        if nb_coul == 0:
-            self.error("There is no valid color")
+        ancien, nbiter = self.nbiter, self.nbiter + k
+        if self.rules is None:
+            self.error("The rules are not known (see load) : the result can not be extended")
 
-        self.axiom = self.colors[0]  # # The axiom is simply the first color
+        if nbiter < 0:
+            self.error(f"The number of iterations can not be {nbiter}")
 
-        possible_col = [coul for coul in self.colors if coul not in self.banned_colors]
-        nb_possible = len(possible_col)
+        self.nbiter = nbiter
+        self.dev_tiles = None
 
-        if nb_possible == 0:
-            self.error("There is no valid usable color")
+        if self.engine == 'lazy' or not self.dev_snapshots:
+            return self.developpe_prf()
 
-        self.rules = []
+        filtres = [regle[2] for regle in self.rules if len(regle) >= 3]
+        debut = min(ancien, nbiter)
+        for li in range(debut):
+            if any(bool(filtre(li, ancien)) != bool(filtre(li, nbiter)) for filtre in filtres):
+                debut = li
+                break
 
-        for lic, coul in enumerate(self.colors):
+        if self.engine == 'grid':
+            return self.developpe_prf_grid_suite(debut)
 
-            motif = self.patterns[lic % nb_motif]  # % ... : Cycle over patterns
+        return self.developpe_prf_suite(debut)
 
-            coulm = Lsystg.pattern_colors(motif)
-            nb_coulm = len(coulm)
+    def regles_grid(self, li: int) -> dict[int, tuple[tuple, list[np.ndarray]]]:
+        """
+        Gives the rules usable by the grid engine for the iteration li (in 0 .. nbiter-1)
 
-            n_possible_col = possible_col
-            n_nb_possible = nb_possible
+        The filter functions are evaluated once and the destinations are transformed (func_transf) li times
+
+        Returns :
+            {code: (regle, tabs)} with `code` the color code to replace and `tabs` the grids of the destinations
+        """
+
+        regles = {}
+
+        for regle in self.rules:
+            if len(regle[0]) != 1 or not regle[0].isascii():
+                self.error("The grid engine needs rules with a single character to replace")
+
+            code = ord(regle[0])
+            if code in regles:
+                # The first rule wins (as in developpe_unit_prf)
+                continue
+
+            if len(regle) >= 3 and not regle[2](li, self.nbiter):
+                continue
+
+            destinations = [regle[1]] if isinstance(regle[1], str) else regle[1]
+
+            tabs = []
+            for nchaine in destinations:
+                tab = self.tab_motif(nchaine, li)
+                if tab is None:
+                    self.error(f"The grid engine can not use the destination {nchaine}")
+
+                # The string engine keeps the size of the destination before func_transf (see decoupe_str)
+                if self.engine != 'string' and tab.shape[::-1] != self.decoupe_str(nchaine):
+                    self.error(f"The grid engine can not use the destination {nchaine} : "
+                               f"its size is changed by func_transf")
+
+                tabs.append(tab)
+
+            regles[code] = (regle, tabs)
+
+        return regles
+
+    def choix_grid(self, grille: np.ndarray, regles: dict, multiples: list[int],
+                   niveaux: list[tuple[int, int]]) -> np.ndarray:
+        """
+        Gives the index of the chosen destination for each cell of a grid (0 for a single destination)
+
+        The choices are made in depth-first order, like in `developpe_unit_prf`, so the results are the same
+        (with rng 'cell', each choice only depends on the cell, see choix_noeuds)
+        """
+
+        plat = grille.ravel()
+        choix = np.zeros(plat.size, dtype=np.intp)
+
+        if self.rng == 'cell' and self.func_alea is None:
+            # Les cellules de la grille sont à la profondeur len(niveaux)
+            nbs = np.ones(256, dtype=np.int64)
+            for code in multiples:
+                nbs[code] = len(regles[code][1])
+
+            ys, xs = np.divmod(np.arange(plat.size), grille.shape[1])
+            return self.choix_noeuds(len(niveaux), plat, xs, ys, nbs).reshape(grille.shape)
+
+        if self.func_alea is not None:
+            stockalea = Counter()
+        else:
+            stockalea = None
+
+        cellules = np.flatnonzero(np.isin(plat, multiples))
+        ys, xs = np.divmod(cellules, grille.shape[1])
+        for pos in cellules[np.argsort(rang_prf(niveaux, xs, ys), kind='stable')].tolist():
+            regle = regles[int(plat[pos])][0]
+
+            if self.func_alea is None:
+                # Same use of the random generator as rnd.choice(regle[1])
+                choix[pos] = rnd.choice(range(len(regle[1])))
+            else:
+                stockalea[regle[0]] += 1
+                nchaine = self.func_alea(regle[1], stockalea[regle[0]] - 1)
+                choix[pos] = list(regle[1]).index(nchaine)
+
+        return choix.reshape(grille.shape)
+
+    def axiome_grid(self) -> tuple[np.ndarray, list[tuple[int, int]]]:
+        """
+        Gives the grid of color codes of the axiom (see strc_2_codes) and its level
+
+        Returns :
+            (grille, niveaux) with `niveaux` = [] for an axiom with a single character
+        """
+
+        if '(' in self.axiom or ')' in self.axiom or '&' in self.axiom:
+            self.error("Axiom with '(', ')' or '&'")
+
+        if self.sep2 in self.axiom or len(self.axiom) == 1:
+            grille = strc_2_codes(self.axiom)
+        else:
+            grille = None
+
+        if grille is None:
+            self.error("The grid engine needs an axiom with a single character or a rectangular grid")
+
+        if self.sep2 in self.axiom:
+            return grille, [self.decoupe_str(self.axiom)]
+
+        return grille, []
+
+    def actifs_grid(self, regles: dict, presents: set[int], restes: set[int]) -> tuple[list[int], tuple[int, int]]:
+        """
+        Gives the color codes rewritten at an iteration and the size of their destinations
+
+            regles : the rules of the iteration (see regles_grid)
+            presents : the color codes of the current level
+            restes : the color codes left unchanged at a previous level (they are leaves)
+
+        Returns :
+            (actifs, (tx, ty)) or ([], None) when nothing is rewritten
+        """
+
+        actifs = sorted(presents & regles.keys())
+        if not actifs:
+            return [], None
+
+        if restes & set(actifs):
+            # With the string engine, such a cell would be rewritten at its own depth
+            self.error("The grid engine can not rewrite a color left unchanged at a previous iteration")
+
+        # The size of a level is the one of the destinations before func_transf (see decoupe_str)
+        formes = {self.decoupe_str(nchaine) for code in actifs
+                  for nchaine in ([regles[code][0][1]] if isinstance(regles[code][0][1], str) else regles[code][0][1])}
+        if len(formes) > 1:
+            self.error("The grid engine needs destinations of the same size at each iteration")
+
+        return actifs, formes.pop()
+
+    def developpe_unit_grid(self, grille: np.ndarray, profondeur: Optional[np.ndarray], regles: dict,
+                            actifs: list[int], ndecoupe: tuple[int, int],
+                            niveaux: list[tuple[int, int]]) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Grid version of `developpe_unit_prf`
+
+        Each cell whose color has a rule is replaced by its destination,
+        the other cells are replaced by a uniform block of their own color (they stay "leaves")
+
+            grille : grid of color codes (see strc_2_codes)
+            profondeur : grid of the depths of the cells (number of levels above them) or None
+            regles : the rules of the iteration (see regles_grid)
+            actifs, ndecoupe : the rewritten color codes and the size of their destinations (see actifs_grid)
+            niveaux : the levels of `grille`
+
+        Returns :
+            (grille, profondeur)
+        """
+
+        tx, ty = ndecoupe
+        nby, nbx = grille.shape
+        self.checkpoint()
+
+        if nby * ty * nbx * tx > self.max_grid_size:
+            self.warning(f"The size limit is reached : {nby * ty * nbx * tx} > {self.max_grid_size}")
+            self.error("The result is over the accepted size limit ! The number of iterations may be too high ")
+
+        # One block per color code : the destinations for the rules, a uniform block otherwise
+        nb_dest = max(len(regles[code][1]) for code in actifs)
+        blocs = np.empty((256, nb_dest, ty, tx), dtype=np.uint8)
+        blocs[:] = np.arange(256, dtype=np.uint8)[:, None, None, None]
+
+        for code in actifs:
+            for lidest, tab in enumerate(regles[code][1]):
+                blocs[code, lidest] = tab
+
+        multiples = [code for code in actifs if not isinstance(regles[code][0][1], str)]
+        if multiples:
+            blocs = blocs[grille, self.choix_grid(grille, regles, multiples, niveaux)]
+        else:
+            blocs = blocs[grille, 0]
+
+        # Kronecker-style expansion : (nby, nbx, ty, tx) -> (nby * ty, nbx * tx)
+        ngrille = blocs.transpose(0, 2, 1, 3).reshape(nby * ty, nbx * tx)
+
+        if profondeur is not None:
+            reecrit = np.zeros(256, dtype=bool)
+            reecrit[actifs] = True
+            profondeur = np.where(reecrit[grille], len(niveaux) + 1, profondeur).astype(np.uint8)
+            profondeur = profondeur.repeat(ty, axis=0).repeat(tx, axis=1)
+
+        self.information(f"Resulting grid with {nbx * tx} x {nby * ty} cells")
+
+        return ngrille, profondeur
+
+    def developpe_prf_grid(self) -> list:
+        """
+        Grid version of `developpe_prf` (engine 'grid')
+
+        Each level is a grid of color codes (see strc_2_codes), built from the previous one by block substitution,
+        so the cost is linear in the number of cells
+
+        Only "tile" rules are usable : a single character to replace, rectangular destinations without
+        '(', ')' or '&', and destinations of the same size at each iteration, not changed by func_transf
+        (a non-square destination rotated by 90 degrees is not usable)
+
+        Returns :
+
+            [grille, niveaux] with `grille` the resulting grid of color codes and `niveaux` the list of the levels
+
+                niveaux = [(multx, multy), ...]
+
+        """
+
+        grille, niveaux = self.axiome_grid()
+
+        # The depths are only needed to draw the random color (one color per leaf)
+        textes = [self.axiom]
+        for regle in self.rules:
+            textes.extend([regle[1]] if isinstance(regle[1], str) else regle[1])
+
+        if any('?' in texte for texte in textes):
+            profondeur = np.full(grille.shape, len(niveaux), dtype=np.uint8)
+        else:
+            profondeur = None
+
+        self.dev_snapshots = [((grille, profondeur, tuple(niveaux), frozenset()), rnd.getstate())]
+
+        return self.developpe_prf_grid_suite(0)
+
+    def developpe_prf_grid_suite(self, premier: int) -> list:
+        """
+        Grid version of `developpe_prf_suite`
+        """
+
+        (grille, profondeur, niveaux, restes), etat_rnd = self.dev_snapshots[premier]
+        niveaux, restes = list(niveaux), set(restes)
+        del self.dev_snapshots[premier + 1:]
+        rnd.setstate(etat_rnd)
+
+        for li in range(premier, self.nbiter):
+            debut = time.perf_counter()
+            regles = self.regles_grid(li)
+            comptes = np.bincount(grille.ravel(), minlength=256)
+            presents = set(np.flatnonzero(comptes).tolist())
+
+            actifs, ndecoupe = self.actifs_grid(regles, presents, restes)
+            if actifs:
+                grille, profondeur = self.developpe_unit_grid(grille, profondeur, regles, actifs, ndecoupe, niveaux)
+                niveaux.append(ndecoupe)
+                restes |= presents - set(actifs)
+
+            self.stat('iteration', iteration=li, seconds=time.perf_counter() - debut,
+                      replacements=int(comptes[actifs].sum()), rule_scans=len(regles), size=int(grille.size),
+                      level=ndecoupe if actifs else None)
+
+            self.dev_snapshots.append(((grille, profondeur, tuple(niveaux), frozenset(restes)), rnd.getstate()))
+
+        self.dev_depth = profondeur
+
+        # La valeur de retour est une liste pour avoir la possibilité de modification
+        self.dev_prf = [grille, niveaux]
+        return self.dev_prf
+
+    def tuiles_prf(self) -> tuple[int, list[tuple[int, int]], list[dict[int, np.ndarray]]]:
+        """
+        Gives the tree of the result from the rules, without expanding anything
+
+        A node is a color code at a depth : it is a leaf when there is no tile for its color at this depth,
+        otherwise its children are the cells of the tile (same rules as the grid engine). The random choices
+        need rng 'cell' : the tile of a code is then a stack of its destinations (see choix_noeuds)
+
+        Returns :
+            (racine, niveaux, tuiles) with `racine` the color code of the root (0 for an axiom with '_'),
+            `niveaux` the list of the levels and `tuiles` = [{code: tile}, ...] the tiles of each level
+        """
+
+        if self.dev_tiles is not None:
+            return self.dev_tiles
+
+        grille, niveaux = self.axiome_grid()
+
+        if niveaux:
+            racine, tuiles = 0, [{0: grille}]
+        else:
+            racine, tuiles = int(grille[0, 0]), []
+
+        presents = set(np.unique(grille).tolist())
+        restes = set()
+
+        for li in range(self.nbiter):
+            debut = time.perf_counter()
+            regles = self.regles_grid(li)
+
+            actifs, ndecoupe = self.actifs_grid(regles, presents, restes)
+            if not actifs:
+                self.stat('tiles', iteration=li, seconds=time.perf_counter() - debut, tiles=0, level=None)
+                continue
+
+            if any(len(regles[code][1]) > 1 for code in actifs) and (self.rng != 'cell' or self.func_alea is not None):
+                self.error("The rules must be deterministic (a single destination) or use rng='cell'")
+
+            # Plusieurs destinations : une pile de tuiles, le choix est fait par noeud (voir choix_noeuds)
+            niveaux.append(ndecoupe)
+            tuiles.append({code: regles[code][1][0] if len(regles[code][1]) == 1 else np.stack(regles[code][1])
+                           for code in actifs})
+
+            restes |= presents - set(actifs)
+            presents = restes | {code for tuile in tuiles[-1].values() for code in np.unique(tuile).tolist()}
+
+            self.stat('tiles', iteration=li, seconds=time.perf_counter() - debut, tiles=len(actifs), level=ndecoupe)
+
+        self.dev_tiles = (racine, niveaux, tuiles)
+        return self.dev_tiles
+
+    def tuiles_choix(self) -> bool:
+        """
+        Tells if there are several destinations for a tile of `tuiles_prf` (rng 'cell')
+        """
+
+        return any(tuile.ndim == 3 for tuiles_niv in self.tuiles_prf()[2] for tuile in tuiles_niv.values())
+
+    def tuiles_aleas(self) -> bool:
+        """
+        Tells if the random color ('?') is in the tree of `tuiles_prf`
+        """
+
+        racine, _, tuiles = self.tuiles_prf()
+        code_alea = ord('?')
+
+        return racine == code_alea or any((tuile == code_alea).any() for tuiles_niv in tuiles
+                                          for tuile in tuiles_niv.values())
+
+    def etapes_estimate(self) -> tuple[list[tuple[int, Optional[tuple[int, int]]]], Optional[int], dict]:
+        """
+        Gives the steps of the iterations for estimate, from the rules only (see actifs_grid) : the sequence
+        of the iterations is periodic (without filter, func_transf None or of TRANSF_D4), a state already seen
+        starts a cycle
+
+        Returns :
+            (etapes, cycle, regles_etapes) with `etapes` the list of (rank of the rules, size of the level or None),
+            `cycle` the first step of the cycle (None without cycle) and `regles_etapes` the rules of each rank
+        """
+
+        grille, _ = self.axiome_grid()
+        stationnaire = all(len(regle) < 3 for regle in self.rules) and \
+            (self.func_transf is None or self.func_transf in TRANSF_D4)
+        periode = 1 if self.func_transf is None else 4
+
+        etapes, vus, regles_etapes = [], {}, {}
+        presents, restes = set(np.unique(grille).tolist()), set()
+
+        for li in range(self.nbiter):
+            if stationnaire:
+                cle = (frozenset(presents), frozenset(restes), li % periode)
+                if cle in vus:
+                    return etapes, vus[cle], regles_etapes
+                vus[cle] = li
+
+            lrang = li % periode if stationnaire else li
+            regles = self.regles_grid(lrang)
+            regles_etapes.setdefault(lrang, regles)
+            actifs, ndecoupe = self.actifs_grid(regles, presents, restes)
+            etapes.append((lrang, ndecoupe))
+
+            if actifs:
+                restes |= presents - set(actifs)
+                presents = restes | {fils for code in actifs for tab in regles[code][1]
+                                     for fils in np.unique(tab).tolist()}
+
+        return etapes, None, regles_etapes
+
+    @staticmethod
+    def matrice_substitution(regles: dict, rangs: dict[int, int]) -> np.ndarray:
+        """
+        Gives the substitution matrix (of Fraction) of the rules of an iteration (see regles_grid) :
+        row `code`, column `fils` the (average) number of `fils` in the destination of `code`,
+        the last column counts the characters of the string (see developpe_unit_prf)
+
+            rangs : the rank of each color code in the matrix
+        """
+
+        nbc = len(rangs)
+        mat = np.zeros((nbc + 1, nbc + 1), dtype=object)
+        for code, rang in rangs.items():
+            if code not in regles:
+                mat[rang, rang] = 1
+                continue
+
+            tabs = regles[code][1]
+            for tab in tabs:
+                for fils, nb in zip(*np.unique(tab, return_counts=True)):
+                    mat[rang, rangs[int(fils)]] += Fraction(int(nb), len(tabs))
+                # '(' + destination + ')' au lieu du caractère
+                mat[rang, nbc] += Fraction(tab.size + tab.shape[0], len(tabs))
+
+        mat[nbc, nbc] = 1
+        return mat
+
+    @staticmethod
+    def produit_etapes(etapes: list, matrices: dict, cycle: Optional[int], nbiter: int,
+                       taille: int) -> tuple[np.ndarray, int, int, int]:
+        """
+        Gives the product of the matrices of nbiter iterations, with the powers of the cycle (see etapes_estimate),
+        and the multipliers and the number of the levels added
+
+            matrices : the matrix of each rank of the rules (see matrice_substitution), of size `taille`
+
+        Returns :
+            (mat, multx, multy, prof)
+        """
+
+        def produit(debut: int, fin: int) -> tuple[np.ndarray, int, int, int]:
+            # Le produit des matrices des étapes debut .. fin-1, leurs multiplicateurs et leur profondeur
+            mat, multx, multy, prof = np.identity(taille, dtype=object), 1, 1, 0
+            for lrang, ndecoupe in etapes[debut:fin]:
+                mat = mat.dot(matrices[lrang])
+                if ndecoupe is not None:
+                    multx, multy, prof = multx * ndecoupe[0], multy * ndecoupe[1], prof + 1
+            return mat, multx, multy, prof
+
+        if cycle is None:
+            return produit(0, len(etapes))
+
+        # Le début, puis le cycle répété, puis le début du cycle
+        mat, multx, multy, prof = produit(0, cycle)
+        nb_cycles, reste = divmod(nbiter - cycle, len(etapes) - cycle)
+        cmat, cmultx, cmulty, cprof = produit(cycle, len(etapes))
+        rmat, rmultx, rmulty, rprof = produit(cycle, cycle + reste)
+
+        return (mat.dot(puissance_matrice(cmat, nb_cycles)).dot(rmat), multx * cmultx ** nb_cycles * rmultx,
+                multy * cmulty ** nb_cycles * rmulty, prof + cprof * nb_cycles + rprof)
+
+    def estimate(self, nbiter: Optional[int] = None) -> dict:
+        """
+        Gives the size of the result from the rules, without expanding anything (see expand)
+
+        The rules are the ones of the tree (see tuiles_prf), the counts come from their substitution matrix :
+        the result is the vector of the axiom times the product of the matrices of the iterations. The sequence
+        of the iterations is periodic (without filter, func_transf None or of TRANSF_D4) : the product is made
+        with powers, in O(colors³ log nbiter)
+
+            nbiter (opt) : number of iterations (s.nbiter by default)
+
+        Returns :
+            {'depth', 'cells': (ncx, ncy), 'pixels': (width, height), 'pixel_count', 'leaves': {color: count},
+            'leaf_count', 'string_size' (see max_result_size), 'expected' (True when the counts are averages
+            of several destinations), 'fits' (True when the size limit of the engine is not reached)}
+
+        Example :
+            Lsystg(axiom=None, rules=None, nbiter=8, patterns=['1/2_1//_111'], colors='RBG', expand=False).estimate()
+        """
+
+        if self.rules is None:
+            self.error("The rules are not known (see load) : the size can not be estimated")
+
+        ancien = self.nbiter
+        self.nbiter = ancien if nbiter is None else nbiter
+        try:
+            grille, niveaux = self.axiome_grid()
+            etapes, cycle, regles_etapes = self.etapes_estimate()
+
+            # Les codes utiles : ceux de l'axiome et des règles
+            codes = sorted(set(np.unique(grille).tolist())
+                           | {code for regles in regles_etapes.values() for code in regles}
+                           | {fils for regles in regles_etapes.values() for _, tabs in regles.values() for tab in tabs
+                              for fils in np.unique(tab).tolist()})
+            rangs = {code: rang for rang, code in enumerate(codes)}
+
+            matrices = {lrang: self.matrice_substitution(regles, rangs) for lrang, regles in regles_etapes.items()}
+            mat, multx, multy, prof = self.produit_etapes(etapes, matrices, cycle, self.nbiter, len(codes) + 1)
+        finally:
+            self.nbiter = ancien
+
+        nbc = len(codes)
+        vecteur = np.zeros(nbc + 1, dtype=object)
+        for code, nb in zip(*np.unique(grille, return_counts=True)):
+            vecteur[rangs[int(code)]] = int(nb)
+        vecteur[nbc] = len(self.axiom) + (2 if niveaux else 0)
+        vecteur = vecteur.dot(mat)
+
+        def nombre(valeur) -> int | float:
+            return int(valeur) if Fraction(valeur).denominator == 1 else float(valeur)
+
+        ncx, ncy = grille.shape[1] * multx, grille.shape[0] * multy
+        taille_chaine = nombre(vecteur[nbc])
+
+        if self.engine == 'string':
+            tient = taille_chaine <= self.max_result_size
+        elif self.engine == 'grid':
+            tient = ncx * ncy <= self.max_grid_size
+        else:
+            # Les positions des cellules sont des int64 (voir region_grid)
+            tient = max(ncx, ncy) < 1 << 63
+
+        return {'depth': len(niveaux) + prof, 'cells': (ncx, ncy), 'pixels': (ncx * self.x_basis, ncy * self.y_basis),
+                'pixel_count': ncx * self.x_basis * ncy * self.y_basis,
+                'leaves': {chr(code): nombre(vecteur[rangs[code]]) for code in codes if vecteur[rangs[code]]},
+                'leaf_count': nombre(sum(vecteur[:nbc])), 'string_size': taille_chaine,
+                'expected': any(not isinstance(regle[1], str) and len(regle[1]) > 1 for regle in self.rules),
+                'fits': tient}
+
+    def feuilles_tuiles(self):
+        """
+        Gives the leaves (x, y, tx, ty, code) of the tree of `tuiles_prf` in depth-first order (in cells)
+
+        Only the pending children of the current branch are stored : the memory used is O(depth)
+        """
+
+        racine, niveaux, tuiles = self.tuiles_prf()
+        tailles = tailles_niveaux(niveaux)
+
+        enfants = {}  # (prof, code, destination) -> [(dx, dy, code), ...] in reversed order
+        pile = [(racine, 0, 0, 0)]
+
+        while pile:
+            code, prof, x, y = pile.pop()
+
+            if prof == len(niveaux) or code not in tuiles[prof]:
+                yield x, y, tailles[prof][0], tailles[prof][1], code
+                continue
+
+            tuile = tuiles[prof][code]
+            num = 0
+            if tuile.ndim == 3:
+                num = int(alea_cellules(self.rnd_seed, prof, x // tailles[prof][0], y // tailles[prof][1])
+                          % np.uint64(len(tuile)))
+                tuile = tuile[num]
+
+            if (prof, code, num) not in enfants:
+                ltx, lty = tailles[prof + 1]
+                enfants[prof, code, num] = [(lx * ltx, ly * lty, int(tuile[ly, lx]))
+                                            for ly in reversed(range(tuile.shape[0]))
+                                            for lx in reversed(range(tuile.shape[1]))]
+
+            for dx, dy, ncode in enfants[prof, code, num]:
+                pile.append((ncode, prof + 1, x + dx, y + dy))
+
+    def grille_memo(self, noeud: Optional[tuple[int, int]] = None) -> np.ndarray:
+        """
+        Gives the grid of color codes of the result from the tree of `tuiles_prf`
+
+            noeud (opt) : (code, depth) the root of a subtree, the whole tree by default
+
+        A subtree only depends on its color code and its depth (the rotations are done by level) :
+        each unique subtree is built once and the other occurrences are slice copies.
+        The built subtrees are kept in a LRU cache of `max_memo_size` bytes
+
+        The random color is not usable here (one color per leaf, see img), nor the random choices
+        """
+
+        racine, niveaux, tuiles = self.tuiles_prf()
+        if self.tuiles_choix():
+            self.error("The subtrees are not shared with random choices (rng 'cell')")
+
+        tailles = tailles_niveaux(niveaux)
+        memo = OrderedDict()
+        taille_memo = 0
+
+        def bloc(code: int, prof: int) -> np.ndarray:
+            nonlocal taille_memo
+
+            if (code, prof) in memo:
+                memo.move_to_end((code, prof))
+                return memo[code, prof]
+
+            tuile = tuiles[prof][code]
+            ltx, lty = tailles[prof + 1]
+            res = np.empty((tailles[prof][1], tailles[prof][0]), dtype=np.uint8)
+
+            for (ly, lx), ncode in np.ndenumerate(tuile):
+                dest = res[ly * lty:(ly + 1) * lty, lx * ltx:(lx + 1) * ltx]
+                if prof + 1 == len(niveaux) or ncode not in tuiles[prof + 1]:
+                    # Une feuille
+                    dest[...] = ncode
+                else:
+                    dest[...] = bloc(int(ncode), prof + 1)
+
+            if res.nbytes <= self.max_memo_size:
+                memo[code, prof] = res
+                taille_memo += res.nbytes
+                while taille_memo > self.max_memo_size:
+                    taille_memo -= memo.popitem(last=False)[1].nbytes
+
+            return res
+
+        code, prof = (racine, 0) if noeud is None else noeud
+
+        if prof == len(niveaux) or code not in tuiles[prof]:
+            return np.full((tailles[prof][1], tailles[prof][0]), code, dtype=np.uint8)
+
+        return bloc(code, prof)
+
+    def grille_workers(self, workers: int) -> tuple[np.ndarray, list[tuple[int, int, int, int]]]:
+        """
+        Gives the grid of color codes of the result from the tree of `tuiles_prf`,
+        each cell of the first level being built by a process of a pool (see grille_cellule)
+
+        The processes write into a grid in shared memory. The random colors are not drawn here :
+        the leaves with a random color are returned in depth-first order (same draws as in series)
+
+            workers : number of processes
+
+        Returns :
+            (grille, aleas) with `aleas` the leaves (x, y, tx, ty) having the random color
+        """
+
+        racine, niveaux, tuiles = self.tuiles_prf()
+        tailles = tailles_niveaux(niveaux)
+        ncx, ncy = tailles[0]
+        multx, multy = niveaux[0]
+
+        # Une copie sans ce qui est inutile (ou non transmissible) pour les processus
+        gls = self.copie_processus()
+        gls.rules = gls.dev_prf = gls.dev_depth = None
+        gls.dev_tiles = (racine, niveaux, tuiles)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, ncx * ncy))
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(grille_cellule, gls, shm.name, lx, ly)
+                           for ly in range(multy) for lx in range(multx)]
+                coins = np.unique(np.concatenate([future.result() for future in futures]), axis=0)
+
+            grille = np.ndarray((ncy, ncx), dtype=np.uint8, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        # Les feuilles aléatoires dans l'ordre en profondeur
+        profs, xs, ys = coins.T
+        ordre = np.argsort(rang_prf(niveaux, xs, ys), kind='stable')
+        txs = np.array([tx for tx, _ in tailles])[profs]
+        tys = np.array([ty for _, ty in tailles])[profs]
+
+        return grille, list(zip(xs[ordre].tolist(), ys[ordre].tolist(), txs[ordre].tolist(), tys[ordre].tolist()))
+
+    def iter_cells(self):
+        """
+        Gives the leaf cells (x, y, w, h, color) of the result in depth-first order, in pixels
+
+        The cells come straight from the rules and the levels (see tuiles_prf) : nothing is expanded,
+        the memory used is O(depth) and there is no size limit
+        """
+
+        mmx, mmy = self.x_basis, self.y_basis
+
+        for x, y, ltx, lty, code in self.feuilles_tuiles():
+            yield mmx * x, mmy * y, mmx * ltx, mmy * lty, chr(code)
+
+    def developpe_prf_patterns(self) -> list:
+        """
+        This method generates an axiom and some rules from s.patterns, s.colors, s.banned_colors (s = self)
+        """
+
+        nb_motif = len(self.patterns)
+        nb_coul = len(self.colors)
+
+        if nb_motif == 0:
+            self.error("There is no valid pattern")
+
+        if nb_coul == 0:
+            self.error("There is no valid color")
+
+        self.axiom = self.colors[0]  # # The axiom is simply the first color
+
+        possible_col = [coul for coul in self.colors if coul not in self.banned_colors]
+        nb_possible = len(possible_col)
+
+        if nb_possible == 0:
+            self.error("There is no valid usable color")
+
+        self.rules = []
+
+        for lic, coul in enumerate(self.colors):
+
+            motif = self.patterns[lic % nb_motif]  # % ... : Cycle over patterns
+
+            coulm = Lsystg.pattern_colors(motif)
+            nb_coulm = len(coulm)
+
+            n_possible_col = possible_col
+            n_nb_possible = nb_possible
 
             if nb_possible < nb_coulm:
                 # Fill n_possible_col with an arbitrary color
@@ -525,10 +2566,14 @@ class Lsystg:
         if self.test:
             return ['Mode test', self.rules]
 
+        if not self.expand:
+            return self.rules
+
         return self.developpe_prf()
 
     def img(self, img_fpath: str, func_img: Optional[Callable] = None,
-            col_fond: tuple[int, int, int, int] = (0, 0, 0, 0)):
+            col_fond: tuple[int, int, int, int] = (0, 0, 0, 0), mode: str = 'RGBA',
+            workers: Optional[int] = None):
         """
         Sauvegarde l'image "contenue" dans `dev_prf` dans `img_fpath` (chemin)
 
@@ -536,6 +2581,10 @@ class Lsystg:
             img_fpath : chemin - Exemple : "images/test.png" ou "" pour un stockage mémoire, seulement
             func_img (opt) : fonction de traitement de l'image avant sauvegarde
             col_fond : couleur de fond - (0,0,0,0) pour un fond transparent
+            mode : 'RGBA' ou 'P' pour une image avec palette (8 bits par pixel),
+                'RGBA' est utilisé s'il y a une couleur aléatoire
+            workers (opt) : nombre de processus, les cellules du premier niveau sont développées
+                en parallèle (voir grille_workers) - même image qu'en série
 
         Retour :
             Image obtenue
@@ -544,71 +2593,900 @@ class Lsystg:
         if not isinstance(self.dev_prf, list):
             self.error('dev_prf is not usable in img_decoupe : test mode ?')
 
-        chaine, niveaux = self.dev_prf
+        if mode not in ('RGBA', 'P'):
+            self.error(f"Unknown image mode : {mode}")
+
+        debut = time.perf_counter()
+        self.checkpoint()
+        niveaux = self.dev_prf[1]
         nbniv = len(niveaux)
         if nbniv == 0:
             self.error('There is no level')
 
-        niveaux = niveaux[:]  # Une copie pour ne pas modifier dev_prf
-        niveaux.append((1, 1))  # Un ajout qui sert à x_y_tx_ty(...)
+        # Définir les détails des niveaux : des tailles (global) au lieu des multiplicateurs (local)
+        niveaux = tailles_niveaux(niveaux)
+
+        table, dessine = self.palette(col_fond)
+        grille, aleas = self.grille_img(niveaux, dessine, workers)
+
+        self.checkpoint()
+
+        if mode == 'P' and not aleas:
+            imgn = self.img_palette(grille, table)
+        else:
+            imgn = self.img_rgba(grille, table, aleas)
+
+        self.stat('img', seconds=time.perf_counter() - debut, cells=int(grille.size),
+                  pixels_filled=int(np.count_nonzero(dessine[grille])) * self.x_basis * self.y_basis
+                  if self.stats is not None else None,
+                  random_leaves=len(aleas), pixels=imgn.width * imgn.height, mode=imgn.mode)
+
+        # Pour finir
+        if func_img is not None:
+            imgn = func_img(imgn)
+
+        if img_fpath:
+            imgn.save(img_fpath)
+
+        # Retour de l'image obtenue
+        return imgn
+
+    def grille_img(self, tailles: list[tuple[int, int]], dessine: np.ndarray,
+                   workers: Optional[int] = None) -> tuple[np.ndarray, list[tuple[int, int, int, int]]]:
+        """
+        Gives the grid of color codes of the result, as drawn by img (see grille_feuilles)
+
+            tailles : sizes of the levels (see tailles_niveaux)
+            dessine : the drawn color codes (see palette)
+            workers (opt) : see img
+
+        Returns :
+            (grille, aleas) with `aleas` the leaves (x, y, tx, ty) having the random color, in depth-first order
+        """
+
+        chaine = self.dev_prf[0]
+
+        if isinstance(chaine, np.ndarray):
+            # Résultat du moteur 'grid' (ou chargé, voir load)
+            return chaine, self.aleas_grid(tailles)
+
+        if workers is not None and workers > 1:
+            # Les cellules du premier niveau en parallèle, à partir des règles
+            return self.grille_workers(workers)
+
+        if chaine is None and not self.tuiles_aleas() and not self.tuiles_choix():
+            # Moteur 'lazy' sans couleur aléatoire : chaque sous-arbre n'est construit qu'une fois
+            return self.grille_memo(), []
+
+        if chaine is None:
+            # Moteur 'lazy' : les feuilles viennent directement des règles
+            return self.grille_feuilles(self.feuilles_tuiles(), tailles[0], dessine, checkpoint=self.checkpoint)
+
+        return self.grille_feuilles(self.feuilles_chaine(chaine, tailles), tailles[0], dessine,
+                                    checkpoint=self.checkpoint)
+
+    def etats_images(self) -> list[tuple]:
+        """
+        Gives the states of the levels of the result, coarse to fine, as rendered by iter_images
+
+        The levels come from the snapshots of the expansion (see extend) or from the tree (engine 'lazy')
+
+        Returns :
+            [(dev_prf, dev_depth, dev_tiles, ltx, lty), ...] with (ltx, lty) the size of a cell of the level
+            in cells of the final level, the last state being the final one (1, 1)
+        """
+
+        tailles = tailles_niveaux(self.dev_prf[1])
+
+        etats = []
+        if self.engine == 'lazy':
+            racine, niveaux, tuiles = self.tuiles_prf()
+            etats = [([None, niveaux[:prof]], None, (racine, niveaux[:prof], tuiles[:prof]))
+                     for prof in range(1, len(niveaux))]
+        else:
+            for etat, _ in self.dev_snapshots[:-1]:
+                niveaux = list(etat[-2] if self.engine == 'grid' else etat[1])
+                if niveaux and len(niveaux) < len(tailles) - 1 and (not etats or len(etats[-1][0][1]) < len(niveaux)):
+                    etats.append(([etat[0], niveaux], etat[1] if self.engine == 'grid' else None, None))
+
+        # Une cellule d'un niveau est agrandie à la taille de ses cellules du niveau final
+        return [(dev_prf, dev_depth, dev_tiles) + tailles[len(dev_prf[1])] for dev_prf, dev_depth, dev_tiles in etats] \
+            + [(self.dev_prf, self.dev_depth, self.dev_tiles, 1, 1)]
+
+    def img_etat(self, etat: tuple, col_fond: tuple[int, int, int, int] = (0, 0, 0, 0), mode: str = 'RGBA',
+                 func_img: Optional[Callable] = None):
+        """
+        Gives the image of a state of etats_images, at the size of the final image (see img)
+        """
+
+        final = (self.dev_prf, self.dev_depth, self.dev_tiles, self.x_basis, self.y_basis)
+        dev_prf, dev_depth, dev_tiles, ltx, lty = etat
+
+        self.dev_prf, self.dev_depth, self.dev_tiles = dev_prf, dev_depth, dev_tiles
+        self.x_basis, self.y_basis = final[3] * ltx, final[4] * lty
+        try:
+            return self.img("", func_img=func_img, col_fond=col_fond, mode=mode)
+        finally:
+            self.dev_prf, self.dev_depth, self.dev_tiles, self.x_basis, self.y_basis = final
+
+    def iter_images(self, col_fond: tuple[int, int, int, int] = (0, 0, 0, 0), mode: str = 'RGBA',
+                    func_img: Optional[Callable] = None, workers: Optional[int] = None):
+        """
+        Gives the images of the result level by level, coarse to fine, all at the size of the final image :
+        a coarse level has few cells, its image is a fraction of the cost of the final one
+
+        The levels come from the snapshots of the expansion (see etats_images). The state of `random`
+        is restored before each image : the last image is the one of `img`
+
+            col_fond, mode, func_img : see img
+            workers (opt) : number of processes, the images are rendered in parallel (func_img must be picklable)
+                and given in order - same images as in series
+
+        Returns :
+            generator of images
+        """
+
+        etats = self.etats_images()
+        etat_rnd = rnd.getstate()
+
+        if workers is None or workers <= 1 or len(etats) <= 1:
+            for etat in etats:
+                rnd.setstate(etat_rnd)
+                yield self.img_etat(etat, col_fond, mode, func_img)
+            return
+
+        # Au plus 2 images par processus en attente : la mémoire reste bornée.
+        # Le suivi des mémoires partagées est lancé avant les processus : il est commun à tous
+        resource_tracker.ensure_running()
+        noms = deque()
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_images,
+                                       initargs=(self.copie_processus(), etats, etat_rnd))
+        try:
+            suivant = 0
+            while suivant < len(etats) or noms:
+                while suivant < len(etats) and len(noms) < 2 * workers:
+                    noms.append(executor.submit(image_etat, suivant, col_fond, mode, func_img))
+                    suivant += 1
+
+                self.checkpoint()
+                yield shm_image(noms.popleft().result(), unlink=True)
+        finally:
+            for future in noms:
+                if not future.cancel() and future.exception() is None:
+                    supprime_shm(future.result())
+            executor.shutdown(cancel_futures=True)
+
+    def export_animation(self, img_fpath: str, col_fond: tuple[int, int, int, int] = (0, 0, 0, 255),
+                         duration: int = 500, loop: int = 0, func_img: Optional[Callable] = None,
+                         workers: Optional[int] = None, fmt: Optional[str] = None) -> int:
+        """
+        Saves the growth of the result (one frame per level, see iter_images) as an animation : APNG, GIF or WebP
+
+        The frames are rendered from the snapshots of the expansion, each one at the size of the final image,
+        and written as soon as they are ready (APNG, GIF) : only a few frames are in memory
+
+            img_fpath : path of the file - Example : "images/growth.png"
+            col_fond : background color (a GIF has no alpha channel)
+            duration : duration of a frame in milliseconds
+            loop : number of loops (0 : forever)
+            func_img (opt) : function applied to each frame (see img), the size must not change
+            workers (opt) : number of processes for the frames (see iter_images)
+            fmt (opt) : 'APNG', 'GIF' or 'WEBP' (from the extension of img_fpath by default)
+
+        Returns :
+            the number of frames
+        """
+
+        if fmt is None:
+            fmt = {'.png': 'APNG', '.apng': 'APNG', '.gif': 'GIF', '.webp': 'WEBP'}.get(
+                os.path.splitext(img_fpath)[1].lower())
+
+        if fmt not in ('APNG', 'GIF', 'WEBP'):
+            self.error(f"Unknown animation format : {fmt}")
+
+        nb_images = len(self.etats_images())
+        images = self.iter_images(col_fond=col_fond, func_img=func_img, workers=workers)
+
+        if fmt == 'WEBP':
+            # L'encodeur WebP de Pillow a besoin de toutes les images
+            images = list(images)
+            images[0].save(img_fpath, save_all=True, append_images=images[1:], duration=duration, loop=loop,
+                           lossless=True)
+            return nb_images
+
+        with open(img_fpath, 'wb') as fic:
+            if fmt == 'APNG':
+                ecrire_apng(fic, images, nb_images, duration, loop)
+            else:
+                ecrire_gif(fic, images, duration, loop)
+
+        return nb_images
+
+    def copie_processus(self) -> 'Lsystg':
+        """
+        Gives a copy of the L-system for the processes : without the functions (not always picklable)
+        and the snapshots
+        """
+
+        gls = copy.copy(self)
+        gls.func_transf = gls.func_alea = gls.cancel = gls.stats_callback = gls.stats = None
+        gls.dev_snapshots = []
+
+        return gls
+
+    def img_palette(self, grille: np.ndarray, table: np.ndarray):
+        """
+        Gives the image ("P" mode) of a grid of color codes
+
+            grille : grid of color codes (for the smallest cells)
+            table : RGBA table of the color codes (see palette)
+        """
+
+        # Un index par couleur présente : la palette est la table réduite
+        presents = np.flatnonzero(np.bincount(grille.ravel(), minlength=256))
+        couls, index = np.unique(table[presents], axis=0, return_inverse=True)
+
+        lut = np.zeros(256, dtype=np.uint8)
+        lut[presents] = index.ravel()
+
+        imgn = pim.fromarray(lut[grille])
+        imgn.putpalette(couls.tobytes(), rawmode='RGBA')
+
+        # Agrandir l'image avec les nombres de pixels de base (une cellule donne un bloc de pixels)
+        return self.agrandir(imgn)
+
+    def couleurs_aleas(self, xs: np.ndarray, ys: np.ndarray, txs: np.ndarray, tys: np.ndarray) -> np.ndarray:
+        """
+        Gives the RGBA colors (n, 4) of the leaves with a random color, in depth-first order (see img_rgba)
+        """
+
+        if self.rng == 'cell':
+            return self.couleurs_cellules(tailles_niveaux(self.dev_prf[1]), xs, ys, txs, tys)
+
+        with self.etat_aleas():
+            return np.array([self.couleur_rgba('?') for _ in xs.tolist()], dtype=np.uint8).reshape(-1, 4)
+
+    def img_rgba(self, grille: np.ndarray, table: np.ndarray, aleas: list[tuple[int, int, int, int]]):
+        """
+        Gives the image ("RGBA" mode) of a grid of color codes
+
+            grille : grid of color codes (for the smallest cells)
+            table : RGBA table of the color codes (see palette)
+            aleas : the leaves (x, y, tx, ty) with a random color, in depth-first order
+        """
+
+        # Les couleurs des cellules en une seule fois, puis les couleurs aléatoires (dans l'ordre de la chaîne)
+        pixels = table[grille]
+
+        if aleas:
+            masque = grille == ord('?')
+            xs, ys, txs, tys = np.array(aleas, dtype=np.int64).reshape(-1, 4).T
+            couls = self.couleurs_aleas(xs, ys, txs, tys)
+
+            for ltx, lty in sorted(set(zip(txs.tolist(), tys.tolist())), key=lambda taille: -taille[0] * taille[1]):
+                sel = (txs == ltx) & (tys == lty)
+                remplir_blocs(pixels, xs[sel], ys[sel], ltx, lty, couls[sel], masque)
+
+        # L'image des cellules, agrandie avec les nombres de pixels de base
+        return self.agrandir(pim.fromarray(pixels))
+
+    def agrandir(self, imgn):
+        """
+        Enlarges an image of cells with the numbers of pixels at lowest level (x_basis, y_basis) :
+        the nearest-neighbour resizing of PIL, much faster than building the enlarged array
+        """
+
+        if (self.x_basis, self.y_basis) == (1, 1):
+            return imgn
+
+        return imgn.resize((imgn.width * self.x_basis, imgn.height * self.y_basis), pim.Resampling.NEAREST)
+
+    def img_png(self, img_fpath: str, col_fond: tuple[int, int, int, int] = (0, 0, 0, 0), mode: str = 'RGBA',
+                compress_level: int = 6) -> tuple[int, int]:
+        """
+        Saves the image of the result in a PNG file, band by band : the whole image is never in memory
+
+        Each band of rows is computed from the tree of `tuiles_prf`, or read from the grid of a grid result
+        (see region_grid), then compressed
+        and written (zlib stream in IDAT chunks) : the peak memory is one band (see max_band_size)
+
+            img_fpath : path of the PNG file
+            col_fond : background color - (0,0,0,0) for a transparent background
+            mode : 'RGBA' or 'P' (with a palette), 'RGBA' is used if there is a random color
+            compress_level : zlib compression level (0 .. 9)
+
+        The random colors are drawn in depth-first order inside each band : with a single band,
+        the image is the same as the one of `img`
+
+        Returns :
+            (width, height) of the image
+        """
+
+        if mode not in ('RGBA', 'P'):
+            self.error(f"Unknown image mode : {mode}")
+
+        grille_res = self.grille_resultat()
+        niveaux = self.niveaux_prf()
+        depth = len(niveaux)
+        if depth == 0:
+            self.error('There is no level')
+
+        tailles = tailles_niveaux(niveaux)
+        ncx, ncy = tailles[0]
+        mmx, mmy = self.x_basis, self.y_basis
+        largeur, hauteur = ncx * mmx, ncy * mmy
+        if max(largeur, hauteur) >= 1 << 31:
+            self.error(f"The image is too large for a PNG file : {largeur} x {hauteur}")
+
+        table, _ = self.palette(col_fond)
+        if grille_res is not None:
+            # Résultat en grille (ou chargé, voir load) : ses codes sont lus par bandes, sans les règles
+            codes_res = set()
+            pas = max(1, self.max_band_size // max(1, ncx))
+            for cy0 in range(0, ncy, pas):
+                codes_res.update(np.unique(grille_res[cy0:cy0 + pas]).tolist())
+        else:
+            racine, _, tuiles = self.tuiles_prf()
+            codes_res = {racine} | {code for tuiles_niv in tuiles for tuile in tuiles_niv.values()
+                                    for code in np.unique(tuile).tolist()}
+        aleas = ord('?') in codes_res
+
+        if mode == 'P' and not aleas:
+            # Palette réduite aux couleurs du résultat
+            presents = np.array(sorted(codes_res))
+            couls, index = np.unique(table[presents], axis=0, return_inverse=True)
+            table = np.zeros((256, 1), dtype=np.uint8)
+            table[presents, 0] = index.ravel()
+            entete = [png_chunk(b'IHDR', struct.pack('>IIBBBBB', largeur, hauteur, 8, 3, 0, 0, 0)),
+                      png_chunk(b'PLTE', couls[:, :3].tobytes()), png_chunk(b'tRNS', couls[:, 3].tobytes())]
+        else:
+            entete = [png_chunk(b'IHDR', struct.pack('>IIBBBBB', largeur, hauteur, 8, 6, 0, 0, 0))]
+
+        # Nombre de lignes de cellules par bande (codes, positions et profondeurs : ~ 32 octets par cellule)
+        nb_lignes = max(1, self.max_band_size // (32 * ncx))
+        couls_aleas = {}  # Couleurs des feuilles aléatoires qui débordent sur les bandes suivantes
+
+        compresseur = zlib.compressobj(compress_level)
+        tampon = bytearray()
+
+        with open(img_fpath, 'wb') as fic:
+            fic.write(b'\x89PNG\r\n\x1a\n' + b''.join(entete))
+
+            for cy0 in range(0, ncy, nb_lignes):
+                self.checkpoint()
+                cy1 = min(cy0 + nb_lignes, ncy)
+                codes, xs, ys, profs = self.region_grid(0, cy0, ncx, cy1, depth)
+
+                grille = np.zeros((cy1 - cy0, ncx), dtype=np.uint8)
+                grille[ys - cy0, xs] = codes
+                pixels = table[grille]
+
+                if aleas:
+                    self.remplir_aleas(pixels, codes, xs, ys, profs, niveaux, couls_aleas, 0, cy0)
+
+                    # Oublier les feuilles terminées
+                    for feuille in [feuille for feuille in couls_aleas if feuille[2] + tailles[feuille[0]][1] <= cy1]:
+                        del couls_aleas[feuille]
+
+                # Agrandir en largeur, chaque ligne de cellules donne mmy lignes de pixels (filtre 0)
+                for ligne in np.repeat(pixels, mmx, axis=1).reshape(cy1 - cy0, -1):
+                    donnees = b'\x00' + ligne.tobytes()
+                    for _ in range(mmy):
+                        tampon += compresseur.compress(donnees)
 
-        # Définir les détails des niveaux
-        # On modifie `niveaux` pour avoir des tailles (global) au lieu des multiplicateurs (local)
-        mx, my = 1, 1
+                    if len(tampon) >= 1 << 20:
+                        fic.write(png_chunk(b'IDAT', bytes(tampon)))
+                        tampon.clear()
 
-        for lniv in reversed(range(nbniv)):
-            mx = mx * niveaux[lniv][0]
-            my = my * niveaux[lniv][1]
-            niveaux[lniv] = (mx, my)
+            tampon += compresseur.flush()
+            fic.write(png_chunk(b'IDAT', bytes(tampon)) + png_chunk(b'IEND', b''))
+
+        return largeur, hauteur
+
+    def rectangles(self, col_fond: tuple[int, int, int, int] = (0, 0, 0, 0),
+                   workers: Optional[int] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gives the image of the result as rectangles : the neighbouring cells of the same color are merged
+        (see rectangles_grille), the transparent ones are skipped
+
+        The cells are the ones of `img` (same random colors) : drawing the rectangles gives its image
+
+            col_fond : background color - (0,0,0,0) for a transparent background
+            workers (opt) : see img
+
+        Returns :
+            (xs, ys, ws, hs, couls) the rectangles in cells of the last level and their RGBA colors (n, 4)
+        """
+
+        if not isinstance(self.dev_prf, list):
+            self.error('dev_prf is not usable in rectangles : test mode ?')
+
+        tailles = tailles_niveaux(self.dev_prf[1])
+        table, dessine = self.palette(col_fond)
+        grille, aleas = self.grille_img(tailles, dessine, workers)
+        self.checkpoint()
+
+        # Une clé par cellule : son code, ou 256 + le rang de sa feuille aléatoire
+        cles = grille.astype(np.int32)
+        if aleas:
+            masque = grille == ord('?')
+            xs, ys, txs, tys = np.array(aleas, dtype=np.int64).reshape(-1, 4).T
+            table = np.concatenate([table, self.couleurs_aleas(xs, ys, txs, tys)])
+            rangs = np.arange(256, 256 + len(xs), dtype=np.int32)
+
+            for ltx, lty in sorted(set(zip(txs.tolist(), tys.tolist())), key=lambda taille: -taille[0] * taille[1]):
+                sel = (txs == ltx) & (tys == lty)
+                remplir_blocs(cles, xs[sel], ys[sel], ltx, lty, rangs[sel], masque)
+
+        # Les clés de la même couleur sont fusionnées
+        couls, index = np.unique(table, axis=0, return_inverse=True)
+        xs, ys, ws, hs, valeurs = rectangles_grille(index.ravel().astype(np.int32)[cles])
+
+        garde = couls[valeurs, 3] > 0
+
+        return xs[garde], ys[garde], ws[garde], hs[garde], couls[valeurs[garde]]
+
+    def draw_rectangles(self, draw, col_fond: tuple[int, int, int, int] = (0, 0, 0, 0), x0: int = 0, y0: int = 0,
+                        workers: Optional[int] = None) -> int:
+        """
+        Draws the image of the result with one rectangle per group of neighbouring cells of the same color
+        (see rectangles) instead of one per cell
+
+            draw : image of the same type as PIL.ImageDraw.Draw
+            x0, y0 : position of the image in `draw`
+            col_fond, workers : see rectangles
+
+        Returns :
+            the number of rectangles
+        """
 
-        # Définir les nombres de pixels de base (pour "agrandir" l'image)
         mmx, mmy = self.x_basis, self.y_basis
+        xs, ys, ws, hs, couls = self.rectangles(col_fond, workers)
 
-        # Créer l'image
-        tx, ty = mmx * niveaux[0][0], mmy * niveaux[0][1]
+        for x, y, lw, lh, coul in zip(xs.tolist(), ys.tolist(), ws.tolist(), hs.tolist(), couls.tolist()):
+            draw.rectangle([(x0 + mmx * x, y0 + mmy * y), (x0 + mmx * (x + lw) - 1, y0 + mmy * (y + lh) - 1)],
+                           fill=tuple(coul), outline=None)
 
-        imgn = pim.new("RGBA", (tx, ty), color=col_fond)
-        draw = ImageDraw.Draw(imgn)  # Pour accéder à imgn en mode "draw"
+        return len(xs)
 
-        # Parcourir la chaîne pour remplir l'image
-        lpos = []  # La position locale est une liste [[lx, ly], ...]
-        lbfond = False
+    def export_vector(self, img_fpath: str, col_fond: tuple[int, int, int, int] = (0, 0, 0, 0),
+                      fmt: Optional[str] = None, workers: Optional[int] = None) -> int:
+        """
+        Saves the image of the result as a vector image (SVG or PDF) : one rectangle per group of neighbouring cells
+        of the same color (see rectangles), one path per color
 
-        # Exemple de chaîne : '((KW_WK)W_W(KW_WK))' avec niveaux = [(4,4),(2,2),(1,1)]
-        # Autre exemple de chaîne avec fond précisé : '(&G(W/_/W)/_/(W/_/W))' avec niveaux = [(4,4),(2,2),(1,1)]
-        for car in chaine:
-            if car == '(':
-                if lpos:
-                    lpos[-1][0] += 1
-                lpos.append([-1, 0])
-            elif car == ')':
-                lpos.pop()
-            elif car == '_':
-                lpos[-1][0] = -1
-                lpos[-1][1] += 1
-            elif car == '&':
-                # Couleur de fond à venir
-                lbfond = True
+        The size of the image is the one of `img` (in pixels for SVG, in points for PDF), it can be scaled freely
+
+            img_fpath : path of the file - Example : "images/test.svg"
+            col_fond, workers : see rectangles
+            fmt (opt) : 'SVG' or 'PDF' (from the extension of img_fpath by default)
+
+        Returns :
+            the number of rectangles
+        """
+
+        if fmt is None:
+            fmt = {'.svg': 'SVG', '.pdf': 'PDF'}.get(os.path.splitext(img_fpath)[1].lower())
+
+        if fmt not in ('SVG', 'PDF'):
+            self.error(f"Unknown vector format : {fmt}")
+
+        xs, ys, ws, hs, couls = self.rectangles(col_fond, workers)
+        ncx, ncy = tailles_niveaux(self.dev_prf[1])[0]
+
+        # Les rectangles groupés par couleur
+        couls, index = np.unique(couls.reshape(-1, 4), axis=0, return_inverse=True)
+        ordre = np.argsort(index.ravel(), kind='stable')
+        groupes = np.split(ordre, np.cumsum(np.bincount(index.ravel(), minlength=len(couls)))[:-1])
+
+        with open(img_fpath, 'wb') as fic:
+            if fmt == 'SVG':
+                ecrire_svg(fic, (ncx, ncy), (self.x_basis, self.y_basis), couls,
+                           ((xs[sel], ys[sel], ws[sel], hs[sel]) for sel in groupes))
             else:
-                # Un caractère de couleur à traiter
-                if lbfond:
-                    # Pour le fond ( on a normalement : lpos[-1][0] = -1 )
-                    self.img_remplir_gen(draw, lpos, niveaux, mmx, mmy, car)
+                ecrire_pdf(fic, (ncx, ncy), (self.x_basis, self.y_basis), couls,
+                           ((xs[sel], ys[sel], ws[sel], hs[sel]) for sel in groupes))
 
-                else:
-                    # Pour le carré local
-                    lpos[-1][0] += 1
+        return len(xs)
 
-                    self.img_remplir_gen(draw, lpos, niveaux, mmx, mmy, car)
+    def zoom_tuiles(self, tile_size: int) -> int:
+        """
+        Gives the zoom of the full resolution in a pyramid of tiles (zoom 0 : the whole image in one tile)
+        """
 
-                lbfond = False
+        ncx, ncy = tailles_niveaux(self.niveaux_prf())[0]
+        taille = max(ncx * self.x_basis, ncy * self.y_basis)
 
-        # Pour finir
-        if func_img is not None:
-            imgn = func_img(imgn)
+        zoom = 0
+        while tile_size << zoom < taille:
+            zoom += 1
 
-        if img_fpath:
-            imgn.save(img_fpath)
+        return zoom
 
-        # Retour de l'image obtenue
-        return imgn
+    def tile(self, zoom: int, tx: int, ty: int, tile_size: int = 256,
+             col_fond: tuple[int, int, int, int] = (0, 0, 0, 0),
+             couls_aleas: Optional[dict] = None) -> Optional[np.ndarray]:
+        """
+        Gives a tile of the pyramid of the image (see iter_tiles), rendered from the lowest depth which is
+        precise enough for its zoom (see pixels_fenetre), then reduced
+
+            zoom, tx, ty : the tile (zoom 0 : the whole image in one tile)
+            tile_size, col_fond : see iter_tiles
+            couls_aleas (opt) : colors of the random leaves already drawn (see remplir_aleas)
+
+        Returns :
+            the (tile_size, tile_size, 4) array of the tile (transparent outside of the image),
+            None if the tile is outside of the image
+        """
+
+        niveaux = self.niveaux_prf()
+        if not niveaux:
+            self.error('There is no level')
+
+        tailles = tailles_niveaux(niveaux)
+        zoom_plein = self.zoom_tuiles(tile_size)
+        if not 0 <= zoom <= zoom_plein:
+            self.error(f"The zoom must be in 0 .. {zoom_plein}")
+
+        # Profondeur utilisée pour ce zoom : la plus petite dont les pixels ne sont pas plus grands
+        echelle = 1 << (zoom_plein - zoom)
+        depth = min(prof for prof in range(len(niveaux) + 1) if max(tailles[prof]) <= echelle)
+        if self.grille_resultat() is not None:
+            depth = len(niveaux)
+        redx, redy = tailles[depth]  # Pixels de l'image pour un pixel de la profondeur `depth`
+
+        larg, haut = tailles[0][0] * self.x_basis, tailles[0][1] * self.y_basis
+        x0, y0 = tx * tile_size * echelle, ty * tile_size * echelle
+        if tx < 0 or ty < 0 or x0 >= larg or y0 >= haut:
+            return None
+
+        table, _ = self.palette(col_fond)
+
+        # La fenêtre (en pixels de la profondeur `depth`) puis la réduction
+        x1, y1 = min(x0 + tile_size * echelle, larg), min(y0 + tile_size * echelle, haut)
+        fx0, fy0, fx1, fy1 = x0 / redx, y0 / redy, x1 / redx, y1 / redy
+
+        ix0, iy0 = int(fx0), int(fy0)
+        ix1, iy1 = -int(-fx1 // 1), -int(-fy1 // 1)
+        pixels = self.pixels_fenetre(ix0, iy0, ix1 - ix0, iy1 - iy0, depth, table,
+                                     {} if couls_aleas is None else couls_aleas)
+
+        lw, lh = -(-(x1 - x0) // echelle), -(-(y1 - y0) // echelle)
+        if (ix1 - ix0, iy1 - iy0) != (lw, lh) or (fx0, fy0) != (ix0, iy0):
+            imgn = pim.fromarray(pixels).convert('RGBa')
+            imgn = imgn.resize((lw, lh), pim.Resampling.BOX, box=(fx0 - ix0, fy0 - iy0, fx1 - ix0, fy1 - iy0))
+            pixels = np.asarray(imgn.convert('RGBA'))
+
+        tuile = np.zeros((tile_size, tile_size, 4), dtype=np.uint8)
+        tuile[:lh, :lw] = pixels
+        return tuile
+
+    def iter_tiles(self, tile_size: int = 256, col_fond: tuple[int, int, int, int] = (0, 0, 0, 0),
+                   max_zoom: Optional[int] = None):
+        """
+        Gives the tiles of a pyramid of the image (zoom 0 : the whole image in one tile), without building the image
+
+        The tiles of the last zoom are rendered from the tree (see pixels_fenetre). Below the full resolution
+        (see zoom_tuiles), they are rendered from the lowest depth which is precise enough, then reduced.
+        A tile of a lower zoom is the area average of its 4 children.
+        The fully transparent tiles are skipped
+
+            tile_size : size of the (square) tiles, in pixels
+            col_fond : background color - (0,0,0,0) for a transparent background
+            max_zoom (opt) : last zoom (the full resolution by default)
+
+        Returns :
+            generator of (zoom, x, y, pixels) with `pixels` the (tile_size, tile_size, 4) array of the tile
+            (transparent outside of the image), the children before their parent
+        """
+
+        niveaux = self.niveaux_prf()
+        if not niveaux:
+            self.error('There is no level')
+
+        tailles = tailles_niveaux(niveaux)
+        zoom_plein = self.zoom_tuiles(tile_size)
+        zoom_fin = zoom_plein if max_zoom is None else min(max_zoom, zoom_plein)
+        if zoom_fin < 0:
+            self.error("The zoom must be positive")
+
+        larg, haut = tailles[0][0] * self.x_basis, tailles[0][1] * self.y_basis
+        couls_aleas = {}
+
+        def noeud(zoom: int, tx: int, ty: int):
+            # Les tuiles du sous-arbre, puis la tuile elle-même (retournée)
+            taille = tile_size << (zoom_plein - zoom)
+            if tx * taille >= larg or ty * taille >= haut:
+                return None
+
+            if zoom == zoom_fin:
+                tuile = self.tile(zoom_fin, tx, ty, tile_size, col_fond, couls_aleas)
+            else:
+                enfants = []
+                for ly in range(2):
+                    for lx in range(2):
+                        enfants.append((yield from noeud(zoom + 1, 2 * tx + lx, 2 * ty + ly)))
+
+                if all(enfant is None for enfant in enfants):
+                    return None
+
+                mosaique = np.zeros((2 * tile_size, 2 * tile_size, 4), dtype=np.uint8)
+                for num, enfant in enumerate(enfants):
+                    if enfant is not None:
+                        ly, lx = divmod(num, 2)
+                        mosaique[ly * tile_size:(ly + 1) * tile_size, lx * tile_size:(lx + 1) * tile_size] = enfant
+
+                # Moyenne (alpha prémultiplié) des 4 enfants
+                tuile = np.asarray(pim.fromarray(mosaique).convert('RGBa').reduce(2).convert('RGBA'))
+
+            if not tuile[:, :, 3].any():
+                return None
+
+            yield zoom, tx, ty, tuile
+            return tuile
+
+        yield from noeud(0, 0, 0)
+
+    def export_tiles(self, dossier: str, fmt: str = 'xyz', tile_size: int = 256,
+                     col_fond: tuple[int, int, int, int] = (0, 0, 0, 0), max_zoom: Optional[int] = None) -> int:
+        """
+        Saves a pyramid of tiles of the image (see iter_tiles) in PNG files
+
+            dossier : folder of the pyramid
+            fmt : 'xyz' (dossier/zoom/x/y.png) or 'dzi' (dossier/image.dzi and dossier/image_files/level/x_y.png)
+            tile_size, col_fond, max_zoom : see iter_tiles
+
+        The fully transparent tiles are not saved
+
+        Returns :
+            number of saved tiles
+        """
+
+        if fmt not in ('xyz', 'dzi'):
+            self.error(f"Unknown tiles format : {fmt}")
+
+        zoom_plein = self.zoom_tuiles(tile_size)
+        zoom_fin = zoom_plein if max_zoom is None else min(max_zoom, zoom_plein)
+
+        # Taille de l'image au dernier zoom
+        ncx, ncy = tailles_niveaux(self.niveaux_prf())[0]
+        echelle = 1 << (zoom_plein - zoom_fin)
+        larg, haut = -(-ncx * self.x_basis // echelle), -(-ncy * self.y_basis // echelle)
+
+        # Deep Zoom : le niveau 0 est un pixel, le niveau `niv_fin` est l'image
+        niv_fin = (max(larg, haut) - 1).bit_length()
+        nb = 0
+
+        for zoom, tx, ty, tuile in self.iter_tiles(tile_size, col_fond, max_zoom):
+            imgn = pim.fromarray(tuile)
+
+            if fmt == 'xyz':
+                fpath = os.path.join(dossier, str(zoom), str(tx), f"{ty}.png")
+            else:
+                lech = 1 << (zoom_fin - zoom)
+                imgn = imgn.crop((0, 0, min(tile_size, -(-larg // lech) - tx * tile_size),
+                                  min(tile_size, -(-haut // lech) - ty * tile_size)))
+                fpath = os.path.join(dossier, 'image_files', str(niv_fin - zoom_fin + zoom), f"{tx}_{ty}.png")
+
+            os.makedirs(os.path.dirname(fpath), exist_ok=True)
+            imgn.save(fpath)
+            nb += 1
+
+            if fmt == 'dzi' and zoom == 0:
+                # Les niveaux plus petits qu'une tuile
+                for niv in range(niv_fin - zoom_fin - 1, -1, -1):
+                    imgn = imgn.convert('RGBa').reduce(2).convert('RGBA')
+                    fpath = os.path.join(dossier, 'image_files', str(niv), "0_0.png")
+                    os.makedirs(os.path.dirname(fpath), exist_ok=True)
+                    imgn.save(fpath)
+                    nb += 1
+
+        if fmt == 'dzi':
+            with open(os.path.join(dossier, 'image.dzi'), 'w', encoding='utf-8') as fic:
+                fic.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                          '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="png" Overlap="0" '
+                          f'TileSize="{tile_size}">\n  <Size Width="{larg}" Height="{haut}"/>\n</Image>\n')
+
+        return nb
+
+    def save(self, npz_fpath: str) -> None:
+        """
+        Saves the expanded result in an uncompressed .npz file (see load) : the levels, the color code (uint8)
+        of each smallest cell as drawn by img, their depths when there is a random color, and some parameters
+
+        Any engine can be saved : a string result is converted into a grid (the banned colors are not drawn)
+
+            npz_fpath : path of the file (".npz" is added if needed, see numpy.savez)
+        """
+
+        niveaux = list(self.dev_prf[1])
+        if not niveaux:
+            self.error('There is no level')
+
+        tailles = tailles_niveaux(niveaux)
+        grille, aleas = self.grille_img(tailles, self.palette((0, 0, 0, 0))[1])
+
+        if self.grille_resultat() is not None:
+            profondeur = self.dev_depth
+        elif aleas:
+            # La profondeur d'une feuille aléatoire vient de sa taille (les feuilles sont en ordre profondeur)
+            profs = {taille: prof for prof, taille in enumerate(tailles)}
+            profondeur = np.full(grille.shape, len(niveaux), dtype=np.uint8)
+            for x, y, ltx, lty in aleas:
+                profondeur[y:y + lty, x:x + ltx] = profs[(ltx, lty)]
+        else:
+            profondeur = None
+
+        # L'état de `random` à la fin du développement : mêmes couleurs aléatoires qu'après le constructeur
+        etat_rnd = self.dev_snapshots[-1][1] if self.dev_snapshots else rnd.getstate()
+        meta = {'version': __version__, 'engine': self.engine, 'nbiter': self.nbiter, 'patterns': self.patterns,
+                'colors': self.colors, 'banned_colors': self.banned_colors, 'x_basis': self.x_basis,
+                'y_basis': self.y_basis, 'rnd_state': [etat_rnd[0], list(etat_rnd[1]), etat_rnd[2]], 'rng': self.rng,
+                'rnd_seed': self.rnd_seed}
+
+        tableaux = {'grid': grille, 'levels': np.array(niveaux, dtype=np.int64).reshape(-1, 2),
+                    'meta': np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)}
+        if profondeur is not None:
+            tableaux['depth'] = profondeur
+
+        np.savez(npz_fpath, **tableaux)
+
+    @classmethod
+    def load(cls, npz_fpath: str, mmap: bool = True, verbose: bool = False) -> 'Lsystg':
+        """
+        Gives the L-system of a saved result (see save) as a grid result (engine 'grid') : img, render_region,
+        colors_at, iter_tiles ... are usable, but the rules are not known (no extend)
+
+        With `mmap`, the grids are memory-mapped : a region or some cells only read the pages they need
+
+        Example :
+            gls = Lsystg.load("result.npz")
+            imgn = gls.render_region(0, 0, 1024, 1024)
+        """
+
+        tableaux = lire_npz(npz_fpath, mmap)
+        meta = json.loads(bytes(tableaux['meta']))
+
+        # Un développement trivial, remplacé par le résultat sauvegardé
+        gls = cls(axiom='T', rules=[], nbiter=0, engine='grid', banned_colors=meta['banned_colors'],
+                  verbose=verbose, rnd_seed=None, rng=meta.get('rng', 'global'))
+
+        gls.axiom = gls.rules = None
+        gls.nbiter, gls.patterns, gls.colors = meta['nbiter'], meta['patterns'], meta['colors']
+        gls.x_basis, gls.y_basis = meta['x_basis'], meta['y_basis']
+        gls.rnd_seed = meta.get('rnd_seed', gls.rnd_seed)
+        gls.dev_prf = [tableaux['grid'], [tuple(niveau) for niveau in tableaux['levels'].tolist()]]
+        gls.dev_depth = tableaux.get('depth')
+
+        # L'état de `random` sauvegardé n'est utilisé que pour les couleurs aléatoires du résultat (voir etat_aleas)
+        version, etat, gauss = meta['rnd_state']
+        gls.dev_rnd = (version, tuple(etat), gauss)
+        gls.dev_snapshots = [((gls.dev_prf[0], gls.dev_depth, tuple(gls.dev_prf[1]), frozenset()), gls.dev_rnd)]
+
+        return gls
+
+
+# Process pool
+# ----------------------
+
+def grille_cellule(gls: Lsystg, nom_shm: str, lx: int, ly: int) -> np.ndarray:
+    """
+    Builds a cell of the first level into the grid of color codes in shared memory (see Lsystg.grille_workers)
+
+        gls : the L-system (with its tree of `tuiles_prf`)
+        nom_shm : name of the shared memory of the grid
+        lx, ly : position of the cell in the first level
+
+    Returns :
+        the leaves (depth, x, y) having the random color, as a (n, 3) array
+    """
+
+    racine, niveaux, tuiles = gls.tuiles_prf()
+    tailles = tailles_niveaux(niveaux)
+    (ncx, ncy), (ltx, lty) = tailles[0], tailles[1]
+    x0, y0 = lx * ltx, ly * lty
+
+    if gls.tuiles_aleas() or gls.tuiles_choix():
+        # Les feuilles sont nécessaires pour les couleurs aléatoires (et les choix par cellule)
+        codes, xs, ys, profs = gls.region_grid(x0, y0, x0 + ltx, y0 + lty, len(niveaux))
+        bloc = np.zeros((lty, ltx), dtype=np.uint8)
+        bloc[ys - y0, xs - x0] = codes
+    else:
+        if racine in tuiles[0]:
+            bloc = gls.grille_memo((int(tuiles[0][racine][ly, lx]), 1))
+        else:
+            bloc = np.full((lty, ltx), racine, dtype=np.uint8)
+        codes = profs = xs = ys = np.zeros(0, dtype=np.int64)
+
+    shm = shared_memory.SharedMemory(name=nom_shm)
+    try:
+        grille = np.ndarray((ncy, ncx), dtype=np.uint8, buffer=shm.buf)
+        grille[y0:y0 + lty, x0:x0 + ltx] = bloc
+        del grille
+    finally:
+        shm.close()
+
+    sel = codes == ord('?')
+    ltailles = np.array(tailles)[profs[sel]]
+
+    return np.stack([profs[sel].astype(np.int64), xs[sel] // ltailles[:, 0] * ltailles[:, 0],
+                     ys[sel] // ltailles[:, 1] * ltailles[:, 1]], axis=1).reshape(-1, 3)
+
+
+def image_shm(imgn: pim.Image) -> str:
+    """
+    Copies an image into a new shared memory : size of the header, header (JSON) then pixels
+
+    Returns :
+        the name of the shared memory (see shm_image)
+    """
+
+    tab = np.asarray(imgn)
+    entete = json.dumps({'shape': tab.shape, 'palette': imgn.getpalette('RGBA') if imgn.mode == 'P' else None})
+    entete = entete.encode()
+
+    shm = shared_memory.SharedMemory(create=True, size=8 + len(entete) + tab.nbytes)
+    try:
+        shm.buf[:8 + len(entete)] = struct.pack('<Q', len(entete)) + entete
+        pixels = np.ndarray(tab.shape, dtype=np.uint8, buffer=shm.buf, offset=8 + len(entete))
+        pixels[...] = tab
+        del pixels
+    finally:
+        shm.close()
+
+    return shm.name
+
+
+def shm_image(nom_shm: str, unlink: bool = False) -> pim.Image:
+    """
+    Gives the image of a shared memory (see image_shm), removed if `unlink`
+    """
+
+    shm = shared_memory.SharedMemory(name=nom_shm)
+    try:
+        taille = struct.unpack('<Q', bytes(shm.buf[:8]))[0]
+        entete = json.loads(bytes(shm.buf[8:8 + taille]))
+        tab = np.ndarray(entete['shape'], dtype=np.uint8, buffer=shm.buf, offset=8 + taille).copy()
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+    imgn = pim.fromarray(tab)
+    if entete['palette'] is not None:
+        imgn.putpalette(bytes(entete['palette']), rawmode='RGBA')
+
+    return imgn
+
+
+def supprime_shm(nom_shm: str) -> None:
+    """ Removes a shared memory (if it is still there) """
+    try:
+        shm = shared_memory.SharedMemory(name=nom_shm)
+    except FileNotFoundError:
+        return
+
+    shm.close()
+    shm.unlink()
+
+
+IMAGES_PROCESSUS = {}  # The L-system and the states of a process of Lsystg.iter_images (see init_images)
+
+
+def init_images(gls: Lsystg, etats: list[tuple], etat_rnd: tuple) -> None:
+    """ Keeps the L-system and the states of the images of a process (see Lsystg.iter_images) """
+    IMAGES_PROCESSUS['images'] = gls, etats, etat_rnd
+
+
+def image_etat(num: int, col_fond: tuple[int, int, int, int], mode: str, func_img: Optional[Callable]) -> str:
+    """
+    Renders an image of Lsystg.iter_images in a process (see init_images)
+
+    Returns :
+        the name of the shared memory of the image (see shm_image)
+    """
+
+    gls, etats, etat_rnd = IMAGES_PROCESSUS['images']
+    rnd.setstate(etat_rnd)
+
+    return image_shm(gls.img_etat(etats[num], col_fond, mode, func_img))
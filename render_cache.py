@@ -0,0 +1,143 @@
+"""
+Content-addressed disk cache of the rendered images (see RenderCache), shared by the batch runs,
+the HTTP server and the streamlit application
+
+The keys are the render keys of the parameters (see lsystog.render_key)
+"""
+
+from contextlib import contextmanager
+import io
+import os
+import tempfile
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows : the render cache is not locked
+    fcntl = None
+
+from PIL import Image as pim
+
+
+class RenderCache:
+    """
+    Content-addressed disk cache of PNG images (see lsystog.render_key), shareable between processes
+
+    The files are written atomically (temporary file then rename), the eviction is done under a file lock :
+    the least recently used images are removed when the cache is over `max_bytes`
+
+        dossier : folder of the cache (created if needed)
+        max_bytes : size budget of the cache, in bytes
+    """
+
+    def __init__(self, dossier: str, max_bytes: int = 1 << 30) -> None:
+        self.dossier = dossier
+        self.max_bytes = max_bytes
+        os.makedirs(dossier, exist_ok=True)
+
+    def chemin(self, key: str) -> str:
+        """ Gives the path of the image of a key """
+        return os.path.join(self.dossier, key[:2], f"{key}.png")
+
+    @contextmanager
+    def verrou(self):
+        """ Exclusive lock of the cache, between processes """
+        with open(os.path.join(self.dossier, '.lock'), 'a', encoding='utf-8') as fic:
+            if fcntl is not None:
+                fcntl.flock(fic, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fic, fcntl.LOCK_UN)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Gives the PNG data of a key (and marks it as used) or None
+        """
+
+        try:
+            with open(self.chemin(key), 'rb') as fic:
+                donnees = fic.read()
+            os.utime(self.chemin(key))
+        except FileNotFoundError:
+            return None
+
+        return donnees
+
+    def put(self, key: str, donnees: bytes) -> None:
+        """
+        Stores the PNG data of a key, then evicts the least recently used images if needed
+        """
+
+        os.makedirs(os.path.dirname(self.chemin(key)), exist_ok=True)
+
+        num, temp = tempfile.mkstemp(dir=os.path.dirname(self.chemin(key)), suffix='.tmp')
+        try:
+            with os.fdopen(num, 'wb') as fic:
+                fic.write(donnees)
+            os.replace(temp, self.chemin(key))
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used images until the cache is within its budget
+        """
+
+        with self.verrou():
+            fichiers = []
+            for sous in os.scandir(self.dossier):
+                if sous.is_dir():
+                    fichiers.extend((fic.stat().st_mtime, fic.stat().st_size, fic.path) for fic in os.scandir(sous)
+                                    if fic.name.endswith('.png'))
+
+            total = sum(taille for _, taille, _ in fichiers)
+            for _, taille, fpath in sorted(fichiers):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(fpath)
+                except FileNotFoundError:
+                    pass
+                total -= taille
+
+    def get_image(self, key: str) -> Optional[pim.Image]:
+        """
+        Gives the image of a key, None if it is not in the cache
+        """
+
+        donnees = self.get(key)
+        if donnees is None:
+            return None
+
+        imgn = pim.open(io.BytesIO(donnees))
+        imgn.load()
+        return imgn
+
+    def put_image(self, key: str, imgn: pim.Image) -> None:
+        """
+        Stores an image (PNG)
+        """
+
+        tampon = io.BytesIO()
+        imgn.save(tampon, format='PNG')
+        self.put(key, tampon.getvalue())
+
+    def image(self, key: str, rendu: Callable[[], pim.Image]) -> pim.Image:
+        """
+        Gives the image of a key : from the cache, or rendered by `rendu()` then stored
+
+        Example :
+            cache.image(key, lambda: gls.img(img_fpath=""))
+        """
+
+        imgn = self.get_image(key)
+        if imgn is None:
+            imgn = rendu()
+            self.put_image(key, imgn)
+
+        return imgn
@@ -0,0 +1,280 @@
+"""
+Bounded pool of render processes for an interactive use (see RenderPool), as in the streamlit application
+
+The jobs are the ones of a manifest (see batch.JOB_DEFAULTS), the last L-system of a process is reused
+(see lsystg_job) and the images come back through shared memory (see lsystog.image_shm)
+"""
+
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from multiprocessing import shared_memory
+import struct
+import threading
+import time
+from typing import Callable, Optional
+
+from PIL import Image as pim
+
+import batch
+import lsystog as ls
+
+
+# Control block of a job of a RenderPool : cancel flag, number of the last image, name of its shared memory
+CTL_CANCEL, CTL_NUM, CTL_NOM, CTL_SIZE = 0, 1, 8, 128
+
+LSYSTG_PROCESSUS = {}  # The last L-system of a process of a RenderPool (see lsystg_job)
+
+
+def lsystg_job(job: dict, cancel: Optional[Callable[[], bool]] = None,
+               time_budget: Optional[float] = None) -> ls.Lsystg:
+    """
+    Gives the L-system of a job (see batch.JOB_DEFAULTS) : the last one of the process is extended (see Lsystg.extend)
+    when only the number of iterations changes
+    """
+
+    params = (tuple(job['patterns']), job['colors'], job['banned_colors'], job['rotation'], job['nb_dest'],
+              job['engine'], job['rng'])
+
+    # Un L-système interrompu n'est pas réutilisable : il n'est remis qu'après un succès
+    gls = LSYSTG_PROCESSUS.pop(params, None)
+    LSYSTG_PROCESSUS.clear()
+
+    if gls is None:
+        gls = ls.Lsystg(axiom=None, rules=None, nbiter=job['nbiter'], patterns=job['patterns'],
+                        colors=job['colors'], banned_colors=job['banned_colors'], nb_dest=job['nb_dest'],
+                        engine=job['engine'], func_transf=ls.strc_2_strc_90 if job['rotation'] else None,
+                        cancel=cancel, time_budget=time_budget, rng=job['rng'])
+    else:
+        gls.cancel = cancel
+        gls.deadline = None if time_budget is None else time.monotonic() + time_budget
+        gls.extend(job['nbiter'] - gls.nbiter)
+
+    LSYSTG_PROCESSUS[params] = gls
+
+    return gls
+
+
+def rendu_pool(job: dict, nom_ctl: str, time_budget: Optional[float], previews: bool) -> str:
+    """
+    Renders a job in a process of a RenderPool
+
+    With `previews`, each image of `iter_images` is published in the control block (the previous one is removed),
+    otherwise only the final image is rendered
+
+        nom_ctl : name of the shared memory of the control block (see CTL_SIZE)
+        time_budget (opt) : in seconds, from the start of the rendering
+
+    Returns :
+        the name of the shared memory of the final image (see image_shm)
+    """
+
+    ctl = shared_memory.SharedMemory(name=nom_ctl)
+    nom_shm = None
+    try:
+        gls = lsystg_job(job, cancel=lambda: ctl.buf[CTL_CANCEL] != 0, time_budget=time_budget)
+
+        if previews:
+            images = gls.iter_images(col_fond=job['background'], mode=job['mode'])
+        else:
+            images = [gls.img("", col_fond=job['background'], mode=job['mode'])]
+
+        for num, imgn in enumerate(images, 1):
+            gls.checkpoint()
+            precedent, nom_shm = nom_shm, ls.image_shm(imgn)
+
+            nom = nom_shm.encode()
+            ctl.buf[CTL_NOM:CTL_NOM + len(nom) + 1] = nom + b'\0'
+            ctl.buf[CTL_NUM:CTL_NUM + 4] = struct.pack('<I', num)
+
+            if precedent is not None:
+                ls.supprime_shm(precedent)
+    except BaseException:
+        if nom_shm is not None:
+            ls.supprime_shm(nom_shm)
+        raise
+    finally:
+        ctl.close()
+
+    return nom_shm
+
+
+class RenderPool:
+    """
+    Bounded pool of render processes for an interactive use (see rendu_pool)
+
+    Each submitted job gets an ID. An identical job in flight (same render key) is shared, it is only cancelled
+    when all its submitters have cancelled it. The cancellation and the time budgets are cooperative
+    (see Lsystg.checkpoint), the images come back through shared memory (they are not pickled)
+
+        max_workers : number of processes
+        time_budget (opt) : default time budget of a job, in seconds
+
+    Example :
+        job_id = pool.submit({'patterns': ['0?0_1/1_020'], 'colors': 'GRB', 'nbiter': 5})
+        imgn = pool.result(job_id, timeout=60)
+    """
+
+    def __init__(self, max_workers: int = 2, time_budget: Optional[float] = 60.0) -> None:
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        self.time_budget = time_budget
+        self.jobs = {}  # ID -> {'key', 'future', 'ctl' (control block), 'refs' (submitters), 'image'}
+        self.en_cours = {}  # render key -> ID of the job in flight
+        self.verrou = threading.RLock()
+        self.compteur = 0
+
+    def submit(self, job: dict, time_budget: Optional[float] = None, previews: bool = False) -> str:
+        """
+        Submits a job (see batch.JOB_DEFAULTS, the output is not used), shared with an identical job in flight
+
+            time_budget (opt) : in seconds (the one of the pool by default)
+            previews : the coarser images are published (see preview)
+
+        Returns :
+            the ID of the job
+        """
+
+        job = {**batch.JOB_DEFAULTS, **job}
+        cle = batch.job_key(job)
+
+        with self.verrou:
+            job_id = self.en_cours.get(cle)
+            if job_id is not None:
+                self.jobs[job_id]['refs'] += 1
+                return job_id
+
+            self.compteur += 1
+            job_id = f"{cle[:16]}-{self.compteur}"
+
+            ctl = shared_memory.SharedMemory(create=True, size=CTL_SIZE)
+            ctl.buf[:CTL_SIZE] = bytes(CTL_SIZE)
+
+            future = self.executor.submit(rendu_pool, job, ctl.name,
+                                          self.time_budget if time_budget is None else time_budget, previews)
+            self.jobs[job_id] = {'key': cle, 'future': future, 'ctl': ctl, 'refs': 1, 'image': None}
+            self.en_cours[cle] = job_id
+
+            future.add_done_callback(lambda _: self.nettoie(job_id))
+
+        return job_id
+
+    def cancel(self, job_id: str) -> None:
+        """
+        Cancels a job for one of its submitters (unknown or finished jobs are ignored)
+        """
+
+        with self.verrou:
+            entree = self.jobs.get(job_id)
+            if entree is None:
+                return
+
+            entree['refs'] -= 1
+            if entree['refs'] > 0:
+                return
+
+            if self.en_cours.get(entree['key']) == job_id:
+                del self.en_cours[entree['key']]
+
+            entree['ctl'].buf[CTL_CANCEL] = 1
+            entree['future'].cancel()
+            self.nettoie(job_id)
+
+    def nettoie(self, job_id: str) -> None:
+        """
+        Frees a job which is finished and not awaited anymore (cancelled or collected)
+        """
+
+        with self.verrou:
+            entree = self.jobs.get(job_id)
+            if entree is None or entree['refs'] > 0 or not entree['future'].done():
+                return
+
+            del self.jobs[job_id]
+            if self.en_cours.get(entree['key']) == job_id:
+                del self.en_cours[entree['key']]
+
+            future = entree['future']
+            if not future.cancelled() and future.exception() is None and entree['image'] is None:
+                ls.supprime_shm(future.result())
+
+            entree['ctl'].close()
+            entree['ctl'].unlink()
+
+    def done(self, job_id: str) -> bool:
+        """ Tells if a job is finished (or unknown) """
+        with self.verrou:
+            entree = self.jobs.get(job_id)
+            return entree is None or entree['future'].done()
+
+    def preview(self, job_id: str) -> Optional[tuple[int, pim.Image]]:
+        """
+        Gives the last published image of a job (see submit) with its number, None if there is none yet
+        """
+
+        with self.verrou:
+            entree = self.jobs.get(job_id)
+            if entree is None:
+                return None
+
+            ctl = entree['ctl']
+            num = struct.unpack('<I', bytes(ctl.buf[CTL_NUM:CTL_NUM + 4]))[0]
+            nom = bytes(ctl.buf[CTL_NOM:CTL_SIZE]).split(b'\0')[0].decode()
+
+        if num == 0:
+            return None
+
+        try:
+            # L'image a pu être remplacée entre-temps
+            return num, ls.shm_image(nom)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def result(self, job_id: str, timeout: Optional[float] = None) -> pim.Image:
+        """
+        Gives the final image of a job, for one of its submitters
+
+            timeout (opt) : in seconds (concurrent.futures.TimeoutError after it, the job is not cancelled)
+
+        Returns :
+            the image, or raises the error of the job (LsystCancelled if it is cancelled)
+        """
+
+        with self.verrou:
+            entree = self.jobs.get(job_id)
+        if entree is None:
+            raise ls.LsystError(f"Unknown job : {job_id}")
+
+        try:
+            nom_shm = entree['future'].result(timeout)
+        except CancelledError as ex:
+            raise ls.LsystCancelled("The computation is cancelled") from ex
+        except TimeoutError:
+            raise
+        except BaseException:
+            self.cancel(job_id)
+            raise
+
+        with self.verrou:
+            if entree['image'] is None:
+                entree['image'] = ls.shm_image(nom_shm, unlink=True)
+            imgn = entree['image']
+
+            # Un job terminé n'est plus partagé avec de nouveaux demandeurs
+            if self.en_cours.get(entree['key']) == job_id:
+                del self.en_cours[entree['key']]
+
+            entree['refs'] -= 1
+            self.nettoie(job_id)
+
+        return imgn
+
+    def shutdown(self) -> None:
+        """ Cancels the jobs and stops the processes """
+        with self.verrou:
+            for job_id, entree in list(self.jobs.items()):
+                entree['refs'] = 1
+                self.cancel(job_id)
+
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+        with self.verrou:
+            for job_id in list(self.jobs):
+                self.nettoie(job_id)
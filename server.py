@@ -0,0 +1,439 @@
+"""
+Standalone HTTP server of images and tiles (asyncio, standard library only)
+
+    python server.py --port 8000 --workers 4 --cache .gridz_cache
+    python server.py --load-test "http://127.0.0.1:8000/tiles/0/0/0.png?pattern=1/2_1//_111&nbiter=5" -n 500
+
+Routes (GET or HEAD) :
+    /image?pattern=...&colors=GRB&nbiter=4&rotation=1 : the PNG image (see Lsystg.img)
+    /tiles/{z}/{x}/{y}.png?pattern=... : a tile of the pyramid of the image (see Lsystg.tile)
+
+The images are rendered by a process pool (see render_pool.lsystg_job : the last L-system of a process is reused),
+the identical requests in flight share the same rendering. The ETags are strong : they come from the render key
+of the parameters (see lsystog.render_key), which includes the version of the renderer
+"""
+
+import argparse
+import asyncio
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from http import HTTPStatus
+import io
+import json
+import re
+import time
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from loguru import logger
+from PIL import Image as pim
+
+import batch
+import lsystog as ls
+from render_cache import RenderCache
+from render_pool import lsystg_job
+
+
+class RequestTooLarge(ls.LsystError):
+    """ The result of a request is over the limits of the server (see batch.nbiter_job) """
+
+
+TILE_PATH = re.compile(r'/tiles/(\d+)/(\d+)/(\d+)\.png')
+
+MAX_NBITER = 30  # The size of a request is checked before any work (see batch.nbiter_job)
+MAX_NB_DEST = 16  # The destinations of a rule cycle over the colors : more of them only cost memory
+
+# Random colors and choices per cell : each request is rendered on its own, the tiles and the image agree
+SERVER_DEFAULTS = {'engine': 'lazy', 'rng': 'cell', 'banned_colors': '/', 'background': (0, 0, 0, 255), 'mode': 'P'}
+
+
+def job_from_query(query: str) -> dict:
+    """
+    Gives the job (see batch.JOB_DEFAULTS) of the query string of a request
+
+    Parameters : pattern (repeatable), colors, nbiter, rotation (1/0), banned, background ("r,g,b,a"), nb_dest, mode
+
+    Example :
+        job_from_query("pattern=1/2_1//_111&colors=RBG&nbiter=5") -> {'patterns': ['1/2_1//_111'], ...}
+    """
+
+    params = parse_qs(query, keep_blank_values=True)
+
+    def param(nom: str, defaut: Optional[str] = None) -> Optional[str]:
+        return params[nom][-1] if nom in params else defaut
+
+    patterns = [pattern for pattern in params.get('pattern', []) if pattern]
+    if not patterns:
+        raise ValueError("The parameter 'pattern' is needed")
+
+    job = {**batch.JOB_DEFAULTS, **SERVER_DEFAULTS, 'patterns': patterns, 'colors': param('colors', 'GRB'),
+           'nbiter': int(param('nbiter', '4')), 'rotation': param('rotation', '0').lower() in ('1', 'true', 'yes'),
+           'nb_dest': int(param('nb_dest', '1'))}
+
+    if 'banned' in params:
+        job['banned_colors'] = param('banned')
+    if 'background' in params:
+        job['background'] = tuple(int(val) for val in param('background').split(','))
+    if 'mode' in params:
+        job['mode'] = param('mode')
+
+    if not 1 <= job['nbiter'] <= MAX_NBITER:
+        raise ValueError(f"The parameter 'nbiter' must be in 1 .. {MAX_NBITER}")
+    if not 1 <= job['nb_dest'] <= MAX_NB_DEST:
+        raise ValueError(f"The parameter 'nb_dest' must be in 1 .. {MAX_NB_DEST}")
+    if len(job['background']) != 4 or not all(0 <= val <= 255 for val in job['background']):
+        raise ValueError("The parameter 'background' must be 'r,g,b,a' (0 .. 255)")
+    if job['mode'] not in ('P', 'RGBA'):
+        raise ValueError("The parameter 'mode' must be 'P' or 'RGBA'")
+
+    return job
+
+
+def png_bytes(imgn: pim.Image) -> bytes:
+    """ Gives the PNG data of an image """
+    tampon = io.BytesIO()
+    imgn.save(tampon, format='PNG')
+    return tampon.getvalue()
+
+
+def render_image(job: dict, time_budget: Optional[float] = None) -> bytes:
+    """ Renders the image of a job in a process of the pool (PNG data) """
+    gls = lsystg_job(job, time_budget=time_budget)
+    return png_bytes(gls.img("", col_fond=job['background'], mode=job['mode']))
+
+
+def render_tile(job: dict, zoom: int, tx: int, ty: int, tile_size: int,
+                time_budget: Optional[float] = None) -> Optional[bytes]:
+    """ Renders a tile of the image of a job in a process of the pool (PNG data, None outside of the image) """
+    gls = lsystg_job(job, time_budget=time_budget)
+    pixels = gls.tile(zoom, tx, ty, tile_size, col_fond=job['background'])
+    return None if pixels is None else png_bytes(pim.fromarray(pixels))
+
+
+class GridzServer:
+    """
+    HTTP/1.1 server (keep-alive, GET and HEAD) of the images and tiles, rendered by a process pool
+
+        workers (opt) : number of processes (number of CPUs by default)
+        cache (opt) : disk cache of the PNG data (see render_cache.RenderCache)
+        time_budget (opt) : in seconds, for each rendering (503 when it is over)
+        max_pixels : a larger image is not rendered (413)
+        tile_size : size of the tiles in pixels
+        memory_bytes : size budget of the PNG data kept in memory (the most recently used ones)
+    """
+
+    def __init__(self, workers: Optional[int] = None, cache: Optional[RenderCache] = None,
+                 time_budget: Optional[float] = None, max_pixels: int = 1 << 26, tile_size: int = 256,
+                 memory_bytes: int = 1 << 26) -> None:
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.cache = cache
+        self.time_budget = time_budget
+        self.max_pixels = max_pixels
+        self.tile_size = tile_size
+        self.memory_bytes = memory_bytes
+        self.memory = OrderedDict()  # Render key -> PNG data, the least recently used first
+        self.memory_size = 0  # Size of the PNG data in `memory`
+        self.in_flight = {}  # Render key -> task of the rendering (shared by the identical requests)
+        self.stats = Counter()  # requests, renders, coalesced, memory, cached, not_modified, errors
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8000) -> asyncio.Server:
+        """ Starts listening (port 0 : any free port, see the sockets of the returned server) """
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self) -> None:
+        """ Stops the process pool """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ Serves the requests of a connection """
+        try:
+            while True:
+                try:
+                    entete = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, {}, b'', False)
+                    break
+
+                lignes = entete.decode('latin-1').split('\r\n')
+                try:
+                    methode, cible, version = lignes[0].split(' ')
+                except ValueError:
+                    await self.send(writer, HTTPStatus.BAD_REQUEST, {}, b'', False)
+                    break
+
+                headers = {}
+                for ligne in lignes[1:]:
+                    if ':' in ligne:
+                        nom, valeur = ligne.split(':', 1)
+                        headers[nom.strip().lower()] = valeur.strip()
+
+                connexion = headers.get('connection', '').lower()
+                garder = connexion == 'keep-alive' if version == 'HTTP/1.0' else connexion != 'close'
+
+                if methode not in ('GET', 'HEAD') or 'content-length' in headers or 'transfer-encoding' in headers:
+                    await self.send(writer, HTTPStatus.METHOD_NOT_ALLOWED, {'Allow': 'GET, HEAD'}, b'', False)
+                    break
+
+                statut, lheaders, corps = await self.respond(cible, headers)
+                await self.send(writer, statut, lheaders, b'' if methode == 'HEAD' else corps, garder,
+                                len(corps))
+                if not garder:
+                    break
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def send(writer: asyncio.StreamWriter, statut: HTTPStatus, headers: dict, corps: bytes,
+                   garder: bool, longueur: Optional[int] = None) -> None:
+        """ Writes a response (the length of a HEAD response is the one of its GET response) """
+        lignes = [f"HTTP/1.1 {statut.value} {statut.phrase}"]
+        lignes += [f"{nom}: {valeur}" for nom, valeur in headers.items()]
+        lignes += [f"Content-Length: {len(corps) if longueur is None else longueur}",
+                   f"Connection: {'keep-alive' if garder else 'close'}"]
+
+        writer.write(('\r\n'.join(lignes) + '\r\n\r\n').encode('latin-1') + corps)
+        await writer.drain()
+
+    async def respond(self, cible: str, headers: dict) -> tuple[HTTPStatus, dict, bytes]:
+        """
+        Gives the response (status, headers, body) of a request
+
+            cible : the target of the request (path and query string)
+            headers : the headers of the request (lowercase names)
+        """
+
+        self.stats['requests'] += 1
+        url = urlsplit(cible)
+        tuile = TILE_PATH.fullmatch(url.path)
+
+        if url.path != '/image' and tuile is None:
+            return self.error(HTTPStatus.NOT_FOUND, f"Unknown path : {url.path}")
+
+        try:
+            job = job_from_query(url.query)
+        except (ValueError, TypeError) as ex:
+            return self.error(HTTPStatus.BAD_REQUEST, str(ex))
+
+        # ETag fort : la clé de rendu des paramètres (et de la tuile)
+        key = batch.job_key(job)
+        if tuile is not None:
+            zoom, tx, ty = (int(val) for val in tuile.groups())
+            key = hashlib.sha256(f"{key}/{self.tile_size}/{zoom}/{tx}/{ty}".encode()).hexdigest()
+
+        etag = f'"{key}"'
+        lheaders = {'ETag': etag, 'Cache-Control': 'public, max-age=86400'}
+
+        demandes = [val.strip() for val in headers.get('if-none-match', '').split(',')]
+        if etag in demandes or '*' in demandes:
+            self.stats['not_modified'] += 1
+            return HTTPStatus.NOT_MODIFIED, lheaders, b''
+
+        corps = self.memory.get(key)
+        if corps is not None:
+            self.memory.move_to_end(key)
+            self.stats['memory'] += 1
+            return HTTPStatus.OK, {**lheaders, 'Content-Type': 'image/png'}, corps
+
+        try:
+            if tuile is None:
+                corps = await self.render(key, self.max_pixels, render_image, job, self.time_budget)
+            else:
+                # Une tuile est rendue sans l'image entière : seule la taille du résultat est bornée
+                corps = await self.render(key, None, render_tile, job, zoom, tx, ty, self.tile_size,
+                                          self.time_budget)
+        except RequestTooLarge as ex:
+            return self.error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE if tuile is None else HTTPStatus.BAD_REQUEST,
+                              str(ex))
+        except ls.LsystCancelled as ex:
+            return self.error(HTTPStatus.SERVICE_UNAVAILABLE, str(ex))
+        except ls.LsystError as ex:
+            return self.error(HTTPStatus.BAD_REQUEST, str(ex))
+        except Exception as ex:  # pylint: disable=broad-exception-caught
+            # Une requête en erreur ne doit pas arrêter le serveur
+            logger.error(f"{cible} : {type(ex).__name__}: {ex}")
+            return self.error(HTTPStatus.INTERNAL_SERVER_ERROR, "The rendering failed")
+
+        if corps is None:
+            return self.error(HTTPStatus.NOT_FOUND, "The tile is outside of the image")
+
+        return HTTPStatus.OK, {**lheaders, 'Content-Type': 'image/png'}, corps
+
+    def error(self, statut: HTTPStatus, message: str) -> tuple[HTTPStatus, dict, bytes]:
+        """ Gives an error response (JSON body) """
+        self.stats['errors'] += 1
+        return statut, {'Content-Type': 'application/json'}, json.dumps({'error': message}).encode()
+
+    async def render(self, key: str, max_pixels: Optional[int], func: Callable, job: dict, *args) -> Optional[bytes]:
+        """
+        Gives the PNG data of a key : from the cache, from the rendering in flight of an identical request,
+        or from a new rendering by the process pool
+
+            max_pixels : the larger images are not rendered (see produce)
+            func, job, args : the rendering, called with (job, *args) in the process pool
+        """
+
+        tache = self.in_flight.get(key)
+        if tache is None:
+            tache = asyncio.ensure_future(self.produce(key, max_pixels, func, job, *args))
+            self.in_flight[key] = tache
+            tache.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.stats['coalesced'] += 1
+
+        # Un client qui part n'annule pas le rendu partagé
+        return await asyncio.shield(tache)
+
+    async def produce(self, key: str, max_pixels: Optional[int], func: Callable, job: dict,
+                      *args) -> Optional[bytes]:
+        """
+        Renders a key in the process pool (the cache is used if there is one) : the disk I/O of the cache
+        (under its file lock) is done in a thread, the event loop is never blocked
+
+        Before the rendering, the size of the result is known without expanding anything (see batch.nbiter_job) :
+        RequestTooLarge if it is over `max_pixels` or over the limits of the engine
+        """
+        if self.cache is not None:
+            donnees = await asyncio.to_thread(self.cache.get, key)
+            if donnees is not None:
+                self.stats['cached'] += 1
+                self.remember(key, donnees)
+                return donnees
+
+        boucle = asyncio.get_running_loop()
+        if await boucle.run_in_executor(self.executor, batch.nbiter_job, job, max_pixels) < job['nbiter']:
+            raise RequestTooLarge("The image would be too large" if max_pixels is not None
+                                  else "The number of iterations is too high for this pattern")
+
+        self.stats['renders'] += 1
+        donnees = await boucle.run_in_executor(self.executor, func, job, *args)
+        self.remember(key, donnees)
+
+        if self.cache is not None and donnees is not None:
+            await asyncio.to_thread(self.cache.put, key, donnees)
+
+        return donnees
+
+    def remember(self, key: str, donnees: Optional[bytes]) -> None:
+        """ Keeps the PNG data of a key in memory, then forgets the least recently used ones if needed """
+        if donnees is None or len(donnees) > self.memory_bytes:
+            return
+
+        ancien = self.memory.pop(key, None)
+        if ancien is not None:
+            self.memory_size -= len(ancien)
+
+        self.memory[key] = donnees
+        self.memory_size += len(donnees)
+        while self.memory_size > self.memory_bytes:
+            _, ancien = self.memory.popitem(last=False)
+            self.memory_size -= len(ancien)
+
+
+async def fetch(host: str, port: int, cibles: list[str], headers: Optional[dict] = None) -> list[tuple]:
+    """
+    Sends some GET requests on a single keep-alive connection
+
+    Returns :
+        [(status, headers, body, seconds), ...] in the order of `cibles`
+    """
+
+    reader, writer = await asyncio.open_connection(host, port)
+    reponses = []
+    try:
+        for cible in cibles:
+            debut = time.perf_counter()
+            lignes = [f"GET {cible} HTTP/1.1", f"Host: {host}:{port}"]
+            lignes += [f"{nom}: {valeur}" for nom, valeur in (headers or {}).items()]
+            writer.write(('\r\n'.join(lignes) + '\r\n\r\n').encode('latin-1'))
+            await writer.drain()
+
+            entete = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+            lheaders = {}
+            for ligne in entete[1:]:
+                if ':' in ligne:
+                    nom, valeur = ligne.split(':', 1)
+                    lheaders[nom.strip().lower()] = valeur.strip()
+
+            corps = await reader.readexactly(int(lheaders.get('content-length', 0)))
+            reponses.append((int(entete[0].split(' ')[1]), lheaders, corps, time.perf_counter() - debut))
+    finally:
+        writer.close()
+
+    return reponses
+
+
+async def load_test(url: str, requests: int = 200, concurrency: int = 16) -> dict:
+    """
+    Sends `requests` GET requests of an URL from `concurrency` keep-alive connections
+
+    Returns :
+        {'requests', 'errors', 'seconds', 'requests_per_second', 'p50_ms', 'p95_ms', 'statuses'}
+    """
+
+    morceaux = urlsplit(url)
+    cible = morceaux.path + (f"?{morceaux.query}" if morceaux.query else '')
+    parts = [requests // concurrency + (num < requests % concurrency) for num in range(concurrency)]
+
+    debut = time.perf_counter()
+    resultats = await asyncio.gather(*(fetch(morceaux.hostname, morceaux.port or 80, [cible] * nb)
+                                       for nb in parts if nb))
+    duree = time.perf_counter() - debut
+
+    reponses = [reponse for resultat in resultats for reponse in resultat]
+    durees = sorted(reponse[3] for reponse in reponses)
+
+    return {'requests': len(reponses), 'errors': sum(reponse[0] >= 400 for reponse in reponses), 'seconds': duree,
+            'requests_per_second': len(reponses) / duree if duree else None,
+            'p50_ms': 1000 * durees[len(durees) // 2] if durees else None,
+            'p95_ms': 1000 * durees[min(len(durees) - 1, len(durees) * 95 // 100)] if durees else None,
+            'statuses': dict(Counter(reponse[0] for reponse in reponses))}
+
+
+async def serve(args: argparse.Namespace) -> None:
+    """ Runs the server until it is interrupted """
+    cache = RenderCache(args.cache, args.cache_bytes) if args.cache else None
+    serveur = GridzServer(workers=args.workers, cache=cache, time_budget=args.time_budget,
+                          max_pixels=args.max_pixels, tile_size=args.tile_size, memory_bytes=args.memory_bytes)
+    try:
+        ecoute = await serveur.start(args.host, args.port)
+        logger.info(f"Listening on http://{args.host}:{args.port}")
+        async with ecoute:
+            await ecoute.serve_forever()
+    finally:
+        serveur.close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """ Runs the server, or a load test of a running server with --load-test """
+    parser = argparse.ArgumentParser(description="HTTP server of the images and tiles of lsystog")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('-w', '--workers', type=int, default=None, help="number of processes (default : CPUs)")
+    parser.add_argument('-c', '--cache', help="folder of a render cache (see RenderCache)")
+    parser.add_argument('--cache-bytes', type=int, default=1 << 30, help="size budget of the cache (default : 1 GiB)")
+    parser.add_argument('--memory-bytes', type=int, default=1 << 26, help="PNG data kept in memory (default : 64 MiB)")
+    parser.add_argument('--time-budget', type=float, default=60, help="seconds for each rendering (default : 60)")
+    parser.add_argument('--max-pixels', type=int, default=1 << 26, help="the larger images are rejected (413)")
+    parser.add_argument('--tile-size', type=int, default=256)
+    parser.add_argument('--load-test', metavar='URL', help="load test of a running server instead")
+    parser.add_argument('-n', '--requests', type=int, default=200, help="number of requests of the load test")
+    parser.add_argument('--concurrency', type=int, default=16, help="connections of the load test")
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        print(json.dumps(asyncio.run(load_test(args.load_test, args.requests, args.concurrency)), indent=2))
+        return 0
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
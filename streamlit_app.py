@@ -1,10 +1,23 @@
 """
 Streamlit application
 """
+import os
+import time
+
 import streamlit as st
 from loguru import logger
 
+import batch
 import lsystog as ls
+from render_cache import RenderCache
+from render_pool import RenderPool
+
+# Disk cache of the images, shared between sessions and processes
+RENDER_CACHE = RenderCache(os.environ.get('GRIDZ_CACHE_DIR', '.gridz_cache'),
+                           int(os.environ.get('GRIDZ_CACHE_BYTES', 1 << 28)))
+
+# Maximum number of pixels of an image : a larger request is downscaled before any work
+MAX_PIXELS = int(os.environ.get('GRIDZ_MAX_PIXELS', 1 << 26))
 
 
 def on_change_selection():
@@ -17,27 +30,73 @@ def on_change_selection():
     st.session_state.my_pattern = current_selection
 
 
-@st.cache_data
+@st.cache_resource
+def render_pool():
+    """
+    Return the pool of render processes shared by the sessions (a heavy render does not block the script thread)
+
+    :return: pool
+    """
+    return RenderPool(max_workers=int(os.environ.get('GRIDZ_WORKERS', 2)),
+                      time_budget=float(os.environ.get('GRIDZ_TIME_BUDGET', 60)))
+
+
 def load_img(pattern, colors, nb_iterations, apply_rotation):
     """
-    Return an image computed from the parameters
+    Return the images computed from the parameters, coarse to fine (only the final one when it is in the cache)
 
-    :return: image
+    :return: generator of images
     """
-    func_transf = ls.strc_2_strc_90 if apply_rotation else None
+    job = {'patterns': [pattern], 'colors': colors, 'banned_colors': '/', 'nbiter': nb_iterations,
+           'rotation': apply_rotation, 'background': (0, 0, 0, 255), 'mode': 'P'}
+    key = batch.job_key({**batch.JOB_DEFAULTS, **job})
     try:
-        gls = ls.Lsystg(axiom=None, rules=None, nbiter=nb_iterations, patterns=[pattern], colors=colors,
-                        banned_colors='/', nb_dest=1, verbose=True, func_transf=func_transf)
-        image = gls.img(img_fpath="", col_fond=(0, 0, 0, 255))
+        # The disk cache is shared with the other processes (and with the batch jobs using it)
+        image = RENDER_CACHE.get_image(key)
+        if image is None:
+            # The size of the image is known from the rules (nothing is expanded)
+            nbiter = batch.nbiter_job({**batch.JOB_DEFAULTS, **job}, MAX_PIXELS)
+            if nbiter == 0:
+                raise ls.LsystError("The image would be too large")
+            if nbiter < nb_iterations:
+                st.info(f"The image would be too large : the number of iterations is reduced to {nbiter}")
+                job['nbiter'] = nbiter
+                key = batch.job_key({**batch.JOB_DEFAULTS, **job})
+                image = RENDER_CACHE.get_image(key)
+
+        if image is not None:
+            yield image
+            return
+
+        pool = render_pool()
+
+        # The job of a previous run of this session is not needed anymore (an identical one is shared)
+        previous = st.session_state.get('job_id')
+        job_id = st.session_state.job_id = pool.submit(job, previews=True)
+        if previous is not None:
+            pool.cancel(previous)
+
+        num = 0
+        while not pool.done(job_id):
+            preview = pool.preview(job_id)
+            if preview is not None and preview[0] > num:
+                num, image = preview
+                yield image
+            time.sleep(0.05)
+
+        image = pool.result(job_id)
+        st.session_state.job_id = None
+        RENDER_CACHE.put_image(key, image)
+        yield image
     except ls.LsystError as ex:
+        st.session_state.job_id = None
         st.warning(ex)
         st.stop()
     except Exception as ex:
+        st.session_state.job_id = None
         st.warning("Please verify your parameters. Special characters are not permitted in the pattern except for '?'")
         logger.error(f"Something went wrong : {ex}")
         st.stop()
-    else:
-        return image
 
 
 st.set_page_config(page_title="Gridz", page_icon="🖼️")
@@ -52,22 +111,12 @@ You have the flexibility to define your own colors and pattern
 Simply click on "Draw" when you are satisfied with your new input :sunglasses:
 """
 
-MD2 = """
+COLORS_LEGEND = "\n".join(f"- {car} : {name}" + (" (black)" if car == 'T' else "")
+                          for car, (name, _) in ls.COLORS.items())
+
+MD2 = f"""
 The possible colors are :
-- R : Red
-- G : Green
-- B : Blue
-- W : White
-- K : Black
-- Y : Yellow
-- M : Magenta
-- O : Orange
-- D : Dim gray
-- F : Forest green
-- N : Navy
-- P : Purple
-- T : Background color (black)
-- ? : Random color
+{COLORS_LEGEND}
 
 The pattern assigns colors from left to right and from top to bottom, with each "row" separated by an underscore
 
@@ -76,9 +125,7 @@ The pattern consists of "rotating" colors represented by digits and fixed colors
 To understand how the pattern functions, try drawing with just one iteration
 """
 
-EXAMPLES_LIST = ['00000_01210_02020_01210_00000', '012_120_201', '1001_0220_0220_1001',
-                 '00000_01110_01210_01110_00000', 'T000T_01210_02020_01210_T000T', '00000_01210_02T20_01210_00000',
-                 '1112T2_1T12T2_111222_1TTT2T_1TTT2T_1TTT2T']
+EXAMPLES_LIST = ls.PATTERN_EXAMPLES
 
 st.sidebar.markdown(MD1)
 
@@ -111,9 +158,10 @@ with st.form("my_form"):
     submitted = st.form_submit_button("Draw")
     if submitted or first_time:
         first_time = False
-        img = load_img(pat, col, nb_iter, rotation)
-
-        st.image(img, caption='Generated image')
+        # The preview of each level is replaced in place by the next (finer) one
+        placeholder = st.empty()
+        for img in load_img(pat, col, nb_iter, rotation):
+            placeholder.image(img, caption='Generated image')
 
     st.markdown("---")
     st.markdown(
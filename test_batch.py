@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from PIL import Image as pim
+
+import batch
+import lsystog as ls
+from render_cache import RenderCache
+
+
+def test_batch_jobs(tmp_path):
+    manifest = tmp_path / "jobs.csv"
+    manifest.write_text("patterns,colors,banned_colors,nbiter,rotation,output,background\n"
+                        f"1/2_1//_111,RBG,/,3,1,{tmp_path / 'out' / 'a.png'},0 0 0 255\n"
+                        f"00,GRB,,1,0,{tmp_path / 'b.png'},\n"
+                        f"00,GRB,,30,0,{tmp_path / 'c.png'},\n")
+    (tmp_path / "b.png").write_bytes(b"")
+
+    jobs = batch.lire_jobs(str(manifest))
+    assert jobs[0]['patterns'] == ['1/2_1//_111'] and jobs[0]['rotation'] and jobs[0]['background'] == (0, 0, 0, 255)
+
+    resultats = batch.rendu_jobs(jobs, workers=2)
+    assert [resultat['status'] for resultat in resultats] == ['done', 'skipped', 'error']
+    assert (resultats[0]['width'], resultats[0]['height']) == (108, 108)
+
+    with pim.open(tmp_path / "out" / "a.png") as imgn:
+        gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['1/2_1//_111'], colors='RBG', banned_colors='/',
+                        func_transf=ls.strc_2_strc_90)
+        assert np.array_equal(np.asarray(imgn), np.asarray(gls.img(img_fpath="", col_fond=(0, 0, 0, 255))))
+
+
+def test_batch_jobs_unknown_key(tmp_path):
+    manifest = tmp_path / "jobs.json"
+    manifest.write_text('[{"patterns": "00", "output": "a.png", "iterations": 3}]')
+
+    with pytest.raises(ls.LsystError):
+        batch.lire_jobs(str(manifest))
+
+
+def test_batch_jobs_cache(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"))
+    jobs = [dict(batch.JOB_DEFAULTS, patterns=['1/2_1//_111'], colors='RBG', nbiter=3, output=str(tmp_path / name))
+            for name in ("a.png", "b.png")]
+
+    assert batch.rendu_job(jobs[0], cache)['status'] == 'done'
+    assert batch.rendu_job(jobs[1], cache)['status'] == 'cached'
+    assert (tmp_path / "a.png").read_bytes() == (tmp_path / "b.png").read_bytes()
+
+
+def test_nbiter_job():
+    job = dict(batch.JOB_DEFAULTS, patterns=['1/2_1//_111'], colors='RBG', nbiter=8)
+    assert batch.nbiter_job(job) == 7
+    assert batch.nbiter_job(job, max_pixels=108 * 108) == 3
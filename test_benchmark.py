@@ -0,0 +1,18 @@
+import copy
+
+import benchmark
+
+
+def test_benchmark_compare():
+    lcases = [case for case in benchmark.cases(quick=True) if case['name'] == 'rst' and case['nbiter'] == 3]
+    resultats = {'cases': benchmark.run_cases(lcases, repeat=1), 'golden': [{'name': 'rst', 'engine': 'grid',
+                                                                            'diff_pixels': 0, 'total_pixels': 1}]}
+
+    assert len(lcases) == 4 and len(resultats['cases']) == 10
+    assert all(ligne['same_as_string'] for ligne in resultats['cases'])
+    assert benchmark.compare(resultats, resultats, 1.5) == []
+
+    plus_lent = copy.deepcopy(resultats)
+    plus_lent['cases'][0]['render_s'] = 2 * max(resultats['cases'][0]['render_s'], benchmark.MIN_SECONDS)
+    plus_lent['golden'][0]['diff_pixels'] = 3
+    assert len(benchmark.compare(plus_lent, resultats, 1.5)) == 2
@@ -0,0 +1,589 @@
+import random as rnd
+from collections import Counter
+
+import numpy as np
+import pytest
+from PIL import Image as pim, ImageDraw, ImageSequence
+
+import lsystog as ls
+
+
+def pixels(gls):
+    return np.asarray(gls.img(img_fpath="", col_fond=(0, 0, 0, 255)))
+
+
+def pixels_draw(gls):
+    # One rectangle per cell of the string result (reference renderer)
+    chaine, niveaux = gls.dev_prf
+    tailles = [(1, 1)]
+    for multx, multy in reversed(niveaux):
+        tailles.insert(0, (tailles[0][0] * multx, tailles[0][1] * multy))
+
+    imgn = pim.new("RGBA", (gls.x_basis * tailles[0][0], gls.y_basis * tailles[0][1]), color=(0, 0, 0, 255))
+    draw = ImageDraw.Draw(imgn)
+    lpos, lbfond = [], False
+
+    for car in chaine:
+        if car == '(':
+            if lpos:
+                lpos[-1][0] += 1
+            lpos.append([-1, 0])
+        elif car == ')':
+            lpos.pop()
+        elif car == '_':
+            lpos[-1] = [-1, lpos[-1][1] + 1]
+        elif car == '&':
+            lbfond = True
+        else:
+            if not lbfond:
+                lpos[-1][0] += 1
+            gls.img_remplir_gen(draw, lpos, tailles, gls.x_basis, gls.y_basis, car)
+            lbfond = False
+
+    return np.asarray(imgn)
+
+
+@pytest.mark.parametrize("pattern, colors, func_transf, nb_dest", [
+    ('00000_01210_02T20_01210_00000', 'GRB', None, 1),
+    ('1/2_1//_111', 'RBG', ls.strc_2_strc_90, 1),
+    ('0?0_1?1_020', 'RBG', ls.strc_2_strc_90, 1),
+    ('102_100_111', 'RBG?', None, 2),
+])
+def test_grid_engine_same_image(pattern, colors, func_transf, nb_dest):
+    params = dict(axiom=None, rules=None, nbiter=3, patterns=[pattern], colors=colors, banned_colors='/',
+                  func_transf=func_transf, nb_dest=nb_dest)
+
+    expected = pixels(ls.Lsystg(**params))
+    assert np.array_equal(pixels(ls.Lsystg(**params, engine='grid')), expected)
+
+
+def test_grid_engine_levels():
+    gls = ls.Lsystg(axiom='RG_BY', rules=[('R', 'RG_GR'), ('G', 'GB_BR')], nbiter=2, engine='grid')
+    grille, niveaux = gls.dev_prf
+
+    assert niveaux == [(2, 2), (2, 2), (2, 2)]
+    assert ls.codes_2_strc(grille[:2, :4]) == 'RGGB_GRBR'
+
+
+def test_engines_non_square_rotated_pattern():
+    params = dict(axiom=None, rules=None, nbiter=3, patterns=['12_34_56'], colors='RGB',
+                  func_transf=ls.strc_2_strc_90)
+
+    gls = ls.Lsystg(**params)
+    assert np.asarray(gls.img(img_fpath="")).shape == (108, 32, 4)
+    assert np.array_equal(pixels(gls), pixels_draw(gls))
+
+    # The grid and lazy engines can not keep the size of the string engine
+    for engine in ('grid', 'lazy'):
+        with pytest.raises(ls.LsystError):
+            pixels(ls.Lsystg(**params, engine=engine))
+
+
+def test_grid_engine_rejects_multichar_rules():
+    with pytest.raises(ls.LsystError):
+        ls.Lsystg(axiom='R', rules=[('RG', 'RG_GR')], nbiter=1, engine='grid')
+
+
+@pytest.mark.parametrize("axiom, rules", [
+    ('R_B', [('R', '&GR/_/R')]),
+    ('R_B', [('R', '&?RB_/R'), ('B', '&YR/_?B')]),
+    ('RG_BY', [('R', 'RG_G?'), ('G', 'GT_BR'), ('B', ['BY_YB', 'BR_RB'])]),
+])
+def test_img_same_as_draw(axiom, rules):
+    gls = ls.Lsystg(axiom=axiom, rules=rules, nbiter=3)
+
+    state = rnd.getstate()
+    expected = pixels_draw(gls)
+    rnd.setstate(state)
+
+    assert np.array_equal(pixels(gls), expected)
+
+
+@pytest.mark.parametrize("pattern, func_transf", [
+    ('12', ls.strc_2_strc_90),
+    ('102_100', ls.strc_2_strc_90),
+    ('1234_4321', ls.strc_2_strc_90),
+    ('1_12', None),
+])
+def test_img_same_as_draw_clipped(pattern, func_transf):
+    # Some leaves of these patterns are out of the image
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=[pattern], colors='RGBY', func_transf=func_transf)
+
+    assert np.array_equal(pixels(gls), pixels_draw(gls))
+
+
+def test_img_same_as_draw_background_redrawn():
+    # The background 'G' of 'R' is drawn again (bigger) by the rule of 'G' : the order of the string is kept
+    gls = ls.Lsystg(axiom='RG_BY', rules=[('R', '&GRB_YK'), ('G', 'KW_WK'), ('B', 'BY_YB')], nbiter=3)
+
+    assert np.array_equal(pixels(gls), pixels_draw(gls))
+
+
+def test_string_engine_first_rule_wins():
+    assert ls.Lsystg(axiom='AB', rules=[('A', 'X'), ('AB', 'Y')], nbiter=1).dev_prf[0] == '(X)B'
+    assert ls.Lsystg(axiom='BAB', rules=[('AB', 'Y'), ('A', 'X')], nbiter=1).dev_prf[0] == 'B(Y)'
+
+
+def test_string_engine_filters_once_per_iteration():
+    appels = []
+
+    def filtre(li, nbiter):
+        appels.append(li)
+        return li > 0
+
+    gls = ls.Lsystg(axiom='R', rules=[('R', 'RG_GR', filtre), ('G', 'GB_BR')], nbiter=3)
+
+    assert appels == [0, 1, 2]
+    assert gls.dev_prf[1] == [(2, 2), (2, 2)]
+
+
+@pytest.mark.parametrize("pattern, func_transf", [
+    ('T000T_01210_02020_01210_T000T', None),
+    ('0?0_1/1_020', ls.strc_2_strc_90),
+])
+def test_lazy_engine_same_image(pattern, func_transf):
+    params = dict(axiom=None, rules=None, nbiter=3, patterns=[pattern], colors='GRB', banned_colors='/',
+                  func_transf=func_transf)
+
+    gls = ls.Lsystg(**params, engine='lazy')
+
+    assert gls.dev_prf[0] is None
+    assert np.array_equal(pixels(gls), pixels(ls.Lsystg(**params)))
+
+
+def test_iter_cells():
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=12, patterns=['1/_01'], colors='RB', engine='lazy')
+    cells = gls.iter_cells()
+
+    assert [next(cells) for _ in range(5)] == [(0, 0, 4, 4, 'R'), (4, 0, 4, 4, '/'), (0, 4, 4, 4, 'B'),
+                                               (4, 4, 4, 4, 'R'), (8, 0, 8, 8, '/')]
+    assert len(gls.dev_prf[1]) == 12
+
+
+def test_tile_engines_reject_late_rules():
+    rules = [('R', 'RG_GR', lambda li, nbiter: li > 0), ('G', 'GB_BR')]
+
+    for engine in ('grid', 'lazy'):
+        with pytest.raises(ls.LsystError):
+            ls.Lsystg(axiom='RG_BY', rules=rules, nbiter=2, engine=engine)
+
+
+def test_render_region_same_as_crop():
+    params = dict(axiom=None, rules=None, nbiter=3, patterns=['T000T_01210_02/20_01210_T000T'], colors='GRB',
+                  banned_colors='/', func_transf=ls.strc_2_strc_90)
+    expected = pixels(ls.Lsystg(**params))
+    gls = ls.Lsystg(**params, engine='lazy')
+
+    region = np.asarray(gls.render_region(13, 7, 50, 31, col_fond=(0, 0, 0, 255)))
+    assert np.array_equal(region, expected[7:38, 13:63])
+
+    params['nbiter'] = 2
+    region = np.asarray(gls.render_region(0, 0, 100, 100, depth=2, col_fond=(0, 0, 0, 255)))
+    assert np.array_equal(region, pixels(ls.Lsystg(**params)))
+
+
+def test_render_region_deep():
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=10, patterns=['00000_01210_02020_01210_00000'], colors='GRB',
+                    engine='lazy')
+    region = gls.render_region(12345678, 19876543, 256, 128)
+
+    assert region.size == (256, 128)
+    assert {coul for _, coul in region.getcolors()} <= {(255, 0, 0, 255), (0, 255, 0, 255), (0, 0, 255, 255)}
+
+
+def test_color_at_same_as_grid():
+    params = dict(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', banned_colors='/',
+                  func_transf=ls.strc_2_strc_90)
+    grille = ls.Lsystg(**params, engine='grid').dev_prf[0]
+    gls = ls.Lsystg(**params, engine='lazy')
+
+    ys, xs = np.indices(grille.shape)
+    assert np.array_equal(gls.colors_at(xs, ys, cells=True), grille)
+    assert np.array_equal(gls.colors_at(4 * xs + 3, 4 * ys + 1), grille)
+
+    assert gls.color_at(57, 90) == chr(grille[90 // 4, 57 // 4])
+    assert gls.color_at(-1, 0) is None
+    assert gls.colors_at(np.array([0, 27]), np.array([-1, 0]), cells=True).tolist() == [0, 0]
+
+    for depth in (-1, 4):
+        with pytest.raises(ls.LsystError):
+            gls.color_at(0, 0, depth=depth)
+        with pytest.raises(ls.LsystError):
+            gls.colors_at(xs, ys, depth=depth)
+
+
+@pytest.mark.parametrize("max_memo_size", [1 << 26, 0])
+def test_grille_memo_same_as_grid(max_memo_size):
+    params = dict(axiom=None, rules=None, nbiter=4, patterns=['0T0_1/1_020'], colors='GRB', banned_colors='/',
+                  func_transf=ls.strc_2_strc_90)
+    gls = ls.Lsystg(**params, engine='lazy')
+    gls.max_memo_size = max_memo_size
+
+    assert not gls.tuiles_aleas()
+    assert np.array_equal(gls.grille_memo(), ls.Lsystg(**params, engine='grid').dev_prf[0])
+
+
+@pytest.mark.parametrize("func_transf", list(ls.TRANSF_D4))
+def test_d4_transformations_at_once(func_transf):
+    gls = ls.Lsystg(axiom='R', rules=[('R', 'RG_BY')], nbiter=1, func_transf=func_transf)
+    nchaine = 'RGB_YKW'
+
+    for li in range(6):
+        assert gls.transf_motif('RGB_YKW', li) == nchaine
+        assert ls.codes_2_strc(gls.tab_motif('RGB_YKW', li)) == nchaine
+        nchaine = func_transf(nchaine)
+
+
+def test_d4_same_as_callable():
+    params = dict(axiom=None, rules=None, nbiter=3, patterns=['1/2_1//_111'], colors='RBG', banned_colors='/')
+    expected = ls.Lsystg(**params, func_transf=lambda chaine: ls.strc_2_strc_tr(chaine)).dev_prf
+
+    assert ls.Lsystg(**params, func_transf=ls.strc_2_strc_tr).dev_prf == expected
+
+
+@pytest.mark.parametrize("pattern, engine", [
+    ('T000T_01210_02/20_01210_T000T', 'string'),
+    ('0T0_1/1_020', 'lazy'),
+])
+def test_img_palette_mode(pattern, engine):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=[pattern], colors='GRB', banned_colors='/',
+                    func_transf=ls.strc_2_strc_90, engine=engine)
+    imgn = gls.img(img_fpath="", mode='P')
+
+    assert imgn.mode == 'P'
+    assert len(imgn.getpalette(rawmode='RGBA')) == 4 * 4
+    assert np.array_equal(np.asarray(imgn.convert('RGBA')), np.asarray(gls.img(img_fpath="")))
+
+
+def test_img_palette_mode_random_color():
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=2, patterns=['0?0_101'], colors='GR')
+
+    assert gls.img(img_fpath="", mode='P').mode == 'RGBA'
+    with pytest.raises(ls.LsystError):
+        gls.img(img_fpath="", mode='L')
+
+
+@pytest.mark.parametrize("mode, max_band_size", [('RGBA', 1 << 26), ('RGBA', 200), ('P', 200)])
+def test_img_png_same_as_img(tmp_path, mode, max_band_size):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['T000T_01210_02/20_01210_T000T'], colors='GRB',
+                    banned_colors='/', func_transf=ls.strc_2_strc_90, engine='lazy')
+    gls.max_band_size = max_band_size
+
+    assert gls.img_png(str(tmp_path / "img.png"), mode=mode) == (500, 500)
+
+    with pim.open(tmp_path / "img.png") as imgn:
+        assert imgn.mode == mode
+        assert np.array_equal(np.asarray(imgn.convert('RGBA')), np.asarray(gls.img(img_fpath="")))
+
+
+def test_img_png_random_color(tmp_path):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', banned_colors='/',
+                    func_transf=ls.strc_2_strc_90, engine='lazy')
+
+    state = rnd.getstate()
+    gls.img_png(str(tmp_path / "img.png"), mode='P')
+    rnd.setstate(state)
+
+    with pim.open(tmp_path / "img.png") as imgn:
+        assert np.array_equal(np.asarray(imgn), np.asarray(gls.img(img_fpath="")))
+
+    # Several bands : a random leaf keeps its color in all its bands
+    gls.max_band_size = 32 * 27
+    gls.img_png(str(tmp_path / "img.png"))
+
+    with pim.open(tmp_path / "img.png") as imgn:
+        assert len(imgn.crop((36, 0, 72, 36)).getcolors()) == 1
+
+
+@pytest.mark.parametrize("pattern, engine, mode", [
+    ('T000T_01210_02/20_01210_T000T', 'lazy', 'P'),
+    ('0?0_1/1_020', 'lazy', 'RGBA'),
+    ('0?0_1/1_020', 'string', 'RGBA'),
+])
+def test_img_workers_same_as_serial(pattern, engine, mode):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=[pattern], colors='GRB', banned_colors='/',
+                    func_transf=ls.strc_2_strc_90, engine=engine)
+
+    state = rnd.getstate()
+    expected = gls.img(img_fpath="", mode=mode)
+    rnd.setstate(state)
+    imgn = gls.img(img_fpath="", mode=mode, workers=2)
+
+    assert imgn.tobytes() == expected.tobytes()
+    assert imgn.getpalette() == expected.getpalette()
+
+
+def test_iter_tiles():
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['T000T_01210_02/20_01210_T000T'], colors='GRB',
+                    banned_colors='/', func_transf=ls.strc_2_strc_90, engine='lazy')
+    image = np.asarray(gls.img(img_fpath=""))
+    tuiles = {(zoom, x, y): tuile for zoom, x, y, tuile in gls.iter_tiles(tile_size=64)}
+
+    assert gls.zoom_tuiles(64) == 3
+    assert (3, 0, 0) not in tuiles  # Transparent
+    for (zoom, x, y), tuile in tuiles.items():
+        if zoom == 3:
+            attendu = image[y * 64:(y + 1) * 64, x * 64:(x + 1) * 64]
+            assert np.array_equal(tuile[:attendu.shape[0], :attendu.shape[1]], attendu)
+
+    # The last zoom rendered directly (from a lower depth) : same tiles as by averaging the children
+    for zoom, x, y, tuile in gls.iter_tiles(tile_size=64, max_zoom=1):
+        assert np.array_equal(tuile, tuiles[zoom, x, y])
+
+
+def test_export_tiles_dzi(tmp_path):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', banned_colors='/',
+                    engine='lazy')
+    gls.export_tiles(str(tmp_path), fmt='dzi', tile_size=64)
+
+    assert 'Width="108" Height="108"' in (tmp_path / "image.dzi").read_text()
+    assert sorted(int(niv.name) for niv in (tmp_path / "image_files").iterdir()) == list(range(8))
+    with pim.open(tmp_path / "image_files" / "7" / "1_1.png") as imgn:
+        assert imgn.size == (44, 44)
+    with pim.open(tmp_path / "image_files" / "0" / "0_0.png") as imgn:
+        assert imgn.size == (1, 1)
+
+
+@pytest.mark.parametrize("engine, func_transf", [('string', lambda chaine: ls.strc_2_strc_90(chaine)),
+                                                 ('grid', ls.strc_2_strc_90)])
+def test_stats(engine, func_transf):
+    records = []
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['T0?_1/1_020'], colors='GRB', banned_colors='/',
+                    func_transf=func_transf, engine=engine, stats_callback=records.append)
+    gls.img(img_fpath="")
+
+    assert [record['replacements'] for record in gls.stats['iteration']] == [1, 6, 36]
+    assert gls.stats['img'][0]['pixels'] == 108 * 108 and gls.stats['img'][0]['random_leaves'] == 43
+    assert records == gls.stats['iteration'] + gls.stats['img']
+    assert gls.stats['func_transf_calls'] + gls.stats['d4_transforms'] > 0
+    assert ls.Lsystg(axiom='R', rules=[('R', 'RG_GR')], nbiter=1).stats is None
+
+
+def test_render_key():
+    key = ls.render_key(['012_120_201'], 'GRB', nbiter=4, rotation=True, col_fond=[0, 0, 0, 255])
+
+    assert len(key) == 64
+    assert key == ls.render_key(('012_120_201',), 'GRB', '', 4, 1, col_fond=(0, 0, 0, 255))
+    assert key != ls.render_key(['012_120_201'], 'GRB', nbiter=4, rotation=False, col_fond=(0, 0, 0, 255))
+
+
+@pytest.mark.parametrize("pattern, func_transf", [
+    ('T000T_01210_02/20_01210_T000T', ls.strc_2_strc_90),
+    ('01_20_11', ls.strc_2_strc_90),
+    ('0?0_1/1_020', None),
+])
+def test_estimate(pattern, func_transf):
+    for nbiter in (1, 3, 4):
+        params = dict(axiom=None, rules=None, nbiter=nbiter, patterns=[pattern], colors='GRB', banned_colors='/',
+                      func_transf=func_transf)
+        estimation = ls.Lsystg(expand=False, **params).estimate()
+        chaine, niveaux = ls.Lsystg(**params).dev_prf
+        ncx, ncy = ls.tailles_niveaux(niveaux)[0]
+
+        assert estimation['depth'] == len(niveaux)
+        assert estimation['cells'] == (ncx, ncy)
+        assert estimation['pixel_count'] == ncx * ncy * 16
+        assert estimation['string_size'] == len(chaine)
+        assert estimation['leaves'] == Counter(car for car in chaine if car not in '()_')
+
+
+def test_estimate_without_expansion():
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=1000, patterns=['1/2_1//_111'], colors='RBG',
+                    func_transf=ls.strc_2_strc_90, expand=False)
+    assert gls.dev_prf == ''
+
+    estimation = gls.estimate()
+    assert estimation['depth'] == 1000 and estimation['cells'] == (3 ** 1000, 3 ** 1000) and not estimation['fits']
+    assert gls.estimate(3)['cells'] == (27, 27)
+
+
+@pytest.mark.parametrize("engine", ['string', 'grid'])
+def test_extend_same_as_new(engine):
+    params = dict(axiom='RG_BY', rules=[('R', 'RG_G?', lambda li, nbiter: li < nbiter - 1), ('G', ['GT_BR', 'BR_GT']),
+                                        ('B', 'BY_YB'), ('Y', 'YR_RY')], func_transf=ls.strc_2_strc_90, engine=engine)
+    gls = ls.Lsystg(**params, nbiter=2)
+    pixels(gls)
+
+    for k in (1, 2, -2):
+        gls.extend(k)
+        image = pixels(gls)
+        attendu = ls.Lsystg(**params, nbiter=gls.nbiter)
+
+        assert gls.dev_prf[1] == attendu.dev_prf[1]
+        assert np.array_equal(image, pixels(attendu))
+
+
+def test_extend_only_new_iterations():
+    iterations = []
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', banned_colors='/',
+                    stats_callback=lambda record: iterations.append(record.get('iteration')))
+    gls.extend(2)
+
+    assert iterations == [0, 1, 2, 3, 4]
+    assert gls.dev_prf == ls.Lsystg(axiom=None, rules=None, nbiter=5, patterns=['0?0_1/1_020'], colors='GRB',
+                                    banned_colors='/').dev_prf
+
+
+@pytest.mark.parametrize("engine", ['string', 'grid', 'lazy'])
+def test_iter_images(engine):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', banned_colors='/',
+                    func_transf=ls.strc_2_strc_90, engine=engine)
+    etat = ls.rnd.getstate()
+    images = list(gls.iter_images(col_fond=(0, 0, 0, 255)))
+    ls.rnd.setstate(etat)
+
+    assert len(images) == 3
+    assert all(imgn.size == images[-1].size for imgn in images)
+    assert np.array_equal(np.asarray(images[-1]), pixels(gls))
+
+
+def test_export_animation(tmp_path):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', banned_colors='/')
+    etat = ls.rnd.getstate()
+    images = [np.asarray(imgn) for imgn in gls.iter_images(col_fond=(0, 0, 0, 255))]
+
+    ls.rnd.setstate(etat)
+    assert gls.export_animation(str(tmp_path / "growth.png"), workers=2) == 3
+    with pim.open(tmp_path / "growth.png") as apng:
+        assert all(np.array_equal(np.asarray(frame.convert('RGBA')), imgn)
+                   for frame, imgn in zip(ImageSequence.Iterator(apng), images))
+
+    assert gls.export_animation(str(tmp_path / "growth.gif"), duration=100) == 3
+    with pim.open(tmp_path / "growth.gif") as gif:
+        assert gif.n_frames == 3 and gif.size == images[0].shape[1::-1]
+    ls.rnd.setstate(etat)
+
+    with pytest.raises(ls.LsystError):
+        gls.export_animation(str(tmp_path / "growth.bmp"))
+
+
+def test_rectangles_grille():
+    grille = np.array([[1, 1, 2], [1, 1, 2], [3, 1, 1]])
+    xs, ys, ws, hs, valeurs = ls.rectangles_grille(grille)
+    assert len(xs) == 4
+
+    rendu = np.zeros_like(grille)
+    for x, y, lw, lh, valeur in zip(xs, ys, ws, hs, valeurs):
+        rendu[y:y + lh, x:x + lw] = valeur
+    assert np.array_equal(rendu, grille)
+
+
+@pytest.mark.parametrize("engine", ['string', 'lazy'])
+def test_rectangles(engine, tmp_path):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', banned_colors='/',
+                    engine=engine)
+    etat = ls.rnd.getstate()
+    attendu = pixels(gls)
+
+    ls.rnd.setstate(etat)
+    imgn = pim.new("RGBA", attendu.shape[1::-1], color=(0, 0, 0, 0))
+    nb = gls.draw_rectangles(ImageDraw.Draw(imgn), col_fond=(0, 0, 0, 255))
+    assert np.array_equal(np.asarray(imgn), attendu)
+    assert nb < attendu.shape[0] * attendu.shape[1] // (gls.x_basis * gls.y_basis)
+
+    assert gls.export_vector(str(tmp_path / "img.svg")) == gls.export_vector(str(tmp_path / "img.pdf"))
+    assert (tmp_path / "img.svg").read_bytes().startswith(b'<svg')
+    assert (tmp_path / "img.pdf").read_bytes().startswith(b'%PDF')
+    ls.rnd.setstate(etat)
+
+
+def test_checkpoint():
+    with pytest.raises(ls.LsystCancelled):
+        ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', cancel=lambda: True)
+
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', time_budget=60)
+    gls.deadline = 0
+    with pytest.raises(ls.LsystCancelled):
+        gls.img(img_fpath="")
+
+
+@pytest.mark.parametrize("engine", ['string', 'grid', 'lazy'])
+def test_save_load(tmp_path, engine):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['0?0_1/1_020'], colors='GRB', banned_colors='/',
+                    func_transf=ls.strc_2_strc_90, engine=engine)
+    gls.save(str(tmp_path / "result.npz"))
+    image = pixels(gls)
+
+    charge = ls.Lsystg.load(str(tmp_path / "result.npz"))
+
+    assert isinstance(charge.dev_prf[0], np.memmap)
+    assert charge.dev_prf[1] == gls.dev_prf[1]
+    assert np.array_equal(pixels(charge), image)
+    assert np.asarray(charge.render_region(8, 4, 40, 24)).shape == (24, 40, 4)
+    with pytest.raises(ls.LsystError):
+        charge.extend(1)
+
+
+def test_save_load_background(tmp_path):
+    gls = ls.Lsystg(axiom='R_B', rules=[('R', '&?RB_/R'), ('B', '&YR/_?B')], nbiter=3)
+    gls.save(str(tmp_path / "result"))
+    image = pixels(gls)
+
+    assert np.array_equal(pixels(ls.Lsystg.load(str(tmp_path / "result.npz"), mmap=False)), image)
+
+
+@pytest.mark.parametrize("pattern, mode", [('T000T_01210_02/20_01210_T000T', 'P'), ('0?0_1/1_020', 'RGBA')])
+def test_save_load_img_png(tmp_path, pattern, mode):
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=[pattern], colors='GRB', banned_colors='/',
+                    func_transf=ls.strc_2_strc_90, engine='lazy')
+    gls.save(str(tmp_path / "result.npz"))
+    image = pixels(gls)
+
+    charge = ls.Lsystg.load(str(tmp_path / "result.npz"))
+    assert charge.img_png(str(tmp_path / "img.png"), col_fond=(0, 0, 0, 255), mode=mode) == image.shape[1::-1]
+
+    with pim.open(tmp_path / "img.png") as imgn:
+        assert imgn.mode == mode
+        assert np.array_equal(np.asarray(imgn.convert('RGBA')), image)
+
+
+def test_load_keeps_global_random_state(tmp_path):
+    gls = ls.Lsystg(axiom='R_B', rules=[('R', '&?RB_/R'), ('B', '&YR/_?B')], nbiter=3)
+    gls.save(str(tmp_path / "result.npz"))
+    image = pixels(gls)
+
+    rnd.seed(5)
+    state = rnd.getstate()
+    charge = ls.Lsystg.load(str(tmp_path / "result.npz"))
+    assert rnd.getstate() == state
+
+    # The random colors come from the saved state, the global state is not changed by a rendering
+    assert np.array_equal(pixels(charge), image)
+    assert rnd.getstate() == state
+
+
+@pytest.mark.parametrize("pattern, colors, nb_dest", [
+    ('0?0_1/1_020', 'GRB', 2),
+    ('1/2_1//_111', 'RBG?', 3),
+])
+def test_rng_cell(pattern, colors, nb_dest):
+    def lsystg(engine):
+        return ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=[pattern], colors=colors, banned_colors='/',
+                         nb_dest=nb_dest, func_transf=ls.strc_2_strc_90, engine=engine, rng='cell')
+
+    ls.rnd.seed(1)
+    image = pixels(lsystg('string'))
+    ls.rnd.seed(2)
+    assert np.array_equal(pixels(lsystg('string')), image)
+
+    assert np.array_equal(pixels(lsystg('grid')), image)
+    assert np.array_equal(pixels(lsystg('lazy')), image)
+
+    gls = lsystg('lazy')
+    hauteur, largeur = image.shape[:2]
+    region = gls.render_region(largeur // 3, hauteur // 4, largeur // 2, hauteur // 2, col_fond=(0, 0, 0, 255))
+    assert np.array_equal(np.asarray(region), image[hauteur // 4:hauteur // 4 + hauteur // 2,
+                                                    largeur // 3:largeur // 3 + largeur // 2])
+
+    xs = np.arange(0, largeur, 5)
+    assert [gls.color_at(int(x), int(x) % hauteur) for x in xs] == [chr(code) for code in
+                                                                    gls.colors_at(xs, xs % hauteur)]
+
+
+def test_alea_cellules():
+    valeurs = ls.alea_cellules(7, 2, np.arange(4), np.zeros(4, dtype=np.int64))
+
+    assert valeurs.dtype == np.uint64
+    assert len(set(valeurs.tolist())) == 4
+    assert np.array_equal(valeurs, [ls.alea_cellules(7, 2, x, 0) for x in range(4)])
+    assert not np.array_equal(valeurs, ls.alea_cellules(8, 2, np.arange(4), 0))
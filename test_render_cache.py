@@ -0,0 +1,25 @@
+import numpy as np
+
+import lsystog as ls
+import render_cache
+
+
+def test_render_cache(tmp_path):
+    cache = render_cache.RenderCache(str(tmp_path), max_bytes=2500)
+    appels = []
+
+    def rendu():
+        appels.append(1)
+        return ls.Lsystg(axiom='RG_BY', rules=[('R', 'RG_GR')], nbiter=2).img(img_fpath="")
+
+    assert np.array_equal(np.asarray(cache.image("aa11", rendu)), np.asarray(cache.image("aa11", rendu)))
+    assert len(appels) == 1
+
+    # LRU eviction within the budget
+    for key in ("bb22", "cc33"):
+        cache.put(key, bytes(1000))
+    cache.get("aa11")
+    cache.put("dd44", bytes(1000))
+
+    assert cache.get("bb22") is None
+    assert cache.get("aa11") is not None and cache.get("cc33") == cache.get("dd44") == bytes(1000)
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+import lsystog as ls
+import render_pool
+
+
+def test_render_pool():
+    job = {'patterns': ['T000T_01210_02/20_01210_T000T'], 'colors': 'GRB', 'banned_colors': '/', 'nbiter': 3,
+           'rotation': True, 'background': (0, 0, 0, 255), 'mode': 'P'}
+    pool = render_pool.RenderPool(max_workers=1)
+    try:
+        job_id = pool.submit(job, previews=True)
+        assert pool.submit(job) == job_id
+
+        imgn = pool.result(job_id)
+        assert pool.result(job_id) is imgn
+        assert not pool.jobs
+
+        attendu = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=job['patterns'], colors='GRB',
+                            banned_colors='/', func_transf=ls.strc_2_strc_90).img("", col_fond=(0, 0, 0, 255), mode='P')
+        assert imgn.mode == 'P'
+        assert np.array_equal(np.asarray(imgn.convert('RGBA')), np.asarray(attendu.convert('RGBA')))
+
+        with pytest.raises(ls.LsystCancelled):
+            pool.result(pool.submit(dict(job, nbiter=4), time_budget=0))
+    finally:
+        pool.shutdown()
@@ -0,0 +1,98 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image as pim
+
+import lsystog as ls
+import server
+
+QUERY = "pattern=1/2_1//_111&colors=RBG&nbiter=3&rotation=1"
+
+
+def run_server(scenario, **kwargs):
+    async def principal():
+        serveur = server.GridzServer(workers=1, **kwargs)
+        try:
+            ecoute = await serveur.start(port=0)
+            async with ecoute:
+                return await scenario(serveur, ecoute.sockets[0].getsockname()[1])
+        finally:
+            serveur.close()
+
+    return asyncio.run(principal())
+
+
+def test_job_from_query():
+    job = server.job_from_query(QUERY + "&background=0,0,0,0")
+    assert job['patterns'] == ['1/2_1//_111'] and job['nbiter'] == 3 and job['rotation']
+    assert job['background'] == (0, 0, 0, 0) and job['rng'] == 'cell'
+
+    with pytest.raises(ValueError):
+        server.job_from_query("colors=RBG")
+    with pytest.raises(ValueError):
+        server.job_from_query(QUERY + "&nbiter=100")
+    with pytest.raises(ValueError):
+        server.job_from_query(QUERY + "&nb_dest=100000")
+
+
+def test_server_image_and_tiles():
+    async def scenario(serveur, port):
+        cible = f"/image?{QUERY}"
+        reponses = await asyncio.gather(*(server.fetch('127.0.0.1', port, [cible]) for _ in range(4)))
+        statut, headers, corps, _ = reponses[0][0]
+        assert all(reponse[0][2] == corps for reponse in reponses)
+        assert serveur.stats['renders'] == 1 and serveur.stats['coalesced'] == 3
+
+        (statut2, _, corps2, _), = await server.fetch('127.0.0.1', port, [cible], {'If-None-Match': headers['etag']})
+        (_, _, corps3, _), = await server.fetch('127.0.0.1', port, [cible])
+        assert corps3 == corps and serveur.stats['memory'] == 1 and serveur.stats['renders'] == 1
+        tuiles = await server.fetch('127.0.0.1', port, [f"/tiles/0/0/0.png?{QUERY}", f"/tiles/0/5/0.png?{QUERY}",
+                                                        "/other", "/image?colors=RBG"])
+        return statut, headers, corps, statut2, corps2, tuiles
+
+    statut, headers, corps, statut2, corps2, tuiles = run_server(scenario)
+
+    assert statut == 200 and headers['content-type'] == 'image/png' and headers['etag'].startswith('"')
+    gls = ls.Lsystg(axiom=None, rules=None, nbiter=3, patterns=['1/2_1//_111'], colors='RBG', banned_colors='/',
+                    func_transf=ls.strc_2_strc_90)
+    with pim.open(io.BytesIO(corps)) as imgn:
+        assert np.array_equal(np.asarray(imgn.convert('RGBA')), np.asarray(gls.img("", col_fond=(0, 0, 0, 255))))
+
+    assert statut2 == 304 and corps2 == b''
+    assert [tuile[0] for tuile in tuiles] == [200, 404, 404, 400]
+    assert tuiles[0][1]['etag'] != headers['etag']
+
+
+def test_server_too_large():
+    async def scenario(_, port):
+        return await server.fetch('127.0.0.1', port, [f"/image?{QUERY}"])
+
+    (statut, _, corps, _), = run_server(scenario, max_pixels=1000)
+    assert statut == 413 and b'too large' in corps
+
+
+def test_server_tile_too_many_iterations():
+    # 6 ** 25 cells per side : the positions of the cells do not fit in int64
+    async def scenario(_, port):
+        query = "pattern=000000_011110_012210_012210_011110_000000&colors=RGB"
+        return await server.fetch('127.0.0.1', port, [f"/tiles/59/0/0.png?{query}&nbiter=25",
+                                                      f"/tiles/0/0/0.png?{query}&nbiter=24"])
+
+    (statut, _, corps, _), (statut_ok, _, _, _) = run_server(scenario)
+    assert statut == 400 and b'too high' in corps
+    assert statut_ok == 200
+
+
+def test_server_memory_budget():
+    serveur = server.GridzServer(workers=1, memory_bytes=10)
+    try:
+        serveur.remember('a', b'1234')
+        serveur.remember('b', b'5678')
+        serveur.remember('a', b'12')
+        serveur.remember('c', b'90123')
+
+        assert list(serveur.memory) == ['a', 'c'] and serveur.memory_size == 7
+    finally:
+        serveur.close()